@@ -0,0 +1,202 @@
+"""
+Analytics store
+Attempt counters per question, topic and difficulty, plus one overall
+row, kept in analytics_counters by the attempt rollup job so the admin
+pages never scan the attempts table. Per-user counters live in
+user_stats (see logic.py).
+"""
+
+from database import get_db, set_counter
+
+DIMENSIONS = ('all', 'question', 'topic', 'difficulty')
+
+# Attempts up to this id were counted by the last rebuild; their rollup
+# jobs are skipped so nothing is counted twice
+REBUILD_WATERMARK = 'analytics_rebuilt_through'
+
+# One attempt's rows in every dimension, read in the statement that writes
+# them so a concurrent question edit can't split the counts
+_RECORD_SQL = '''
+    INSERT INTO analytics_counters (dimension, key, attempts, correct, xp)
+    SELECT dimension, key, 1, :correct, :xp FROM (
+        SELECT 'all' AS dimension, '' AS key
+        UNION ALL SELECT 'question', CAST(id AS TEXT) FROM questions WHERE id = :question_id
+        UNION ALL SELECT 'topic', topic FROM questions WHERE id = :question_id
+        UNION ALL SELECT 'difficulty', difficulty FROM questions WHERE id = :question_id
+    )
+    WHERE :attempt_id IS NULL
+       OR :attempt_id > COALESCE((SELECT value FROM system_counters WHERE name = :watermark), 0)
+    ON CONFLICT(dimension, key) DO UPDATE SET
+        attempts = attempts + 1,
+        correct = correct + excluded.correct,
+        xp = xp + excluded.xp
+'''
+
+# Recount of every dimension from attempts (rebuild and consistency check);
+# per-question/topic/difficulty rows only count attempts whose question exists
+_RECOUNT_SQL = '''
+    SELECT 'all' AS dimension, '' AS key, COUNT(*) AS attempts,
+           COALESCE(SUM(CASE WHEN is_correct = 1 THEN 1 ELSE 0 END), 0) AS correct,
+           COALESCE(SUM(xp_earned), 0) AS xp
+    FROM attempts WHERE id <= :through
+    UNION ALL
+    SELECT 'question', CAST(q.id AS TEXT), COUNT(*),
+           SUM(CASE WHEN a.is_correct = 1 THEN 1 ELSE 0 END), COALESCE(SUM(a.xp_earned), 0)
+    FROM attempts a JOIN questions q ON q.id = a.question_id
+    WHERE a.id <= :through GROUP BY q.id
+    UNION ALL
+    SELECT 'topic', q.topic, COUNT(*),
+           SUM(CASE WHEN a.is_correct = 1 THEN 1 ELSE 0 END), COALESCE(SUM(a.xp_earned), 0)
+    FROM attempts a JOIN questions q ON q.id = a.question_id
+    WHERE a.id <= :through GROUP BY q.topic
+    UNION ALL
+    SELECT 'difficulty', q.difficulty, COUNT(*),
+           SUM(CASE WHEN a.is_correct = 1 THEN 1 ELSE 0 END), COALESCE(SUM(a.xp_earned), 0)
+    FROM attempts a JOIN questions q ON q.id = a.question_id
+    WHERE a.id <= :through GROUP BY q.difficulty
+'''
+
+
+def record_attempt_aggregates(db, attempt_id, question_id, is_correct, xp_earned):
+    """Add one attempt to the analytics counters (caller commits)
+
+    Skipped if the last rebuild already counted this attempt.
+    """
+    db.execute(_RECORD_SQL, {
+        'attempt_id': attempt_id,
+        'question_id': question_id,
+        'correct': 1 if is_correct else 0,
+        'xp': xp_earned or 0,
+        'watermark': REBUILD_WATERMARK
+    })
+
+
+def _add_counts(db, dimension, key, attempts, correct, xp):
+    """Add (or with negative values, remove) counts on one counter row"""
+    db.execute(
+        '''INSERT INTO analytics_counters (dimension, key, attempts, correct, xp)
+           VALUES (?, ?, ?, ?, ?)
+           ON CONFLICT(dimension, key) DO UPDATE SET
+               attempts = attempts + excluded.attempts,
+               correct = correct + excluded.correct,
+               xp = xp + excluded.xp''',
+        (dimension, key, attempts, correct, xp)
+    )
+
+
+def move_question_aggregates(db, question_id, old_topic, old_difficulty, new_topic=None, new_difficulty=None):
+    """Move a question's counts to its new topic/difficulty rows (caller commits)
+
+    Call after a question edit. Without new values (the question was
+    deleted) its counts are removed from the topic, difficulty and
+    question rows; the overall row still counts its attempts.
+    """
+    row = db.execute(
+        "SELECT attempts, correct, xp FROM analytics_counters WHERE dimension = 'question' AND key = ?",
+        (str(question_id),)
+    ).fetchone()
+    if row is None:
+        return
+
+    deleted = new_topic is None and new_difficulty is None
+    for dimension, old, new in (('topic', old_topic, new_topic), ('difficulty', old_difficulty, new_difficulty)):
+        if old == new:
+            continue
+        if old is not None:
+            _add_counts(db, dimension, old, -row['attempts'], -row['correct'], -row['xp'])
+        if new is not None:
+            _add_counts(db, dimension, new, row['attempts'], row['correct'], row['xp'])
+    if deleted:
+        db.execute(
+            "DELETE FROM analytics_counters WHERE dimension = 'question' AND key = ?",
+            (str(question_id),)
+        )
+
+
+def rebuild_analytics():
+    """Recompute analytics_counters from the attempts table
+
+    Runs in one write transaction and records the last attempt id it
+    counted, so rollup jobs still queued for those attempts are skipped.
+    Returns the number of counter rows written.
+    """
+    db = get_db()
+    db.execute('BEGIN IMMEDIATE')
+    try:
+        through = db.execute('SELECT COALESCE(MAX(id), 0) as max_id FROM attempts').fetchone()['max_id']
+        db.execute('DELETE FROM analytics_counters')
+        cursor = db.execute(
+            'INSERT INTO analytics_counters (dimension, key, attempts, correct, xp) ' + _RECOUNT_SQL,
+            {'through': through}
+        )
+        set_counter(db, REBUILD_WATERMARK, through)
+        db.commit()
+        return cursor.rowcount
+    except Exception:
+        db.rollback()
+        raise
+
+
+def check_analytics(db=None):
+    """Compare the counters with a recount from attempts
+
+    Returns (dimension, key, stored, actual) for every row that differs,
+    where stored and actual are (attempts, correct, xp). Attempts whose
+    rollup job has not run yet show up as differences, so drain the job
+    queue first.
+    """
+    db = db or get_db()
+    stored = {
+        (row['dimension'], row['key']): (row['attempts'], row['correct'], row['xp'])
+        for row in db.execute('SELECT dimension, key, attempts, correct, xp FROM analytics_counters')
+    }
+    actual = {
+        (row['dimension'], row['key']): (row['attempts'], row['correct'], row['xp'])
+        for row in db.execute(_RECOUNT_SQL, {'through': 2 ** 62})
+    }
+
+    empty = (0, 0, 0)
+    mismatches = []
+    for dimension, key in sorted(set(stored) | set(actual), key=lambda item: (item[0], str(item[1]))):
+        have = stored.get((dimension, key), empty)
+        want = actual.get((dimension, key), empty)
+        if have != want:
+            mismatches.append((dimension, key, have, want))
+    return mismatches
+
+
+# ==================== READS ====================
+
+def get_overview(db):
+    """Total attempts, correct attempts and accuracy (%) over all practice attempts"""
+    row = db.execute(
+        "SELECT attempts, correct FROM analytics_counters WHERE dimension = 'all' AND key = ''"
+    ).fetchone()
+    attempts = row['attempts'] if row else 0
+    correct = row['correct'] if row else 0
+    return {
+        'total_attempts': attempts,
+        'correct_attempts': correct,
+        'avg_accuracy': (correct / attempts * 100) if attempts else 0
+    }
+
+
+def get_topic_performance(db):
+    """Per-topic attempts, correct attempts and average XP, busiest topics first"""
+    return db.execute(
+        '''SELECT key as topic, attempts as total_attempts, correct as correct_attempts,
+                  CAST(xp AS REAL) / attempts as avg_xp
+           FROM analytics_counters
+           WHERE dimension = 'topic' AND attempts > 0
+           ORDER BY attempts DESC'''
+    ).fetchall()
+
+
+def get_difficulty_performance(db):
+    """Per-difficulty attempts and correct attempts"""
+    return db.execute(
+        '''SELECT key as difficulty, attempts as total_attempts, correct as correct_attempts
+           FROM analytics_counters
+           WHERE dimension = 'difficulty' AND attempts > 0
+           ORDER BY key'''
+    ).fetchall()
@@ -6,22 +6,44 @@ Author: Your Name
 Date: 2024
 """
 from seed_data import seed_all
-from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify
+from flask import (Flask, render_template, request, redirect, url_for, session, flash, jsonify,
+                   Response, stream_with_context)
 from werkzeug.security import generate_password_hash, check_password_hash
 from werkzeug.utils import secure_filename
 import sqlite3
 import os
 import datetime
 from functools import wraps
-from database import init_db, get_db
-from logic import (calculate_xp, check_level_up, update_streak, check_badge_unlock,
-                  get_user_stats, get_leaderboard, get_accuracy_percentage,
-                  check_question_completion, record_question_completion, should_award_xp,
-                  generate_note_content, generate_question_content, log_content_generation)
+from database import init_db, get_db, init_app, get_pool_stats, get_storage_stats, index_search_rows
+from cache import get_cache_stats
+from catalog import get_catalog, bump_catalog_version, get_catalog_stats, DIFFICULTIES
+from progress import get_user_progress
+from analytics import (get_overview, get_topic_performance, get_difficulty_performance,
+                       move_question_aggregates)
+from jobs import start_job_worker, get_job_stats, wake_job_worker
+from batcher import configure_group_commit, get_group_commit_stats
+from exports import (EXPORT_FORMATS, stream_export, test_results_export, answer_matrix_export,
+                     practice_attempts_export, parse_export_date)
+from item_analysis import ITEM_FLAGS, ITEM_SORTS, schedule_item_analysis, last_computed_at
+from search import search_all, search_notes, build_match_query, SEARCH_SCOPES, ADMIN_SEARCH_LIMIT
+from fragments import get_fragment, purge_fragment, revision, page_etag, conditional_page
+from question_bank import (list_questions, parse_cursor, get_questions_by_ids, get_question_detail,
+                           question_summary, SEARCH_PAGE_SIZE)
+from leaderboard import (record_leaderboard_event, get_rank, get_neighbours, get_leaderboard_stats,
+                         get_window_leaderboard, get_window_rank, WINDOWS)
+from logic import (get_leaderboard, get_accuracy_percentage, check_question_completion,
+                  generate_note_content, generate_question_content, log_content_generation,
+                  submit_practice_answer, get_dashboard, save_test_answers, MAX_TEST_ANSWER_BATCH,
+                  finish_test_attempt, pin_answer_key, get_attempt_answer_key, get_answer_key_questions,
+                  bump_answer_key_version, attempt_deadline, seconds_remaining,
+                  is_attempt_expired, schedule_test_sweep)
 
 # Initialize Flask app
 app = Flask(__name__)
-from database import init_db, get_db
+# SQLite PRAGMA overrides, e.g. {'synchronous': 'FULL'} (keys of STORAGE_PROFILE in database.py).
+# Set before init_app so every connection, including the startup ones below, uses them.
+app.config['SQLITE_PROFILE'] = {}
+init_app(app)
 
 def initialize_app():
     """Initialize database and auto-seed if empty (cloud-safe)"""
@@ -43,6 +65,8 @@ def initialize_app():
         print("=" * 60)
         try:
             seed_all()
+            bump_catalog_version(db)
+            db.commit()
             print("=" * 60)
             print("✅ Database seeded successfully!")
             print("   - Tests, questions, and learning materials are now available")
@@ -63,31 +87,34 @@ app.secret_key = 'your-secret-key-change-in-production-2024-gamified-coding'
 app.config['DATABASE'] = 'gamified_coding.db'
 app.config['UPLOAD_FOLDER'] = 'static/uploads'
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
+app.config['JOB_WORKER'] = True  # run queued side effects (rollups) in a background thread
 
-# Create upload folder if it doesn't exist
-os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
-
-# Database is already initialized by initialize_app() above
 
+@app.before_request
+def ensure_job_worker():
+    """Start this process's job worker on its first request
+    
+    Never at import: under `gunicorn --preload` a thread started there only
+    lives in the master, and scripts or tests importing the app would run it.
+    """
+    if app.config['JOB_WORKER'] and start_job_worker():
+        # Finalize test attempts that ran out of time while no worker was running
+        db = get_db()
+        schedule_test_sweep(db)
+        db.commit()
 
-# ==================== UTILITY FUNCTIONS ====================
+# Group commit: batch concurrent answer submissions into shared transactions
+# (higher throughput under bursts, up to GROUP_COMMIT_DELAY_MS extra latency)
+app.config['GROUP_COMMIT'] = False
+app.config['GROUP_COMMIT_DELAY_MS'] = 5
 
-def normalize_answer(answer):
-    """Normalize answer for comparison - handles case, whitespace, and None values"""
-    if answer is None:
-        return ''
-    return ''.join(str(answer).split()).upper()
+if app.config['GROUP_COMMIT']:
+    configure_group_commit(max_delay_ms=app.config['GROUP_COMMIT_DELAY_MS'])
 
+# Create upload folder if it doesn't exist
+os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 
-def compare_answers(student_answer, correct_answer):
-    """Compare answers after normalization"""
-    student_norm = normalize_answer(student_answer)
-    correct_norm = normalize_answer(correct_answer)
-    
-    if not student_norm or not correct_norm:
-        return False
-    
-    return student_norm == correct_norm
+# Database is already initialized by initialize_app() above
 
 
 # ==================== DECORATORS ====================
@@ -137,6 +164,16 @@ def super_admin_required(f):
     return decorated_function
 
 
+def get_language_track():
+    """Logged-in user's language track, kept in the session after the first lookup"""
+    if 'language_track' not in session:
+        user = get_db().execute(
+            'SELECT language_track FROM users WHERE id = ?', (session['user_id'],)
+        ).fetchone()
+        session['language_track'] = user['language_track'] if user and user['language_track'] else 'python'
+    return session['language_track']
+
+
 # ==================== AUTHENTICATION ROUTES ====================
 
 @app.route('/')
@@ -199,6 +236,7 @@ def register():
                    VALUES (?, 0, 1, 0, ?)''',
                 (user_id, datetime.date.today())
             )
+            record_leaderboard_event(db, user_id)
             db.commit()
 
             flash('Registration successful! Please login.', 'success')
@@ -224,7 +262,7 @@ def login():
 
         db = get_db()
         user = db.execute(
-            'SELECT id, username, email, password, role FROM users WHERE username = ?',
+            'SELECT id, username, email, password, role, language_track FROM users WHERE username = ?',
             (username,)
         ).fetchone()
 
@@ -232,6 +270,7 @@ def login():
             session['user_id'] = user['id']
             session['username'] = user['username']
             session['role'] = user['role']
+            session['language_track'] = user['language_track'] or 'python'
 
             # Update last login
             db.execute(
@@ -266,145 +305,43 @@ def logout():
 @login_required
 def dashboard():
     """Student dashboard with stats and charts"""
-    db = get_db()
-    user_id = session['user_id']
-    
-    # Get user stats
-    stats = get_user_stats(user_id)
-    
-    # Get recent attempts
-    recent_attempts = db.execute(
-        '''SELECT q.title, a.is_correct, a.attempted_at, q.difficulty, q.topic
-           FROM attempts a
-           JOIN questions q ON a.question_id = q.id
-           WHERE a.user_id = ?
-           ORDER BY a.attempted_at DESC
-           LIMIT 10''',
-        (user_id,)
-    ).fetchall()
-
-    # Get topic-wise performance
-    topic_stats = db.execute(
-        '''SELECT q.topic, 
-                  COUNT(*) as total,
-                  SUM(CASE WHEN a.is_correct = 1 THEN 1 ELSE 0 END) as correct
-           FROM attempts a
-           JOIN questions q ON a.question_id = q.id
-           WHERE a.user_id = ?
-           GROUP BY q.topic''',
-        (user_id,)
-    ).fetchall()
-
-    # Get badges
-    badges = db.execute(
-        '''SELECT b.name, b.description, ub.earned_at
-           FROM user_badges ub
-           JOIN badges b ON ub.badge_id = b.id
-           WHERE ub.user_id = ?
-           ORDER BY ub.earned_at DESC''',
-        (user_id,)
-    ).fetchall()
-
-    # Get XP history for charts (last 30 days)
-    xp_history_raw = db.execute(
-        '''SELECT DATE(attempted_at) as date, SUM(xp_earned) as daily_xp
-           FROM attempts
-           WHERE user_id = ? AND attempted_at >= datetime('now', '-30 days')
-           GROUP BY DATE(attempted_at)
-           ORDER BY date''',
-        (user_id,)
-    ).fetchall()
-    
-    # Convert Row objects to dictionaries for JSON serialization
-    xp_history = [{'date': str(row['date']), 'daily_xp': int(row['daily_xp'])} for row in xp_history_raw]
-    
-    # Convert topic_stats to dictionaries as well
-    topic_stats_list = [{'topic': row['topic'], 'total': row['total'], 'correct': row['correct']} for row in topic_stats]
+    view = get_dashboard(session['user_id'])
 
     return render_template('dashboard.html', 
-                         stats=stats,
-                         recent_attempts=recent_attempts,
-                         topic_stats=topic_stats_list,
-                         badges=badges,
-                         xp_history=xp_history)
+                         stats=view['stats'],
+                         recent_attempts=view['recent_attempts'],
+                         topic_stats=view['topic_stats'],
+                         badges=view['badges'],
+                         xp_history=view['xp_history'])
 
 
 @app.route('/practice')
 @login_required
 def practice():
     """Practice page with questions organized by topic and level"""
-    db = get_db()
-    user_id = session['user_id']
-    
     # Get filter parameters
     topic = request.args.get('topic', '')
     difficulty = request.args.get('difficulty', '')
     
-    # Get user's language track
-    user = db.execute(
-        'SELECT language_track FROM users WHERE id = ?', (user_id,)
-    ).fetchone()
-    language_track = user['language_track'] if user else 'python'
+    # Questions come from the in-process catalog; no queries per view
+    catalog = get_catalog()
+    language_track = get_language_track()
     
-    # Build query - only active questions
-    query = '''SELECT id, title, difficulty, topic, points
-               FROM questions 
-               WHERE language_track = ? AND is_active = 1'''
-    params = [language_track]
-    
-    if topic:
-        query += ' AND topic = ?'
-        params.append(topic)
-    if difficulty:
-        query += ' AND difficulty = ?'
-        params.append(difficulty)
-    
-    query += ''' ORDER BY topic, 
-                     CASE difficulty
-                         WHEN "easy" THEN 1
-                         WHEN "medium" THEN 2
-                         WHEN "hard" THEN 3
-                     END, id'''
-    
-    questions = db.execute(query, params).fetchall()
-    
-    # Get unique topics and difficulties for filter (only active questions)
-    topics_list = db.execute(
-        'SELECT DISTINCT topic FROM questions WHERE language_track = ? AND is_active = 1 ORDER BY topic',
-        (language_track,)
-    ).fetchall()
+    questions = catalog.questions(language_track, topic or None, difficulty or None)
+    questions_by_topic = catalog.by_topic(language_track, topic or None, difficulty or None)
+    topics_list = catalog.topics(language_track)
     
-    # Organize questions by topic
-    questions_by_topic = {}
-    
-    # Initialize all topics with empty levels
-    for topic_row in topics_list:
-        topic_name = topic_row['topic']
-        if topic_name not in questions_by_topic:
-            questions_by_topic[topic_name] = {
-                'easy': [],
-                'medium': [],
-                'hard': []
-            }
-    
-    # Organize actual questions by topic and difficulty
-    for question in questions:
-        topic_name = question['topic']
-        if topic_name not in questions_by_topic:
-            questions_by_topic[topic_name] = {
-                'easy': [],
-                'medium': [],
-                'hard': []
-            }
-        questions_by_topic[topic_name][question['difficulty']].append(question)
+    # Solved/attempted overlay from the user's completion bitmaps
+    progress = get_user_progress(session['user_id'], language_track)
     
-    difficulties = ['easy', 'medium', 'hard']
+    difficulties = list(DIFFICULTIES)
     
     return render_template('practice.html',
                          questions=questions,
                          questions_by_topic=questions_by_topic,
                          topics=topics_list,
                          difficulties=difficulties,
+                         progress=progress,
                          selected_topic=topic,
                          selected_difficulty=difficulty)
 
@@ -458,127 +395,41 @@ def submit_answer():
         if not question_id or not selected_answer:
             return jsonify({'success': False, 'message': 'Invalid request: question_id and answer are required'}), 400
         
-        db = get_db()
         user_id = session['user_id']
         
-        # Get question
-        question = db.execute(
-            'SELECT * FROM questions WHERE id = ?', (question_id,)
-        ).fetchone()
+        # Grade and record the answer (completion, attempt, XP, streak, badges)
+        # in a single transaction
+        result = submit_practice_answer(user_id, question_id, selected_answer)
         
-        if not question:
+        if result is None:
             return jsonify({'success': False, 'message': 'Question not found'}), 404
         
-        # Check answer using normalized comparison
-        is_correct = compare_answers(selected_answer, question['correct_answer'])
-        
-        # MODULE 2: Check if XP should be awarded (prevent farming)
-        try:
-            should_award, award_reason = should_award_xp(user_id, question_id, is_correct)
-        except Exception as xp_check_error:
-            # If XP check fails, default to awarding XP
-            print(f"Error in should_award_xp: {str(xp_check_error)}")
-            should_award = True
-            award_reason = "error_fallback"
-        
-        # Calculate XP (but may be reduced if already completed)
-        if should_award:
-            xp_earned = calculate_xp(is_correct, question['difficulty'], question['points'])
-        else:
-            # Already completed - only give minimal participation XP for wrong answers
-            if is_correct:
-                xp_earned = 0  # No XP for repeated correct answers
-            else:
-                xp_earned = calculate_xp(False, question['difficulty'], question['points'])  # Participation only
-        
-        # Get the selected option text for feedback
-        selected_option_map = {
-            'A': question['option_a'],
-            'B': question['option_b'],
-            'C': question['option_c'],
-            'D': question['option_d']
-        }
-        selected_option_text = selected_option_map.get(selected_answer.upper(), 'Unknown')
+        question = result['question']
         
-        # Get correct option text
-        correct_option_map = {
+        # Get the option texts for feedback
+        option_map = {
             'A': question['option_a'],
             'B': question['option_b'],
             'C': question['option_c'],
             'D': question['option_d']
         }
-        correct_option_text = correct_option_map.get(question['correct_answer'].upper(), 'Unknown')
-        
-        # Record question completion (non-blocking - errors are handled inside)
-        try:
-            record_question_completion(user_id, question_id, is_correct)
-        except Exception as completion_error:
-            # Log but don't fail the request
-            print(f"Error in record_question_completion: {str(completion_error)}")
-        
-        # Save attempt
-        is_final_attempt = 1 if (is_correct and should_award) else 0
-        db.execute(
-            '''INSERT INTO attempts (user_id, question_id, selected_answer, is_correct, xp_earned, attempted_at, is_final_attempt)
-               VALUES (?, ?, ?, ?, ?, ?, ?)''',
-            (user_id, question_id, selected_answer, is_correct, xp_earned, datetime.datetime.now(), is_final_attempt)
-        )
-        
-        # Update user stats
-        user_stats = db.execute(
-            'SELECT xp, level FROM user_stats WHERE user_id = ?', (user_id,)
-        ).fetchone()
-        
-        # Initialize user stats if they don't exist
-        if not user_stats:
-            from datetime import date
-            db.execute(
-                '''INSERT INTO user_stats (user_id, xp, level, streak, last_activity_date)
-                   VALUES (?, 0, 1, 0, ?)''',
-                (user_id, date.today())
-            )
-            current_xp = 0
-            current_level = 1
-        else:
-            current_xp = user_stats['xp'] or 0
-            current_level = user_stats['level'] or 1
-        
-        new_xp = current_xp + xp_earned
-        new_level = check_level_up(new_xp)
-        
-        db.execute(
-            'UPDATE user_stats SET xp = ?, level = ? WHERE user_id = ?',
-            (new_xp, new_level, user_id)
-        )
-        
-        # Commit before calling other functions that might use database
-        db.commit()
-        
-        # Update streak (uses its own connection)
-        update_streak(user_id)
-        
-        # Check badge unlock (uses its own connection)
-        try:
-            badge_unlocked = check_badge_unlock(user_id, new_xp, new_level)
-        except Exception as badge_error:
-            # Don't fail the whole request if badge check fails
-            print(f"Badge unlock error: {str(badge_error)}")
-            badge_unlocked = []
+        selected_option_text = option_map.get(selected_answer.upper(), 'Unknown')
+        correct_option_text = option_map.get(question['correct_answer'].upper(), 'Unknown')
         
         return jsonify({
             'success': True,
-            'is_correct': is_correct,
-            'xp_earned': xp_earned,
-            'new_xp': new_xp,
-            'new_level': new_level,
+            'is_correct': result['is_correct'],
+            'xp_earned': result['xp_earned'],
+            'new_xp': result['new_xp'],
+            'new_level': result['new_level'],
             'correct_answer': question['correct_answer'],
             'correct_answer_text': correct_option_text,
             'selected_answer': selected_answer,
             'selected_answer_text': selected_option_text,
             'explanation': question['explanation'] or 'No explanation provided.',
-            'badge_unlocked': badge_unlocked,
-            'xp_awarded': should_award,
-            'award_reason': award_reason
+            'badge_unlocked': result['badge_unlocked'],
+            'xp_awarded': result['xp_awarded'],
+            'award_reason': result['award_reason']
         })
     except Exception as e:
         # Ensure we always return JSON, even on errors
@@ -589,13 +440,6 @@ def submit_answer():
             print(f"Error in submit_answer: {error_msg}")
             print(traceback.format_exc())
         
-        # Try to rollback any database changes if db was created
-        try:
-            if 'db' in locals():
-                db.rollback()
-        except Exception:
-            pass
-        
         return jsonify({
             'success': False,
             'message': f'An error occurred while processing your answer: {error_msg}',
@@ -606,9 +450,37 @@ def submit_answer():
 @app.route('/leaderboard')
 @login_required
 def leaderboard():
-    """Leaderboard page"""
-    leaderboard_data = get_leaderboard()
-    return render_template('leaderboard.html', leaderboard=leaderboard_data)
+    """Leaderboard page (all-time, daily, weekly, monthly; optionally per course)"""
+    db = get_db()
+    user_id = session['user_id']
+    window = request.args.get('window', 'all')
+    if window not in WINDOWS:
+        window = 'all'
+    course_id = request.args.get('course_id', type=int)
+    
+    my_rank = None
+    neighbours = []
+    
+    if window == 'all' and not course_id:
+        leaderboard_data = get_leaderboard()
+        
+        # Show the student's own position when they are outside the top list
+        my_rank = get_rank(user_id)
+        if my_rank and not any(entry['id'] == user_id for entry in leaderboard_data):
+            neighbours = get_neighbours(user_id)
+    else:
+        leaderboard_data = get_window_leaderboard(window, course_id=course_id)
+        if window != 'all' and not course_id:
+            my_rank = get_window_rank(user_id, window)
+    
+    courses = db.execute(
+        "SELECT id, name FROM courses WHERE status = 'active' ORDER BY name"
+    ).fetchall()
+    
+    return render_template('leaderboard.html', leaderboard=leaderboard_data,
+                         my_rank=my_rank, neighbours=neighbours,
+                         windows=('all',) + WINDOWS, selected_window=window,
+                         courses=courses, selected_course=course_id)
 
 
 # ==================== LEARNING AREA ROUTES ====================
@@ -697,7 +569,7 @@ def learn_topic(topic):
     ).fetchone()
     language_track = user['language_track'] if user else 'python'
     
-    query = '''SELECT * FROM learning_materials
+    query = '''SELECT {columns} FROM learning_materials
                WHERE topic = ? AND language_track = ?'''
     params = [topic, language_track]
     
@@ -712,9 +584,18 @@ def learn_topic(topic):
                         WHEN 'advanced' THEN 3
                     END, order_index'''
     
-    materials = db.execute(query, params).fetchall()
+    # The materials list is a cached fragment; full rows are only read to re-render it
+    versions = tuple(
+        tuple(row) for row in db.execute(query.format(columns='id, updated_at, created_at'), params)
+    )
+    materials_section = get_fragment(
+        'topic_materials', (language_track, topic, level), versions,
+        lambda: render_template('learn/_topic_materials.html',
+                                materials=db.execute(query.format(columns='*'), params).fetchall())
+    )
     
-    questions_query = 'SELECT * FROM questions WHERE topic = ? AND language_track = ?'
+    questions_query = '''SELECT id, title, difficulty, points, substr(question_text, 1, 100) as question_text
+                         FROM questions WHERE topic = ? AND language_track = ?'''
     questions_params = [topic, language_track]
     
     if level:
@@ -725,11 +606,17 @@ def learn_topic(topic):
     questions_query += ' ORDER BY difficulty, id'
     questions = db.execute(questions_query, questions_params).fetchall()
     
-    return render_template('learn/topic.html',
-                         topic=topic,
-                         materials=materials,
-                         questions=questions,
-                         selected_level=level)
+    progress = get_user_progress(user_id, language_track)
+    
+    etag = page_etag(materials_section.etag, topic, level,
+                     [(*question, progress.state(question['id'])) for question in questions],
+                     progress.topic_counts(topic), progress.completion_ratio(topic))
+    return conditional_page(etag, lambda: render_template('learn/topic.html',
+                                                          topic=topic,
+                                                          materials_section=materials_section.html,
+                                                          questions=questions,
+                                                          progress=progress,
+                                                          selected_level=level))
 
 
 @app.route('/learn/material/<int:material_id>')
@@ -739,25 +626,37 @@ def learn_material(material_id):
     db = get_db()
     
     material = db.execute(
-        'SELECT * FROM learning_materials WHERE id = ?', (material_id,)
+        '''SELECT id, title, topic, language_track, level, created_at, updated_at
+           FROM learning_materials WHERE id = ?''',
+        (material_id,)
     ).fetchone()
     
     if not material:
         flash('Learning material not found.', 'danger')
         return redirect(url_for('learn'))
     
+    # The body is a cached fragment; content is only read to re-render it
+    content = get_fragment(
+        'material', material_id, revision(material),
+        lambda: render_template('learn/_material_content.html', material=db.execute(
+            'SELECT content FROM learning_materials WHERE id = ?', (material_id,)
+        ).fetchone())
+    )
+    
     # Get related materials in same topic
     related = db.execute(
-        '''SELECT * FROM learning_materials
+        '''SELECT id, title, level FROM learning_materials
            WHERE topic = ? AND id != ? AND language_track = ?
            ORDER BY order_index
            LIMIT 5''',
         (material['topic'], material_id, material['language_track'])
     ).fetchall()
     
-    return render_template('learn/material.html',
-                         material=material,
-                         related=related)
+    etag = page_etag(content.etag, tuple(material), [tuple(row) for row in related])
+    return conditional_page(etag, lambda: render_template('learn/material.html',
+                                                          material=material,
+                                                          material_content=content.html,
+                                                          related=related))
 
 
 # ==================== ADMIN ROUTES ====================
@@ -771,7 +670,7 @@ def admin_dashboard():
     # Get statistics
     total_users = db.execute('SELECT COUNT(*) as count FROM users WHERE role = "student"').fetchone()['count']
     total_questions = db.execute('SELECT COUNT(*) as count FROM questions').fetchone()['count']
-    total_attempts = db.execute('SELECT COUNT(*) as count FROM attempts').fetchone()['count']
+    total_attempts = get_overview(db)['total_attempts']
     
     # Get recent activity
     recent_attempts = db.execute(
@@ -783,17 +682,15 @@ def admin_dashboard():
            LIMIT 10'''
     ).fetchall()
     
-    # Get user analytics
+    # Get user analytics (attempt counters are kept on user_stats)
     user_analytics = db.execute(
         '''SELECT us.user_id, u.username, us.xp, us.level, us.streak,
-                  COUNT(DISTINCT a.question_id) as questions_attempted,
-                  SUM(CASE WHEN a.is_correct = 1 THEN 1 ELSE 0 END) as correct_attempts,
-                  COUNT(*) as total_attempts
+                  COALESCE(us.questions_attempted, 0) as questions_attempted,
+                  COALESCE(us.correct_attempts, 0) as correct_attempts,
+                  COALESCE(us.total_attempts, 0) as total_attempts
            FROM user_stats us
            JOIN users u ON us.user_id = u.id
-           LEFT JOIN attempts a ON us.user_id = a.user_id
            WHERE u.role = 'student'
-           GROUP BY us.user_id, u.username, us.xp, us.level, us.streak
            ORDER BY us.xp DESC
            LIMIT 20'''
     ).fetchall()
@@ -809,63 +706,96 @@ def admin_dashboard():
 @app.route('/admin/questions')
 @admin_required
 def admin_questions():
-    """Manage questions"""
+    """Manage questions (one keyset page at a time)"""
     db = get_db()
     
     # Get filter parameters
-    topic = request.args.get('topic', '')
-    difficulty = request.args.get('difficulty', '')
-    
-    subject = request.args.get('subject', '')
-    show_inactive = request.args.get('show_inactive', '0') == '1'
-    
-    query = 'SELECT * FROM questions WHERE 1=1'
-    params = []
-    
-    if topic:
-        query += ' AND topic = ?'
-        params.append(topic)
-    if difficulty:
-        query += ' AND difficulty = ?'
-        params.append(difficulty)
-    if subject:
-        query += ' AND subject = ?'
-        params.append(subject)
-    if not show_inactive:
-        query += ' AND is_active = 1'
-    
-    query += ' ORDER BY subject, topic, difficulty, id DESC'
+    flag = request.args.get('flag', '')
+    sort = request.args.get('sort', '')
+    filters = {
+        'topic': request.args.get('topic', ''),
+        'difficulty': request.args.get('difficulty', ''),
+        'subject': request.args.get('subject', ''),
+        'search': request.args.get('q', '').strip(),
+        'show_inactive': request.args.get('show_inactive', '0') == '1',
+        'flag': flag if flag in ITEM_FLAGS else '',
+        'sort': sort if sort in ITEM_SORTS else ''
+    }
+    after = parse_cursor(request.args.get('after', ''), filters['sort'])
     
-    questions = db.execute(query, params).fetchall()
+    questions, next_cursor = list_questions(db, after=after, **filters)
     
     topics = db.execute('SELECT DISTINCT topic FROM questions ORDER BY topic').fetchall()
     subjects = db.execute('SELECT DISTINCT subject FROM questions WHERE subject IS NOT NULL ORDER BY subject').fetchall()
     difficulties = ['easy', 'medium', 'hard']
     
-    # Group questions by subject → topic → difficulty for better organization
-    questions_by_subject = {}
-    for q in questions:
-        subj = q.get('subject', 'Python') or 'Python'
-        top = q['topic']
-        diff = q['difficulty']
-        
-        if subj not in questions_by_subject:
-            questions_by_subject[subj] = {}
-        if top not in questions_by_subject[subj]:
-            questions_by_subject[subj][top] = {'easy': [], 'medium': [], 'hard': []}
-        
-        questions_by_subject[subj][top][diff].append(q)
+    # Query string for the page links (unset filters left out)
+    page_args = {key: value for key, value in request.args.items() if key != 'after' and value}
     
     return render_template('admin/questions.html',
                          questions=questions,
-                         questions_by_subject=questions_by_subject,
                          topics=topics,
                          subjects=subjects,
                          difficulties=difficulties,
-                         selected_topic=topic,
-                         selected_difficulty=difficulty,
-                         selected_subject=subject,
-                         show_inactive=show_inactive)
+                         selected_topic=filters['topic'],
+                         selected_difficulty=filters['difficulty'],
+                         selected_subject=filters['subject'],
+                         search=filters['search'],
+                         show_inactive=filters['show_inactive'],
+                         item_flags=ITEM_FLAGS,
+                         selected_sort=filters['sort'],
+                         selected_flag=filters['flag'],
+                         stats_computed_at=last_computed_at(db),
+                         next_cursor=next_cursor,
+                         is_first_page=after is None,
+                         page_args=page_args)
+
+
+@app.route('/admin/questions/search')
+@admin_required
+def admin_search_questions():
+    """Admin: JSON page of question summaries for the test builder"""
+    db = get_db()
+    questions, next_cursor = list_questions(
+        db,
+        topic=request.args.get('topic', ''),
+        difficulty=request.args.get('difficulty', ''),
+        search=request.args.get('q', '').strip(),
+        show_inactive=True,
+        after=parse_cursor(request.args.get('after', '')),
+        limit=SEARCH_PAGE_SIZE
+    )
+    return jsonify({
+        'success': True,
+        'questions': [question_summary(q) for q in questions],
+        'next_cursor': next_cursor
+    })
+
+
+@app.route('/admin/question/<int:question_id>/preview')
+@admin_required
+def admin_preview_question(question_id):
+    """Admin: full question body as JSON (loaded on demand by the lists)"""
+    question = get_question_detail(get_db(), question_id)
+    if question is None:
+        return jsonify({'success': False, 'message': 'Question not found'}), 404
+    return jsonify({'success': True, 'question': question})
+
+
+@app.route('/admin/questions/item-stats', methods=['POST'])
+@admin_required
+def admin_recompute_item_stats():
+    """Queue a recompute of the question item statistics"""
+    db = get_db()
+    try:
+        schedule_item_analysis(db)
+        db.commit()
+        wake_job_worker()
+        flash('Item statistics will be recomputed in the background.', 'success')
+    except Exception as e:
+        db.rollback()
+        flash(f'Failed to queue item statistics: {str(e)}', 'danger')
+    return redirect(url_for('admin_questions'))
 
 
 @app.route('/admin/question/add', methods=['GET', 'POST'])
@@ -902,6 +832,7 @@ def admin_add_question():
                 (title, question_text, option_a, option_b, option_c, option_d, correct_answer,
                  explanation, difficulty, topic, subject, language_track, points, 1 if is_active else 0, datetime.datetime.now())
             )
+            bump_catalog_version(db)
             db.commit()
             flash('Question added successfully!', 'success')
             return redirect(url_for('admin_questions'))
@@ -950,6 +881,10 @@ def admin_edit_question(question_id):
                 (title, question_text, option_a, option_b, option_c, option_d, correct_answer,
                  explanation, difficulty, topic, language_track, points, question_id)
             )
+            bump_catalog_version(db)
+            bump_answer_key_version(db, question_id=question_id)
+            move_question_aggregates(db, question_id, question['topic'], question['difficulty'],
+                                     topic, difficulty)
             db.commit()
             flash('Question updated successfully!', 'success')
             return redirect(url_for('admin_questions'))
@@ -967,7 +902,13 @@ def admin_delete_question(question_id):
     """Delete question"""
     db = get_db()
     try:
+        question = db.execute('SELECT topic, difficulty FROM questions WHERE id = ?', (question_id,)).fetchone()
+        if question:
+            move_question_aggregates(db, question_id, question['topic'], question['difficulty'])
+        bump_answer_key_version(db, question_id=question_id)
         db.execute('DELETE FROM questions WHERE id = ?', (question_id,))
+        db.execute('DELETE FROM question_item_stats WHERE question_id = ?', (question_id,))
+        bump_catalog_version(db)
         db.commit()
         flash('Question deleted successfully!', 'success')
     except Exception as e:
@@ -990,6 +931,7 @@ def admin_toggle_question(question_id):
         
         new_status = 0 if question['is_active'] else 1
         db.execute('UPDATE questions SET is_active = ? WHERE id = ?', (new_status, question_id))
+        bump_catalog_version(db)
         db.commit()
         
         status_text = 'enabled' if new_status else 'disabled'
@@ -1006,36 +948,18 @@ def admin_analytics():
     """Analytics and reporting"""
     db = get_db()
     
-    # Overall statistics
+    # Overall statistics (attempt figures come from the analytics counters)
+    overview = get_overview(db)
     stats = {
         'total_users': db.execute('SELECT COUNT(*) as count FROM users WHERE role="student"').fetchone()['count'],
         'total_questions': db.execute('SELECT COUNT(*) as count FROM questions').fetchone()['count'],
-        'total_attempts': db.execute('SELECT COUNT(*) as count FROM attempts').fetchone()['count'],
-        'avg_accuracy': db.execute(
-            'SELECT AVG(CASE WHEN is_correct=1 THEN 100 ELSE 0 END) as avg FROM attempts'
-        ).fetchone()['avg'] or 0
+        'total_attempts': overview['total_attempts'],
+        'avg_accuracy': overview['avg_accuracy']
     }
     
-    # Topic performance
-    topic_performance = db.execute(
-        '''SELECT q.topic, COUNT(*) as total_attempts,
-                  SUM(CASE WHEN a.is_correct=1 THEN 1 ELSE 0 END) as correct_attempts,
-                  AVG(a.xp_earned) as avg_xp
-           FROM attempts a
-           JOIN questions q ON a.question_id = q.id
-           GROUP BY q.topic
-           ORDER BY total_attempts DESC'''
-    ).fetchall()
-    
-    # Difficulty performance
-    difficulty_performance = db.execute(
-        '''SELECT q.difficulty, COUNT(*) as total_attempts,
-                  SUM(CASE WHEN a.is_correct=1 THEN 1 ELSE 0 END) as correct_attempts
-           FROM attempts a
-           JOIN questions q ON a.question_id = q.id
-           GROUP BY q.difficulty
-           ORDER BY q.difficulty'''
-    ).fetchall()
+    # Topic and difficulty performance
+    topic_performance = get_topic_performance(db)
+    difficulty_performance = get_difficulty_performance(db)
     
     return render_template('admin/analytics.html',
                          stats=stats,
@@ -1043,6 +967,21 @@ def admin_analytics():
                          difficulty_performance=difficulty_performance)
 
 
+@app.route('/admin/metrics')
+@admin_required
+def admin_metrics():
+    """Admin: Runtime performance metrics (JSON)"""
+    return jsonify({
+        'db_pool': get_pool_stats(),
+        'storage': get_storage_stats(),
+        'leaderboard': get_leaderboard_stats(),
+        'caches': get_cache_stats(),
+        'practice_catalog': get_catalog_stats(),
+        'jobs': get_job_stats(),
+        'group_commit': get_group_commit_stats()
+    })
+
+
 # ==================== MODULE 1: LEARNING AREA (SUBJECTS → TOPICS → NOTES) ====================
 
 @app.route('/learn/subject/<int:subject_id>')
@@ -1069,12 +1008,13 @@ def view_topic_notes(topic_id):
     """View notes in a topic"""
     db = get_db()
     notes = db.execute(
-        '''SELECT * FROM notes WHERE topic_id = ? AND visibility = 'published'
+        '''SELECT id, title, visibility, created_at FROM notes WHERE topic_id = ? AND visibility = 'published'
            ORDER BY order_index, created_at''',
         (topic_id,)
     ).fetchall()
     topic = db.execute(
-        'SELECT t.*, s.name as subject_name FROM topics t JOIN subjects s ON t.subject_id = s.id WHERE t.id = ?',
+        '''SELECT t.id, t.name, t.description, t.subject_id, s.name as subject_name
+           FROM topics t JOIN subjects s ON t.subject_id = s.id WHERE t.id = ?''',
         (topic_id,)
     ).fetchone()
     
@@ -1082,7 +1022,8 @@ def view_topic_notes(topic_id):
         flash('Topic not found.', 'danger')
         return redirect(url_for('learn'))
     
-    return render_template('learn/topic_notes.html', topic=topic, notes=notes)
+    etag = page_etag(tuple(topic), [tuple(note) for note in notes])
+    return conditional_page(etag, lambda: render_template('learn/topic_notes.html', topic=topic, notes=notes))
 
 
 @app.route('/learn/note/<int:note_id>')
@@ -1091,7 +1032,8 @@ def view_note(note_id):
     """View a specific note"""
     db = get_db()
     note = db.execute(
-        '''SELECT n.*, t.name as topic_name, t.subject_id, s.name as subject_name
+        '''SELECT n.id, n.topic_id, n.title, n.visibility, n.created_at, n.updated_at,
+                  t.name as topic_name, t.subject_id, s.name as subject_name
            FROM notes n
            JOIN topics t ON n.topic_id = t.id
            JOIN subjects s ON t.subject_id = s.id
@@ -1103,7 +1045,52 @@ def view_note(note_id):
         flash('Note not found or not published.', 'danger')
         return redirect(url_for('learn'))
     
-    return render_template('learn/note.html', note=note)
+    # The body is a cached fragment; content is only read to re-render it
+    content = get_fragment(
+        'note', note_id, revision(note),
+        lambda: render_template('learn/_note_content.html', note=db.execute(
+            'SELECT content FROM notes WHERE id = ?', (note_id,)
+        ).fetchone())
+    )
+    
+    etag = page_etag(content.etag, tuple(note))
+    return conditional_page(etag, lambda: render_template('learn/note.html', note=note,
+                                                          note_content=content.html))
+
+
+def run_search(text, scope=''):
+    """Search results for the current user, each with the URL it links to"""
+    is_admin = session.get('role') == 'admin'
+    scopes = (scope,) if scope in SEARCH_SCOPES else SEARCH_SCOPES
+    results = search_all(get_db(), text, scopes=scopes, is_admin=is_admin)
+    for note in results.get('notes', []):
+        note['url'] = url_for('view_note', note_id=note['id'])
+    for material in results.get('materials', []):
+        material['url'] = url_for('learn_material', material_id=material['id'])
+    for question in results.get('questions', []):
+        if is_admin:
+            question['url'] = url_for('admin_edit_question', question_id=question['id'])
+        else:
+            question['url'] = url_for('question_detail', question_id=question['id'])
+    return results
+
+
+@app.route('/search')
+@login_required
+def search_json():
+    """Ranked, highlighted search results as JSON (title and snippet are HTML with <mark>)"""
+    text = request.args.get('q', '').strip()
+    return jsonify({'success': True, 'query': text, 'results': run_search(text, request.args.get('scope', ''))})
+
+
+@app.route('/learn/search')
+@login_required
+def learn_search():
+    """Search notes, learning materials and questions"""
+    text = request.args.get('q', '').strip()
+    scope = request.args.get('scope', '')
+    return render_template('learn/search.html', query=text, scope=scope,
+                           results=run_search(text, scope) if text else None)
 
 
 # ==================== ADMIN: LEARNING AREA MANAGEMENT ====================
@@ -1207,6 +1194,19 @@ def admin_notes():
     """Admin: Manage notes"""
     db = get_db()
     topic_id = request.args.get('topic_id', '')
+    search = request.args.get('q', '').strip()
+    topics = db.execute(
+        '''SELECT t.*, s.name as subject_name FROM topics t
+           JOIN subjects s ON t.subject_id = s.id
+           ORDER BY s.name, t.name'''
+    ).fetchall()
+    
+    # A search lists matching notes best first, with the matches highlighted
+    match = build_match_query(search)
+    if match:
+        notes = search_notes(db, match, include_drafts=True, topic_id=topic_id, limit=ADMIN_SEARCH_LIMIT)
+        return render_template('admin/notes.html', notes=notes, topics=topics, selected_topic=topic_id,
+                               search=search)
     
     query = '''SELECT n.*, t.name as topic_name, s.name as subject_name
                FROM notes n
@@ -1220,13 +1220,8 @@ def admin_notes():
     
     query += ' ORDER BY s.name, t.name, n.order_index, n.title'
     notes = db.execute(query, params).fetchall()
-    topics = db.execute(
-        '''SELECT t.*, s.name as subject_name FROM topics t
-           JOIN subjects s ON t.subject_id = s.id
-           ORDER BY s.name, t.name'''
-    ).fetchall()
     
-    return render_template('admin/notes.html', notes=notes, topics=topics, selected_topic=topic_id)
+    return render_template('admin/notes.html', notes=notes, topics=topics, selected_topic=topic_id, search=search)
 
 
 @app.route('/admin/note/add', methods=['GET', 'POST'])
@@ -1251,11 +1246,12 @@ def admin_add_note():
             return render_template('admin/add_note.html', topics=topics)
         
         try:
-            db.execute(
+            cursor = db.execute(
                 '''INSERT INTO notes (topic_id, title, content, visibility, created_at, updated_at, created_by)
                    VALUES (?, ?, ?, ?, ?, ?, ?)''',
                 (topic_id, title, content, visibility, datetime.datetime.now(), datetime.datetime.now(), session['user_id'])
             )
+            index_search_rows(db, 'notes_fts', [cursor.lastrowid])
             db.commit()
             flash('Note added successfully!', 'success')
             return redirect(url_for('admin_notes'))
@@ -1288,7 +1284,9 @@ def admin_generate_note(note_id):
             'UPDATE notes SET content = ?, updated_at = ? WHERE id = ?',
             (generated_content, datetime.datetime.now(), note_id)
         )
+        index_search_rows(db, 'notes_fts', [note_id])
         db.commit()
+        purge_fragment('note', note_id)
         
         # Log generation
         log_content_generation('note', note_id, 'placeholder', session['user_id'])
@@ -1320,13 +1318,22 @@ def student_tests():
         (user_id,)
     ).fetchall()
     
+    # In-progress attempts (expired ones are finalized by the test sweeper)
+    in_progress = {
+        row['test_id']: seconds_remaining(row) for row in db.execute(
+            '''SELECT test_id, deadline FROM test_attempts
+               WHERE status = 'in_progress' AND user_id = ?''',
+            (user_id,)
+        ).fetchall()
+    }
+    
     # Debug logging (temporary - can be removed after verification)
     if app.debug:
         total_tests = db.execute('SELECT COUNT(*) as count FROM tests').fetchone()['count']
         published_tests = db.execute("SELECT COUNT(*) as count FROM tests WHERE status = 'published'").fetchone()['count']
         print(f"DEBUG: student_tests - Total tests in DB: {total_tests}, Published: {published_tests}, Returned: {len(tests)}")
     
-    return render_template('tests/list.html', tests=tests)
+    return render_template('tests/list.html', tests=tests, in_progress=in_progress)
 
 
 @app.route('/test/<int:test_id>')
@@ -1370,16 +1377,29 @@ def start_test(test_id):
     ).fetchone()
     
     if in_progress:
+        if is_attempt_expired(in_progress):
+            return finalize_expired_attempt(db, in_progress)
         # Continue existing attempt
         return redirect(url_for('take_test', test_id=test_id))
     
-    # Create new test attempt (allows retakes)
+    test = db.execute('SELECT time_limit_minutes FROM tests WHERE id = ?', (test_id,)).fetchone()
+    if not test:
+        flash('Test not found.', 'danger')
+        return redirect(url_for('student_tests'))
+    
+    # Create new test attempt (allows retakes), graded against the answer
+    # key as it is now even if the test is edited while it is being taken
     try:
+        started_at = datetime.datetime.now()
+        deadline = attempt_deadline(started_at, test['time_limit_minutes'])
+        answer_key_version = pin_answer_key(db, test_id)
         db.execute(
-            '''INSERT INTO test_attempts (test_id, user_id, started_at, status)
-               VALUES (?, ?, ?, 'in_progress')''',
-            (test_id, user_id, datetime.datetime.now())
+            '''INSERT INTO test_attempts (test_id, user_id, started_at, status, answer_key_version, deadline)
+               VALUES (?, ?, ?, 'in_progress', ?, ?)''',
+            (test_id, user_id, started_at, answer_key_version, deadline)
         )
+        if deadline:
+            schedule_test_sweep(db, deadline)
         db.commit()
         return redirect(url_for('take_test', test_id=test_id))
     except Exception as e:
@@ -1405,15 +1425,12 @@ def take_test(test_id):
         flash('No active test attempt found.', 'warning')
         return redirect(url_for('view_test', test_id=test_id))
     
-    # Get test questions
-    questions = db.execute(
-        '''SELECT q.*, tq.points, tq.order_index
-           FROM test_questions tq
-           JOIN questions q ON tq.question_id = q.id
-           WHERE tq.test_id = ?
-           ORDER BY tq.order_index''',
-        (test_id,)
-    ).fetchall()
+    if is_attempt_expired(attempt):
+        return finalize_expired_attempt(db, attempt)
+    
+    # Get test questions (the version of the test this attempt is graded on)
+    answer_key = get_attempt_answer_key(db, attempt)
+    questions = get_answer_key_questions(db, answer_key) if answer_key else []
     
     # Get already answered questions
     answered = db.execute(
@@ -1424,7 +1441,31 @@ def take_test(test_id):
     
     test = db.execute('SELECT * FROM tests WHERE id = ?', (test_id,)).fetchone()
     
-    return render_template('tests/take.html', test=test, questions=questions, attempt=attempt, answered=answered_dict)
+    return render_template('tests/take.html', test=test, questions=questions, attempt=attempt,
+                           answered=answered_dict, seconds_left=seconds_remaining(attempt))
+
+
+def get_active_test_attempt(db, test_id, user_id):
+    """Latest in-progress attempt of a test by a user, or None"""
+    return db.execute(
+        'SELECT * FROM test_attempts WHERE test_id = ? AND user_id = ? AND status = "in_progress" ORDER BY started_at DESC LIMIT 1',
+        (test_id, user_id)
+    ).fetchone()
+
+
+def finalize_expired_attempt(db, attempt):
+    """Submit an attempt that ran out of time with the answers saved before its deadline"""
+    try:
+        finish_test_attempt(db, attempt)
+    except Exception as e:
+        print(f"Error finalizing expired test attempt {attempt['id']}: {str(e)}")
+    flash('Time is up for this test. The answers saved before the deadline were submitted.', 'warning')
+    return redirect(url_for('test_results', test_id=attempt['test_id']))
+
+
+def expired_attempt_response():
+    """JSON error for answers sent after the attempt's deadline"""
+    return jsonify({'success': False, 'expired': True, 'message': 'Time is up for this test'}), 409
 
 
 @app.route('/test/<int:test_id>/submit_answer', methods=['POST'])
@@ -1451,101 +1492,83 @@ def submit_test_answer(test_id):
         return jsonify({'success': False, 'message': f'Invalid request: {str(e)}'}), 400
     
     db = get_db()
-    user_id = session['user_id']
-    
-    # Get active attempt
-    attempt = db.execute(
-        'SELECT * FROM test_attempts WHERE test_id = ? AND user_id = ? AND status = "in_progress" ORDER BY started_at DESC LIMIT 1',
-        (test_id, user_id)
-    ).fetchone()
-    
+    attempt = get_active_test_attempt(db, test_id, session['user_id'])
     if not attempt:
         return jsonify({'success': False, 'message': 'No active test attempt'}), 400
+    if is_attempt_expired(attempt):
+        return expired_attempt_response()
     
-    # Get question
-    question = db.execute('SELECT * FROM questions WHERE id = ?', (question_id,)).fetchone()
-    if not question:
-        return jsonify({'success': False, 'message': 'Question not found'}), 404
-    
-    # Check answer using normalized comparison
-    is_correct = compare_answers(selected_answer, question['correct_answer'])
-    
-    # Additional debug logging
-    if app.debug:
-        print(f"DEBUG: submit_test_answer - Question ID: {question_id}")
-        print(f"DEBUG: Student Answer (raw): {repr(selected_answer)}")
-        print(f"DEBUG: Correct Answer (raw): {repr(question['correct_answer'])}")
-        print(f"DEBUG: Is Correct: {is_correct}")
-    
-    # Get points for this question in test
-    test_question = db.execute(
-        'SELECT points FROM test_questions WHERE test_id = ? AND question_id = ?',
-        (test_id, question_id)
-    ).fetchone()
-    points = test_question['points'] if test_question else 1
+    try:
+        saved, _, rejected = save_test_answers(
+            db, get_attempt_answer_key(db, attempt), attempt['id'],
+            [{'question_id': int(question_id), 'answer': selected_answer}]
+        )
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        return jsonify({'success': False, 'message': f'Failed to save answer: {str(e)}'}), 500
     
-    points_earned = points if is_correct else 0
+    if rejected:
+        return jsonify({'success': False, 'message': 'Question not found in this test'}), 404
     
-    # Save or update answer
-    existing = db.execute(
-        'SELECT id FROM test_attempt_answers WHERE test_attempt_id = ? AND question_id = ?',
-        (attempt['id'], question_id)
-    ).fetchone()
+    result = saved[0]
+    return jsonify(dict(
+        result,
+        success=True,
+        message='Answer saved successfully' + (' - Correct!' if result['is_correct'] else ' - Incorrect')
+    ))
+
+
+@app.route('/test/<int:test_id>/answers', methods=['POST'])
+@login_required
+def save_test_answers_batch(test_id):
+    """Student: Autosave a batch of test answers in one transaction
+    
+    Body: {"answers": [{"question_id": 1, "answer": "A", "client_ts": 1700000000000}, ...]}
+    """
+    data = request.get_json(silent=True)
+    entries = data.get('answers') if isinstance(data, dict) else None
+    if not isinstance(entries, list) or not entries:
+        return jsonify({'success': False, 'message': 'answers must be a non-empty list'}), 400
+    if len(entries) > MAX_TEST_ANSWER_BATCH:
+        return jsonify({'success': False, 'message': f'At most {MAX_TEST_ANSWER_BATCH} answers per request'}), 400
     
-    # Store is_correct as integer (1 or 0) for SQLite compatibility
-    is_correct_int = 1 if is_correct else 0
+    try:
+        cleaned = []
+        for entry in entries:
+            answer = str(entry.get('answer', '')).strip()
+            if not answer:
+                continue
+            client_ts = entry.get('client_ts')
+            cleaned.append({
+                'question_id': int(entry['question_id']),
+                'answer': answer,
+                'client_ts': int(client_ts) if client_ts is not None else None
+            })
+    except (KeyError, TypeError, ValueError, AttributeError) as e:
+        return jsonify({'success': False, 'message': f'Invalid answer entry: {str(e)}'}), 400
     
-    # Normalize selected_answer for storage (A, B, C, D)
-    selected_answer_normalized = normalize_answer(selected_answer)
+    db = get_db()
+    attempt = get_active_test_attempt(db, test_id, session['user_id'])
+    if not attempt:
+        return jsonify({'success': False, 'message': 'No active test attempt'}), 400
+    if is_attempt_expired(attempt):
+        return expired_attempt_response()
     
+    answer_key = get_attempt_answer_key(db, attempt)
+    db.execute('BEGIN IMMEDIATE')
     try:
-        if existing:
-            db.execute(
-                'UPDATE test_attempt_answers SET selected_answer = ?, is_correct = ?, points_earned = ? WHERE id = ?',
-                (selected_answer_normalized, is_correct_int, points_earned, existing['id'])
-            )
-            if app.debug:
-                print(f"DEBUG: Updated existing answer record {existing['id']}")
-                print(f"DEBUG:   Stored: selected_answer='{selected_answer_normalized}', is_correct={is_correct_int}, points={points_earned}")
-        else:
-            db.execute(
-                '''INSERT INTO test_attempt_answers (test_attempt_id, question_id, selected_answer, is_correct, points_earned, answered_at)
-                   VALUES (?, ?, ?, ?, ?, ?)''',
-                (attempt['id'], question_id, selected_answer_normalized, is_correct_int, points_earned, datetime.datetime.now())
-            )
-            if app.debug:
-                print(f"DEBUG: Inserted new answer record for question {question_id}")
-                print(f"DEBUG:   Stored: selected_answer='{selected_answer_normalized}', is_correct={is_correct_int}, points={points_earned}")
-        
+        saved, stale, rejected = save_test_answers(db, answer_key, attempt['id'], cleaned)
         db.commit()
-        
-        # Verify the save
-        saved = db.execute(
-            'SELECT * FROM test_attempt_answers WHERE test_attempt_id = ? AND question_id = ?',
-            (attempt['id'], question_id)
-        ).fetchone()
-        
-        if app.debug:
-            if saved:
-                print(f"DEBUG: Verified saved answer - question_id: {question_id}, selected: '{saved['selected_answer']}', is_correct: {saved['is_correct']}, points: {saved['points_earned']}")
-            else:
-                print(f"DEBUG: ERROR - Answer was not saved! question_id: {question_id}, attempt_id: {attempt['id']}")
-            
     except Exception as e:
         db.rollback()
-        if app.debug:
-            print(f"DEBUG: Error saving answer: {str(e)}")
-        return jsonify({'success': False, 'message': f'Failed to save answer: {str(e)}'}), 500
+        return jsonify({'success': False, 'message': f'Failed to save answers: {str(e)}'}), 500
     
     return jsonify({
         'success': True,
-        'is_correct': 1 if is_correct else 0,  # Return as integer for consistency with SQLite
-        'correct_answer': question['correct_answer'],
-        'selected_answer': selected_answer_normalized,  # Return normalized for consistency
-        'explanation': question['explanation'] if question['explanation'] else '',
-        'points_earned': points_earned,
-        'total_points': points,
-        'message': 'Answer saved successfully' + (' - Correct!' if is_correct else ' - Incorrect')
+        'saved': saved,
+        'stale': stale,
+        'rejected': rejected
     })
 
 
@@ -1556,160 +1579,35 @@ def finish_test(test_id):
     db = get_db()
     user_id = session['user_id']
     
-    # Get active attempt
-    attempt = db.execute(
-        'SELECT * FROM test_attempts WHERE test_id = ? AND user_id = ? AND status = "in_progress" ORDER BY started_at DESC LIMIT 1',
-        (test_id, user_id)
-    ).fetchone()
+    attempt = get_active_test_attempt(db, test_id, user_id)
     
     if not attempt:
         flash('No active test attempt found.', 'danger')
         return redirect(url_for('view_test', test_id=test_id))
     
-    # CRITICAL FIX: Also capture answers from form submission (backup in case AJAX failed)
-    # Get all test questions to match form data
-    test_questions = db.execute(
-        'SELECT question_id FROM test_questions WHERE test_id = ?',
-        (test_id,)
-    ).fetchall()
-    
-    # Process form data if present (backup for answers not saved via AJAX)
-    form_answers_saved = 0
-    for tq in test_questions:
-        question_id = tq['question_id']
-        form_answer_key = f'answer_{question_id}'
-        form_answer = request.form.get(form_answer_key, '').strip()
-        
-        if form_answer:
-            # Check if answer already exists in database
-            existing = db.execute(
-                'SELECT id FROM test_attempt_answers WHERE test_attempt_id = ? AND question_id = ?',
-                (attempt['id'], question_id)
-            ).fetchone()
-            
-            if not existing:
-                # Answer not saved via AJAX, save it now from form
-                question = db.execute('SELECT correct_answer FROM questions WHERE id = ?', (question_id,)).fetchone()
-                if question:
-                    is_correct = compare_answers(form_answer, question['correct_answer'])
-                    test_q = db.execute('SELECT points FROM test_questions WHERE test_id = ? AND question_id = ?', 
-                                       (test_id, question_id)).fetchone()
-                    points = test_q['points'] if test_q else 1
-                    points_earned = points if is_correct else 0
-                    
-                    db.execute(
-                        '''INSERT INTO test_attempt_answers (test_attempt_id, question_id, selected_answer, is_correct, points_earned, answered_at)
-                           VALUES (?, ?, ?, ?, ?, ?)''',
-                        (attempt['id'], question_id, normalize_answer(form_answer), 1 if is_correct else 0, points_earned, datetime.datetime.now())
-                    )
-                    form_answers_saved += 1
-                    if app.debug:
-                        print(f"DEBUG: Saved answer from form for question {question_id}: '{form_answer}' -> is_correct={is_correct}")
-    
-    if form_answers_saved > 0:
-        db.commit()
-        if app.debug:
-            print(f"DEBUG: Saved {form_answers_saved} answers from form submission")
-    
-    # Calculate score - re-verify all answers to ensure correctness
-    answers = db.execute(
-        'SELECT * FROM test_attempt_answers WHERE test_attempt_id = ?',
-        (attempt['id'],)
-    ).fetchall()
-    
-    if app.debug:
-        print(f"DEBUG: finish_test - Found {len(answers)} saved answers")
-        print(f"DEBUG: request.form keys: {list(request.form.keys())}")
-        for key in request.form.keys():
-            if key.startswith('answer_'):
-                print(f"DEBUG:   Form answer {key}: {request.form.get(key)}")
-    
-    # Re-verify all answers to ensure correctness (double-check)
-    for answer in answers:
-        question = db.execute('SELECT correct_answer FROM questions WHERE id = ?', (answer['question_id'],)).fetchone()
-        if question:
-            # Use normalized comparison function
-            selected_ans = answer['selected_answer']
-            correct_ans = question['correct_answer']
-            
-            # Handle None or empty selected_answer
-            if not selected_ans or selected_ans == 'None' or selected_ans == '':
-                if app.debug:
-                    print(f"DEBUG: WARNING - Answer {answer['id']} (question_id: {answer['question_id']}) has empty selected_answer: {repr(selected_ans)}")
-                should_be_correct = False
-            else:
-                should_be_correct = compare_answers(selected_ans, correct_ans)
-            
-            # Update if mismatch found
-            current_is_correct = bool(answer['is_correct'] == 1 or answer['is_correct'] is True)
-            
-            if app.debug:
-                print(f"DEBUG: finish_test - Re-verifying answer {answer['id']} (question_id: {answer['question_id']})")
-                print(f"DEBUG:   Current is_correct: {current_is_correct}")
-                print(f"DEBUG:   Should be correct: {should_be_correct}")
-                print(f"DEBUG:   Selected (raw): {repr(selected_ans)}")
-                print(f"DEBUG:   Correct (raw): {repr(correct_ans)}")
-            
-            if current_is_correct != should_be_correct:
-                points = answer['points_earned'] if answer['points_earned'] else 0
-                if should_be_correct:
-                    # Get points for this question
-                    test_q = db.execute('SELECT points FROM test_questions WHERE test_id = ? AND question_id = ?', 
-                                       (test_id, answer['question_id'])).fetchone()
-                    points = test_q['points'] if test_q else 1
-                else:
-                    points = 0
-                
-                db.execute(
-                    'UPDATE test_attempt_answers SET is_correct = ?, points_earned = ? WHERE id = ?',
-                    (1 if should_be_correct else 0, points, answer['id'])
-                )
-                if app.debug:
-                    print(f"DEBUG: Fixed answer {answer['id']} - was {current_is_correct}, should be {should_be_correct}")
-    
-    # Recalculate after fixes
-    db.commit()
-    answers = db.execute('SELECT * FROM test_attempt_answers WHERE test_attempt_id = ?', (attempt['id'],)).fetchall()
+    if is_attempt_expired(attempt):
+        return finalize_expired_attempt(db, attempt)
     
-    # Get total questions in test (not just answered)
-    total_questions_in_test = db.execute(
-        'SELECT COUNT(*) as count FROM test_questions WHERE test_id = ?',
-        (test_id,)
-    ).fetchone()['count']
-    
-    # Get max possible score
-    max_score = db.execute(
-        'SELECT SUM(points) as total FROM test_questions WHERE test_id = ?',
-        (test_id,)
-    ).fetchone()['total'] or total_questions_in_test
+    # Final flush: the form carries every selected option, including any the
+    # autosave batch had not sent yet, so it overrides what was saved
+    form_answers = [
+        {'question_id': int(key[len('answer_'):]), 'answer': value.strip()}
+        for key, value in request.form.items()
+        if key.startswith('answer_') and key[len('answer_'):].isdigit() and value.strip()
+    ]
     
-    # Count correct answers from saved answers (handle both int and bool)
-    correct_answers = sum(1 for a in answers if int(a['is_correct']) == 1)
-    total_score = sum(int(a['points_earned'] or 0) for a in answers)
+    try:
+        result = finish_test_attempt(db, attempt, form_answers)
+    except Exception as e:
+        print(f"Error finishing test attempt {attempt['id']}: {str(e)}")
+        flash('Failed to submit test. Please try again.', 'danger')
+        return redirect(url_for('take_test', test_id=test_id))
     
-    # Use total questions in test, not just answered ones
-    total_questions = total_questions_in_test
-    
-    if app.debug:
-        print(f"DEBUG: finish_test - Final Score Calculation:")
-        print(f"DEBUG:   Total questions in test: {total_questions_in_test}")
-        print(f"DEBUG:   Total answers saved: {len(answers)}")
-        print(f"DEBUG:   Correct answers: {correct_answers}")
-        print(f"DEBUG:   Total score: {total_score}")
-        print(f"DEBUG:   Max possible score: {max_score}")
-        for a in answers:
-            print(f"DEBUG:     Answer {a['question_id']}: selected='{a['selected_answer']}', is_correct={a['is_correct']}, points={a['points_earned']}")
-    
-    percentage = (total_score / max_score * 100) if max_score > 0 else 0
-    
-    # Update attempt
-    db.execute(
-        '''UPDATE test_attempts SET submitted_at = ?, status = 'completed', 
-           score = ?, total_questions = ?, correct_answers = ? WHERE id = ?''',
-        (datetime.datetime.now(), int(percentage), total_questions, correct_answers, attempt['id'])
-    )
-    db.commit()
+    if result is None:
+        flash('This test attempt has already been submitted.', 'info')
+        return redirect(url_for('test_results', test_id=test_id))
     
+    percentage = result['percentage']
     flash(f'Test submitted! Your score: {percentage:.1f}%', 'success')
     return redirect(url_for('test_results', test_id=test_id))
 
@@ -1740,18 +1638,12 @@ def test_results(test_id):
         return redirect(url_for('view_test', test_id=test_id))
     
     # Get all test questions and their answers
-    # First get all questions in the test
-    # CRITICAL: Use tq.question_id (not q.id) to match saved answers
-    test_questions = db.execute(
-        '''SELECT tq.question_id, tq.points as question_points, tq.order_index,
-                  q.id, q.title, q.question_text, q.option_a, q.option_b, q.option_c, q.option_d, 
-                  q.correct_answer, q.explanation, q.difficulty
-           FROM test_questions tq
-           JOIN questions q ON tq.question_id = q.id
-           WHERE tq.test_id = ?
-           ORDER BY tq.order_index''',
-        (test_id,)
-    ).fetchall()
+    # Correct answers and points come from the answer key the attempt was
+    # graded against, so later edits to the test don't rewrite old results
+    answer_key = get_attempt_answer_key(db, attempt)
+    test_questions = get_answer_key_questions(db, answer_key) if answer_key else []
+    for tq in test_questions:
+        tq['question_points'] = tq['points']
     
     # Get all saved answers for this attempt
     saved_answers = db.execute(
@@ -1857,7 +1749,7 @@ def admin_add_test():
         
         if not title:
             flash('Test title is required.', 'danger')
-            return render_template('admin/add_test.html', subjects=subjects)
+            return redirect(url_for('admin_add_test'))
         
         try:
             cursor = db.execute(
@@ -1885,9 +1777,8 @@ def admin_add_test():
             db.rollback()
             flash(f'Failed to create test: {str(e)}', 'danger')
     
-    # Get questions for selection
-    questions = db.execute('SELECT * FROM questions ORDER BY topic, difficulty').fetchall()
-    return render_template('admin/add_test.html', subjects=subjects, questions=questions)
+    topics = db.execute('SELECT DISTINCT topic FROM questions ORDER BY topic').fetchall()
+    return render_template('admin/add_test.html', subjects=subjects, topics=topics, selected_questions=[])
 
 
 @app.route('/admin/test/<int:test_id>/edit', methods=['GET', 'POST'])
@@ -1928,6 +1819,7 @@ def admin_edit_test(test_id):
                         'INSERT INTO test_questions (test_id, question_id, order_index, points) VALUES (?, ?, ?, ?)',
                         (test_id, int(qid), idx, 1)
                     )
+            bump_answer_key_version(db, test_id=test_id)
             
             db.commit()
             flash('Test updated successfully!', 'success')
@@ -1941,11 +1833,10 @@ def admin_edit_test(test_id):
         'SELECT question_id FROM test_questions WHERE test_id = ? ORDER BY order_index',
         (test_id,)
     ).fetchall()
-    selected_question_ids = [q['question_id'] for q in test_questions]
+    selected_questions = get_questions_by_ids(db, [q['question_id'] for q in test_questions])
     
     subjects = db.execute('SELECT * FROM subjects ORDER BY name').fetchall()
-    # Order questions by difficulty (hard first) to make it easier to add challenging questions
-    questions = db.execute('SELECT * FROM questions ORDER BY CASE difficulty WHEN "hard" THEN 1 WHEN "advanced" THEN 2 WHEN "medium" THEN 3 WHEN "intermediate" THEN 4 ELSE 5 END, topic').fetchall()
+    topics = db.execute('SELECT DISTINCT topic FROM questions ORDER BY topic').fetchall()
     
     # Get assigned students
     assigned_students = db.execute(
@@ -1961,8 +1852,8 @@ def admin_edit_test(test_id):
         'SELECT id, username FROM users WHERE role = "student" ORDER BY username'
     ).fetchall()
     
-    return render_template('admin/edit_test.html', test=test, subjects=subjects, questions=questions,
-                         selected_question_ids=selected_question_ids, assigned_students=assigned_students,
+    return render_template('admin/edit_test.html', test=test, subjects=subjects, topics=topics,
+                         selected_questions=selected_questions, assigned_students=assigned_students,
                          all_students=all_students)
 
 
@@ -2013,6 +1904,63 @@ def admin_test_results(test_id):
     return render_template('admin/test_results.html', test=test, attempts=attempts)
 
 
+def export_response(export_format, filename, columns, rows):
+    """Stream an export as a file download (rows are read while the response is sent)"""
+    return Response(
+        stream_with_context(stream_export(export_format, columns, rows)),
+        mimetype=EXPORT_FORMATS[export_format],
+        headers={'Content-Disposition': f'attachment; filename="{filename}.{export_format}"'}
+    )
+
+
+@app.route('/admin/test/<int:test_id>/results/export')
+@admin_required
+def admin_export_test_results(test_id):
+    """Admin: Download completed attempts of a test as CSV or JSONL"""
+    export_format = request.args.get('format', 'csv')
+    if export_format not in EXPORT_FORMATS:
+        flash('Unsupported export format.', 'danger')
+        return redirect(url_for('admin_test_results', test_id=test_id))
+    
+    columns, rows = test_results_export(get_db(), test_id)
+    return export_response(export_format, f'test-{test_id}-results', columns, rows)
+
+
+@app.route('/admin/test/<int:test_id>/answers/export')
+@admin_required
+def admin_export_answer_matrix(test_id):
+    """Admin: Download the per-question answer matrix of a test as CSV or JSONL"""
+    export_format = request.args.get('format', 'csv')
+    if export_format not in EXPORT_FORMATS:
+        flash('Unsupported export format.', 'danger')
+        return redirect(url_for('admin_test_results', test_id=test_id))
+    
+    columns, rows = answer_matrix_export(get_db(), test_id)
+    return export_response(export_format, f'test-{test_id}-answers', columns, rows)
+
+
+@app.route('/admin/attempts/export')
+@admin_required
+def admin_export_attempts():
+    """Admin: Download raw practice attempts as CSV or JSONL
+    
+    Optional filters: since / until (YYYY-MM-DD, inclusive) and user_id.
+    """
+    export_format = request.args.get('format', 'csv')
+    if export_format not in EXPORT_FORMATS:
+        flash('Unsupported export format.', 'danger')
+        return redirect(url_for('admin_analytics'))
+    try:
+        since = parse_export_date(request.args.get('since', ''))
+        until = parse_export_date(request.args.get('until', ''))
+    except ValueError:
+        flash('Dates must be in YYYY-MM-DD format.', 'danger')
+        return redirect(url_for('admin_analytics'))
+    
+    columns, rows = practice_attempts_export(get_db(), since, until, request.args.get('user_id', type=int))
+    return export_response(export_format, 'practice-attempts', columns, rows)
+
+
 # ==================== MODULE 4: ROLE MANAGEMENT ====================
 
 @app.route('/admin/users')
@@ -2047,6 +1995,7 @@ def admin_promote_user(user_id):
     db = get_db()
     try:
         db.execute('UPDATE users SET role = "admin" WHERE id = ?', (user_id,))
+        record_leaderboard_event(db, user_id)
         db.commit()
         flash('User promoted to admin successfully!', 'success')
     except Exception as e:
@@ -2062,6 +2011,7 @@ def admin_demote_user(user_id):
     db = get_db()
     try:
         db.execute('UPDATE users SET role = "student", is_super_admin = 0 WHERE id = ?', (user_id,))
+        record_leaderboard_event(db, user_id)
         db.commit()
         flash('Admin demoted to student successfully!', 'success')
     except Exception as e:
@@ -2077,6 +2027,7 @@ def admin_make_super_admin(user_id):
     db = get_db()
     try:
         db.execute('UPDATE users SET role = "admin", is_super_admin = 1 WHERE id = ?', (user_id,))
+        record_leaderboard_event(db, user_id)
         db.commit()
         flash('User made super admin successfully!', 'success')
     except Exception as e:
@@ -0,0 +1,223 @@
+"""
+Badge rule engine
+Badge rules indexed by the metric they depend on, so an answer submission
+only evaluates thresholds it could have crossed
+"""
+
+import hashlib
+import json
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+from database import get_db
+
+# badge_type -> user metric the requirement_value is compared against
+BADGE_METRICS = {
+    'xp': 'xp',
+    'level': 'level',
+    'streak': 'streak',
+    'first_attempt': 'total_attempts',
+    'attempts': 'total_attempts',
+    'correct_answers': 'correct_attempts',
+    'questions_attempted': 'questions_attempted',
+}
+
+# Seconds before the in-process rule index re-reads the badges table
+RULES_TTL_SECONDS = 60
+
+
+class BadgeRules:
+    """Badge rules grouped by metric and sorted by threshold"""
+
+    def __init__(self, rows):
+        self.by_metric = {}
+        self.names = {}
+        for row in rows:
+            metric = BADGE_METRICS.get(row['badge_type'])
+            if metric is None or row['requirement_value'] is None:
+                continue
+            self.by_metric.setdefault(metric, []).append((row['requirement_value'], row['id']))
+            self.names[row['id']] = row['name']
+
+        self.thresholds = {}
+        for metric, rules in self.by_metric.items():
+            rules.sort()
+            self.thresholds[metric] = [threshold for threshold, _ in rules]
+
+        # Watermarks computed against a different rule set are recomputed
+        signature = repr(sorted(self.by_metric.items()))
+        self.version = hashlib.md5(signature.encode()).hexdigest()[:12]
+
+    def reached(self, metric, value, above=None):
+        """Badge ids whose threshold is <= value (and >= `above`, if given)"""
+        rules = self.by_metric.get(metric, [])
+        thresholds = self.thresholds.get(metric, [])
+        start = bisect_left(thresholds, above) if above is not None else 0
+        end = bisect_right(thresholds, value)
+        return [badge_id for _, badge_id in rules[start:end]]
+
+    def next_threshold(self, metric, value):
+        """Lowest threshold above value, or None if every rule is reached"""
+        thresholds = self.thresholds.get(metric, [])
+        index = bisect_right(thresholds, value)
+        return thresholds[index] if index < len(thresholds) else None
+
+
+_rules_lock = threading.Lock()
+_rules_cache = {'rules': None, 'loaded_at': 0}
+
+
+def get_badge_rules(db):
+    """Get the cached rule index, reloading it after RULES_TTL_SECONDS"""
+    with _rules_lock:
+        if _rules_cache['rules'] is None or time.monotonic() - _rules_cache['loaded_at'] > RULES_TTL_SECONDS:
+            rows = db.execute('SELECT id, name, badge_type, requirement_value FROM badges').fetchall()
+            _rules_cache['rules'] = BadgeRules(rows)
+            _rules_cache['loaded_at'] = time.monotonic()
+        return _rules_cache['rules']
+
+
+def invalidate_badge_rules():
+    """Force the next evaluation to reload the badges table"""
+    with _rules_lock:
+        _rules_cache['rules'] = None
+
+
+def insert_badges(db, user_id, badge_ids):
+    """Bulk-insert badge unlocks, returning the ids that were newly earned"""
+    if not badge_ids:
+        return []
+    now = datetime.now()
+    values = ','.join(['(?, ?, ?)'] * len(badge_ids))
+    params = []
+    for badge_id in badge_ids:
+        params.extend([user_id, badge_id, now])
+    rows = db.execute(
+        f'''INSERT OR IGNORE INTO user_badges (user_id, badge_id, earned_at)
+            VALUES {values}
+            RETURNING badge_id''',
+        params
+    ).fetchall()
+    return [row['badge_id'] for row in rows]
+
+
+def evaluate_badges(db, user_id, metrics, watermarks=None):
+    """Award badges reached by `metrics` (caller commits)
+
+    `watermarks` is the JSON stored in user_stats.badge_watermarks: the
+    lowest unearned threshold per metric. Metrics still below their
+    watermark are skipped without touching the database. With no valid
+    watermarks, the user's earned badges are loaded once and every rule
+    is checked.
+
+    Returns (unlocked badge names, new watermarks JSON).
+    """
+    rules = get_badge_rules(db)
+
+    marks = None
+    if watermarks:
+        try:
+            marks = json.loads(watermarks)
+        except ValueError:
+            marks = None
+    if marks is not None and marks.get('version') != rules.version:
+        marks = None
+
+    candidates = []
+    if marks is None:
+        earned = {
+            row['badge_id'] for row in db.execute(
+                'SELECT badge_id FROM user_badges WHERE user_id = ?', (user_id,)
+            ).fetchall()
+        }
+        for metric in rules.by_metric:
+            candidates.extend(
+                badge_id for badge_id in rules.reached(metric, metrics.get(metric) or 0)
+                if badge_id not in earned
+            )
+    else:
+        for metric in rules.by_metric:
+            watermark = marks.get(metric)
+            value = metrics.get(metric) or 0
+            if watermark is not None and value >= watermark:
+                candidates.extend(rules.reached(metric, value, above=watermark))
+
+    unlocked_ids = insert_badges(db, user_id, candidates)
+
+    new_marks = {'version': rules.version}
+    for metric in rules.by_metric:
+        new_marks[metric] = rules.next_threshold(metric, metrics.get(metric) or 0)
+
+    return [rules.names[badge_id] for badge_id in unlocked_ids], json.dumps(new_marks)
+
+
+# ==================== BACKFILL ====================
+
+def backfill_badges(badge_id=None, batch_size=5000, progress=print):
+    """Award badges retroactively to every user who already qualifies
+
+    Works in set-based passes: one INSERT ... SELECT per metric per batch
+    of user ids, joining badges to user_stats on the metric column.
+    Limit to a single badge with `badge_id`. Returns a summary dict.
+    """
+    db = get_db()
+    started = time.monotonic()
+    now = datetime.now()
+
+    badge_filter = ' AND b.id = ?' if badge_id else ''
+    bounds = db.execute('SELECT MIN(user_id) as low, MAX(user_id) as high, COUNT(*) as users FROM user_stats').fetchone()
+    if not bounds['users']:
+        return {'awarded': 0, 'users': 0, 'seconds': 0.0}
+
+    metrics = {}
+    for badge_type, metric in BADGE_METRICS.items():
+        metrics.setdefault(metric, []).append(badge_type)
+
+    awarded = 0
+    total_batches = (bounds['high'] - bounds['low']) // batch_size + 1
+    for batch_number, low in enumerate(range(bounds['low'], bounds['high'] + 1, batch_size), 1):
+        high = low + batch_size - 1
+        batch_awarded = 0
+        try:
+            for metric, badge_types in metrics.items():
+                placeholders = ','.join(['?'] * len(badge_types))
+                params = [now, low, high] + badge_types
+                if badge_id:
+                    params.append(badge_id)
+                # metric names come from BADGE_METRICS, never from user input
+                cursor = db.execute(
+                    f'''INSERT OR IGNORE INTO user_badges (user_id, badge_id, earned_at)
+                        SELECT us.user_id, b.id, ?
+                        FROM user_stats us
+                        JOIN badges b ON us.{metric} >= b.requirement_value
+                        WHERE us.user_id BETWEEN ? AND ?
+                          AND b.badge_type IN ({placeholders}){badge_filter}''',
+                    params
+                )
+                batch_awarded += cursor.rowcount
+            if batch_awarded:
+                # Let every worker's cached dashboard pick up the new badges
+                db.execute(
+                    '''UPDATE user_stats SET dashboard_version = COALESCE(dashboard_version, 0) + 1
+                       WHERE user_id IN (SELECT user_id FROM user_badges
+                                         WHERE earned_at = ? AND user_id BETWEEN ? AND ?)''',
+                    (now, low, high)
+                )
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+
+        awarded += batch_awarded
+        elapsed = time.monotonic() - started
+        if progress:
+            progress(f"  batch {batch_number}/{total_batches} (users {low}-{high}): "
+                     f"{batch_awarded} awarded, {awarded} total, "
+                     f"{awarded / elapsed if elapsed else 0:.0f} badges/s")
+
+    return {
+        'awarded': awarded,
+        'users': bounds['users'],
+        'seconds': round(time.monotonic() - started, 2)
+    }
@@ -0,0 +1,178 @@
+"""
+Group commit
+Optional write-behind mode: concurrent requests hand their write to one
+writer thread, which runs everything that arrived within a few
+milliseconds in a single transaction and acknowledges each caller once
+that transaction has committed
+"""
+
+import threading
+import time
+from collections import deque
+from database import get_db
+
+# How long the writer waits for more work after the first item arrives
+DEFAULT_MAX_DELAY_MS = 5
+
+# Upper bound on writes per transaction
+DEFAULT_MAX_BATCH = 200
+
+# How long a caller waits for its acknowledgement before giving up
+DEFAULT_ACK_TIMEOUT_SECONDS = 10
+
+
+class GroupCommitTimeout(Exception):
+    """The write was not acknowledged in time (it may still commit)"""
+
+
+class _PendingWrite:
+    """One caller's write and the slot its result is delivered through"""
+
+    __slots__ = ('func', 'done', 'result', 'error', 'queued_at')
+
+    def __init__(self, func):
+        self.func = func
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.queued_at = time.monotonic()
+
+
+class GroupCommitter:
+    """Coalesces `func(db)` writes from many threads into shared transactions
+
+    Each write runs inside its own SAVEPOINT, so one failing write is rolled
+    back and reported to its caller without affecting the rest of the batch.
+    """
+
+    def __init__(self, max_delay_ms=DEFAULT_MAX_DELAY_MS, max_batch=DEFAULT_MAX_BATCH,
+                 ack_timeout=DEFAULT_ACK_TIMEOUT_SECONDS):
+        self.enabled = False
+        self.max_delay = max_delay_ms / 1000
+        self.max_batch = max_batch
+        self.ack_timeout = ack_timeout
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stats = {'batches': 0, 'writes': 0, 'failed_writes': 0,
+                       'failed_batches': 0, 'largest_batch': 0, 'max_wait_ms': 0.0}
+
+    def configure(self, enabled=True, max_delay_ms=None, max_batch=None, ack_timeout=None):
+        """Turn group commit on or off and adjust its limits"""
+        if max_delay_ms is not None:
+            self.max_delay = max_delay_ms / 1000
+        if max_batch is not None:
+            self.max_batch = max_batch
+        if ack_timeout is not None:
+            self.ack_timeout = ack_timeout
+        self.enabled = enabled
+        if enabled:
+            self._start()
+
+    def _start(self):
+        """Start the writer thread (once)"""
+        with self._cond:
+            if self._thread and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name='group-commit', daemon=True)
+            self._thread.start()
+
+    def submit(self, func):
+        """Queue `func(db)` and block until its transaction commits
+
+        Returns func's result, or re-raises its exception. Raises
+        GroupCommitTimeout if no acknowledgement arrives within ack_timeout.
+        """
+        pending = _PendingWrite(func)
+        with self._cond:
+            self._queue.append(pending)
+            self._cond.notify()
+
+        if not pending.done.wait(self.ack_timeout):
+            raise GroupCommitTimeout(f"Write not acknowledged within {self.ack_timeout}s")
+        if pending.error is not None:
+            raise pending.error
+        return pending.result
+
+    def _next_batch(self):
+        """Wait for work, then gather up to max_batch writes within max_delay"""
+        with self._cond:
+            while not self._queue:
+                self._cond.wait()
+            deadline = time.monotonic() + self.max_delay
+            while len(self._queue) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            count = min(len(self._queue), self.max_batch)
+            return [self._queue.popleft() for _ in range(count)]
+
+    def _run(self):
+        """Writer thread body"""
+        # No app context in this thread, so this is a dedicated connection
+        db = get_db()
+        while True:
+            batch = self._next_batch()
+            self._commit_batch(db, batch)
+
+    def _commit_batch(self, db, batch):
+        """Run one batch in a single transaction and acknowledge every caller"""
+        try:
+            db.execute('BEGIN IMMEDIATE')
+            for pending in batch:
+                db.execute('SAVEPOINT pending_write')
+                try:
+                    pending.result = pending.func(db)
+                    db.execute('RELEASE pending_write')
+                except Exception as e:
+                    db.execute('ROLLBACK TO pending_write')
+                    db.execute('RELEASE pending_write')
+                    pending.error = e
+            db.commit()
+        except Exception as e:
+            # The commit itself failed: nothing in the batch is durable
+            try:
+                db.rollback()
+            except Exception:
+                pass
+            for pending in batch:
+                pending.result = None
+                pending.error = e
+            self._stats['failed_batches'] += 1
+
+        now = time.monotonic()
+        self._stats['batches'] += 1
+        self._stats['writes'] += len(batch)
+        self._stats['largest_batch'] = max(self._stats['largest_batch'], len(batch))
+        for pending in batch:
+            if pending.error is not None:
+                self._stats['failed_writes'] += 1
+            self._stats['max_wait_ms'] = max(self._stats['max_wait_ms'], (now - pending.queued_at) * 1000)
+            pending.done.set()
+
+    def stats(self):
+        """Group commit counters"""
+        stats = dict(self._stats)
+        stats.update({
+            'enabled': self.enabled,
+            'queued': len(self._queue),
+            'max_delay_ms': self.max_delay * 1000,
+            'max_batch': self.max_batch,
+            'avg_batch': round(stats['writes'] / stats['batches'], 2) if stats['batches'] else 0,
+            'max_wait_ms': round(stats['max_wait_ms'], 2)
+        })
+        return stats
+
+
+group_commit = GroupCommitter()
+
+
+def configure_group_commit(enabled=True, **limits):
+    """Enable or disable group commit for this process"""
+    group_commit.configure(enabled, **limits)
+
+
+def get_group_commit_stats():
+    """Get group commit metrics"""
+    return group_commit.stats()
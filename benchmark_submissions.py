@@ -0,0 +1,128 @@
+"""
+Answer submission benchmark
+Measures practice submissions per second with one transaction per answer
+(the default) and with group commit, against a throwaway database.
+
+Usage:
+    python benchmark_submissions.py
+    python benchmark_submissions.py --threads 32 --submissions 200 --delay-ms 5
+    python benchmark_submissions.py --synchronous FULL    # fsync on every commit
+"""
+
+import argparse
+import os
+import shutil
+import statistics
+import tempfile
+import threading
+import time
+from flask import Flask
+import database
+from database import init_db, get_db, init_app, configure_storage
+from batcher import configure_group_commit, get_group_commit_stats
+from logic import submit_practice_answer
+
+QUESTIONS = 50
+
+
+def create_fixtures(users):
+    """Insert students and questions for the run; returns the user ids"""
+    db = get_db()
+    for i in range(QUESTIONS):
+        db.execute(
+            '''INSERT INTO questions (title, question_text, option_a, option_b, option_c, option_d,
+               correct_answer, difficulty, topic, language_track, points, is_active)
+               VALUES (?, 'Q', 'a', 'b', 'c', 'd', 'a', 'easy', 'Bench', 'python', 10, 1)''',
+            (f'Bench question {i}',)
+        )
+    user_ids = []
+    for i in range(users):
+        cursor = db.execute(
+            "INSERT INTO users (username, email, password, role) VALUES (?, ?, 'x', 'student')",
+            (f'bench{i}', f'bench{i}@example.com')
+        )
+        user_ids.append(cursor.lastrowid)
+    db.commit()
+    db.close()
+    return user_ids
+
+
+def run(app, user_ids, submissions):
+    """Submit answers from one thread per user; returns (seconds, latencies)"""
+    first_question = get_db().execute('SELECT MIN(id) as id FROM questions').fetchone()['id']
+    latencies = []
+    lock = threading.Lock()
+    start = threading.Barrier(len(user_ids) + 1)
+
+    def student(user_id):
+        local = []
+        with app.app_context():
+            start.wait()
+            for i in range(submissions):
+                question_id = first_question + (user_id + i) % QUESTIONS
+                answer = 'a' if i % 3 else 'b'
+                began = time.perf_counter()
+                submit_practice_answer(user_id, question_id, answer)
+                local.append(time.perf_counter() - began)
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=student, args=(user_id,)) for user_id in user_ids]
+    for thread in threads:
+        thread.start()
+    start.wait()
+    began = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - began, latencies
+
+
+def report(label, seconds, latencies):
+    """Print throughput and latency percentiles for one run"""
+    latencies = sorted(latencies)
+    p50 = statistics.median(latencies) * 1000
+    p99 = latencies[int(len(latencies) * 0.99) - 1] * 1000
+    print(f"{label:<16} {len(latencies) / seconds:>10.0f} submissions/s   "
+          f"p50 {p50:6.1f} ms   p99 {p99:6.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark practice answer submissions')
+    parser.add_argument('--threads', type=int, default=16, help='Concurrent students')
+    parser.add_argument('--submissions', type=int, default=100, help='Answers per student')
+    parser.add_argument('--delay-ms', type=float, default=5, help='Group commit batching window')
+    parser.add_argument('--synchronous', choices=['OFF', 'NORMAL', 'FULL'],
+                        help='Override PRAGMA synchronous (default: the storage profile)')
+    args = parser.parse_args()
+    if args.synchronous:
+        configure_storage(synchronous=args.synchronous)
+
+    workdir = tempfile.mkdtemp(prefix='bench-submissions-')
+    try:
+        app = Flask(__name__)
+        init_app(app)
+
+        results = {}
+        for mode in ('per-request', 'group-commit'):
+            # A fresh database per mode so both start from the same state
+            database.pool.close_all()
+            database.DATABASE = os.path.join(workdir, f'{mode}.db')
+            init_db()
+            user_ids = create_fixtures(args.threads)
+            if mode == 'group-commit':
+                configure_group_commit(max_delay_ms=args.delay_ms)
+            with app.app_context():
+                results[mode] = run(app, user_ids, args.submissions)
+            report(mode, *results[mode])
+
+        stats = get_group_commit_stats()
+        print(f"\nGroup commit: {stats['batches']} transactions, "
+              f"{stats['avg_batch']} writes each on average (largest {stats['largest_batch']})")
+        speedup = results['per-request'][0] / results['group-commit'][0]
+        print(f"Speed-up: {speedup:.2f}x")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
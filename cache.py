@@ -0,0 +1,123 @@
+"""
+In-process caches
+Small thread-safe LRU cache with TTL, version checks, optional byte budget
+and hit/miss metrics
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+class LRUCache:
+    """Size-bounded LRU cache
+
+    Entries expire after `ttl` seconds (if set). An entry stored with a
+    version is only returned when the caller asks for the same version,
+    so other workers' writes invalidate it through the database. With
+    `max_bytes`, the sizes passed to set() are also kept under that total.
+    """
+
+    def __init__(self, name, max_entries=1000, ttl=None, max_bytes=None):
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'stale': 0, 'expired': 0,
+                       'evictions': 0, 'invalidations': 0}
+
+    def get(self, key, version=None, default=None):
+        """Return the cached value, or `default` on a miss"""
+        with self._lock:
+            entry = self._entries.get(key, _MISSING)
+            if entry is _MISSING:
+                self._stats['misses'] += 1
+                return default
+
+            value, entry_version, expires_at, _ = entry
+            if expires_at is not None and time.monotonic() >= expires_at:
+                self._drop(key)
+                self._stats['expired'] += 1
+                self._stats['misses'] += 1
+                return default
+            if version is not None and entry_version != version:
+                self._drop(key)
+                self._stats['stale'] += 1
+                self._stats['misses'] += 1
+                return default
+
+            self._entries.move_to_end(key)
+            self._stats['hits'] += 1
+            return value
+
+    def set(self, key, value, version=None, size=0):
+        """Store a value, evicting the least recently used entries if full
+
+        `size` counts against `max_bytes`; a value larger than the whole
+        budget is not stored.
+        """
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._drop(key)
+            if self.max_bytes is not None and size > self.max_bytes:
+                return
+            self._entries[key] = (value, version, expires_at, size)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or (
+                    self.max_bytes is not None and self._bytes > self.max_bytes):
+                _, (_, _, _, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self._stats['evictions'] += 1
+
+    def _drop(self, key):
+        """Remove an entry if present (lock held); True if it was"""
+        entry = self._entries.pop(key, _MISSING)
+        if entry is _MISSING:
+            return False
+        self._bytes -= entry[3]
+        return True
+
+    def invalidate(self, key):
+        """Drop one entry"""
+        with self._lock:
+            if self._drop(key):
+                self._stats['invalidations'] += 1
+
+    def clear(self):
+        """Drop every entry"""
+        with self._lock:
+            self._stats['invalidations'] += len(self._entries)
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        """Snapshot of cache counters"""
+        with self._lock:
+            snapshot = dict(self._stats)
+            snapshot['entries'] = len(self._entries)
+            snapshot['max_entries'] = self.max_entries
+            if self.max_bytes is not None:
+                snapshot['bytes'] = self._bytes
+                snapshot['max_bytes'] = self.max_bytes
+            lookups = snapshot['hits'] + snapshot['misses']
+            snapshot['hit_rate'] = round(snapshot['hits'] / lookups, 3) if lookups else 0
+        return snapshot
+
+
+_registry = []
+
+
+def register_cache(cache):
+    """Track a cache so its metrics are reported by get_cache_stats()"""
+    _registry.append(cache)
+    return cache
+
+
+def get_cache_stats():
+    """Metrics for every registered cache, keyed by cache name"""
+    return {cache.name: cache.stats() for cache in _registry}
@@ -0,0 +1,155 @@
+"""
+Practice catalog
+Immutable in-process index of active questions by language track, topic
+and difficulty, rebuilt when the question bank version changes
+"""
+
+import threading
+import time
+from collections import namedtuple
+from types import MappingProxyType
+from database import get_db, get_counter, increment_counter
+
+VERSION_COUNTER = 'question_catalog_version'
+
+# How often a worker re-reads the version counter; /practice runs no SQL in between
+CATALOG_CHECK_SECONDS = 5
+
+DIFFICULTIES = ('easy', 'medium', 'hard')
+
+CatalogQuestion = namedtuple('CatalogQuestion', 'id title difficulty topic points')
+
+_EMPTY_LEVELS = MappingProxyType({difficulty: () for difficulty in DIFFICULTIES})
+
+
+class PracticeCatalog:
+    """Read-only snapshot of the active question bank at one version"""
+
+    def __init__(self, rows, version):
+        self.version = version
+        self.built_at = time.time()
+
+        grouped = {}
+        for row in rows:
+            question = CatalogQuestion(row['id'], row['title'], row['difficulty'],
+                                       row['topic'], row['points'])
+            topics = grouped.setdefault(row['language_track'], {})
+            levels = topics.setdefault(row['topic'], {difficulty: [] for difficulty in DIFFICULTIES})
+            levels.setdefault(row['difficulty'], []).append(question)
+
+        self._tracks = {}
+        for track, topics in grouped.items():
+            by_topic = {
+                topic: MappingProxyType({difficulty: tuple(questions) for difficulty, questions in levels.items()})
+                for topic, levels in sorted(topics.items())
+            }
+            self._tracks[track] = {
+                'topics': tuple(by_topic),
+                'by_topic': MappingProxyType(by_topic),
+                'questions': tuple(
+                    question
+                    for levels in by_topic.values()
+                    for difficulty in levels
+                    for question in levels[difficulty]
+                )
+            }
+        self.size = sum(len(track['questions']) for track in self._tracks.values())
+
+    def topics(self, track):
+        """Topic names with active questions in a track, sorted"""
+        return self._tracks.get(track, {}).get('topics', ())
+
+    def questions(self, track, topic=None, difficulty=None):
+        """Questions ordered by topic, difficulty and id, optionally filtered"""
+        track_index = self._tracks.get(track)
+        if not track_index:
+            return ()
+        if topic is None and difficulty is None:
+            return track_index['questions']
+        return tuple(
+            question for question in track_index['questions']
+            if (topic is None or question.topic == topic)
+            and (difficulty is None or question.difficulty == difficulty)
+        )
+
+    def by_topic(self, track, topic=None, difficulty=None):
+        """Questions grouped topic -> difficulty; every topic is listed, filters empty the rest"""
+        track_index = self._tracks.get(track)
+        if not track_index:
+            return MappingProxyType({})
+        if topic is None and difficulty is None:
+            return track_index['by_topic']
+
+        grouped = {}
+        for name, levels in track_index['by_topic'].items():
+            if topic is not None and name != topic:
+                grouped[name] = _EMPTY_LEVELS
+            elif difficulty is not None:
+                grouped[name] = MappingProxyType({
+                    level: (questions if level == difficulty else ())
+                    for level, questions in levels.items()
+                })
+            else:
+                grouped[name] = levels
+        return MappingProxyType(grouped)
+
+
+_catalog_lock = threading.Lock()
+_catalog_state = {'catalog': None, 'checked_at': 0, 'rebuilds': 0}
+
+
+def _load_catalog(db, version):
+    """Build a catalog snapshot from the questions table"""
+    rows = db.execute(
+        '''SELECT id, title, difficulty, topic, points, language_track
+           FROM questions
+           WHERE is_active = 1
+           ORDER BY language_track, topic,
+                    CASE difficulty
+                        WHEN 'easy' THEN 1
+                        WHEN 'medium' THEN 2
+                        WHEN 'hard' THEN 3
+                    END, id'''
+    ).fetchall()
+    return PracticeCatalog(rows, version)
+
+
+def get_catalog():
+    """Get the current catalog, checking the version at most every CATALOG_CHECK_SECONDS"""
+    catalog = _catalog_state['catalog']
+    if catalog is not None and time.monotonic() - _catalog_state['checked_at'] < CATALOG_CHECK_SECONDS:
+        return catalog
+
+    with _catalog_lock:
+        catalog = _catalog_state['catalog']
+        if catalog is not None and time.monotonic() - _catalog_state['checked_at'] < CATALOG_CHECK_SECONDS:
+            return catalog
+
+        db = get_db()
+        # Read the version before the rows: a write racing the load leaves
+        # the snapshot labelled older than its data, so it is rebuilt again
+        version = get_counter(db, VERSION_COUNTER)
+        if catalog is None or catalog.version != version:
+            catalog = _load_catalog(db, version)
+            _catalog_state['catalog'] = catalog
+            _catalog_state['rebuilds'] += 1
+        _catalog_state['checked_at'] = time.monotonic()
+        return catalog
+
+
+def bump_catalog_version(db):
+    """Mark the question bank as changed (caller commits)"""
+    increment_counter(db, VERSION_COUNTER)
+    # This worker re-checks on its next request instead of waiting out the interval
+    _catalog_state['checked_at'] = 0
+
+
+def get_catalog_stats():
+    """Get practice catalog metrics"""
+    catalog = _catalog_state['catalog']
+    return {
+        'version': catalog.version if catalog else None,
+        'questions': catalog.size if catalog else 0,
+        'rebuilds': _catalog_state['rebuilds'],
+        'built_at': catalog.built_at if catalog else None
+    }
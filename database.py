@@ -2,22 +2,427 @@
 Database connection and setup
 """
 
+import html
+import os
+import re
 import sqlite3
+import threading
+import time
+from collections import deque
 from datetime import datetime
+from flask import g, has_app_context
 
 DATABASE = 'gamified_coding.db'
 
+# Maximum number of idle connections kept open for reuse between requests
+POOL_SIZE = 8
 
-def get_db():
-    """Get database connection"""
-    conn = sqlite3.connect(DATABASE)
+# Storage profile applied to every connection. WAL lets readers (dashboard,
+# leaderboard) run while /submit_answer writes; busy_timeout makes writers
+# wait for the lock instead of failing with "database is locked".
+# Override with app.config['SQLITE_PROFILE'] in app.py (applied by init_app, before any
+# connection is opened) or configure_storage().
+STORAGE_PROFILE = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout_ms': 5000,
+    'cache_size_kb': 16384,
+    'mmap_size': 128 * 1024 * 1024,
+    'temp_store': 'MEMORY',
+    'wal_autocheckpoint_pages': 1000,
+    'checkpoint_interval_seconds': 300,
+}
+
+_checkpoint_lock = threading.Lock()
+_checkpoint_state = {
+    'last_run': time.monotonic(),
+    'runs': 0,
+    'last_result': None,
+}
+
+
+def configure_storage(**overrides):
+    """Update the storage profile used for new connections"""
+    unknown = set(overrides) - set(STORAGE_PROFILE)
+    if unknown:
+        raise ValueError(f"Unknown storage setting(s): {', '.join(sorted(unknown))}")
+    STORAGE_PROFILE.update(overrides)
+
+
+def apply_storage_profile(conn):
+    """Apply the PRAGMAs from STORAGE_PROFILE to a connection"""
+    profile = STORAGE_PROFILE
+    conn.execute(f"PRAGMA busy_timeout = {int(profile['busy_timeout_ms'])}")
+    conn.execute(f"PRAGMA journal_mode = {profile['journal_mode']}")
+    conn.execute(f"PRAGMA synchronous = {profile['synchronous']}")
+    # Negative cache_size is interpreted by SQLite as KiB rather than pages
+    conn.execute(f"PRAGMA cache_size = -{int(profile['cache_size_kb'])}")
+    conn.execute(f"PRAGMA mmap_size = {int(profile['mmap_size'])}")
+    conn.execute(f"PRAGMA temp_store = {profile['temp_store']}")
+    conn.execute(f"PRAGMA wal_autocheckpoint = {int(profile['wal_autocheckpoint_pages'])}")
+
+
+_SCRIPT_OR_STYLE = re.compile(r'<(script|style)\b.*?</\1\s*>', re.IGNORECASE | re.DOTALL)
+_TAG = re.compile(r'<[^>]*>')
+
+
+def html_to_text(value):
+    """Visible text of an HTML fragment (what the search index stores for note and material bodies)"""
+    if value is None:
+        return None
+    text = html.unescape(_TAG.sub(' ', _SCRIPT_OR_STYLE.sub(' ', value)))
+    return ' '.join(text.split())
+
+
+def _connect():
+    """Open a new configured SQLite connection"""
+    conn = sqlite3.connect(
+        DATABASE,
+        timeout=STORAGE_PROFILE['busy_timeout_ms'] / 1000,
+        check_same_thread=False
+    )
     conn.row_factory = sqlite3.Row
+    apply_storage_profile(conn)
     return conn
 
 
+def checkpoint(conn, mode='PASSIVE'):
+    """Run a WAL checkpoint and record the result"""
+    row = conn.execute(f'PRAGMA wal_checkpoint({mode})').fetchone()
+    result = {'busy': row[0], 'wal_pages': row[1], 'checkpointed_pages': row[2]}
+    with _checkpoint_lock:
+        _checkpoint_state['last_run'] = time.monotonic()
+        _checkpoint_state['runs'] += 1
+        _checkpoint_state['last_result'] = result
+    return result
+
+
+def maybe_checkpoint(conn):
+    """Checkpoint the WAL if the configured interval has elapsed"""
+    interval = STORAGE_PROFILE['checkpoint_interval_seconds']
+    if not interval or STORAGE_PROFILE['journal_mode'].upper() != 'WAL':
+        return None
+    
+    with _checkpoint_lock:
+        if time.monotonic() - _checkpoint_state['last_run'] < interval:
+            return None
+        # Claim this interval so concurrent requests don't all checkpoint
+        _checkpoint_state['last_run'] = time.monotonic()
+    
+    try:
+        return checkpoint(conn)
+    except sqlite3.Error as e:
+        print(f"WAL checkpoint failed: {str(e)}")
+        return None
+
+
+def get_storage_stats():
+    """Get WAL size and checkpoint statistics"""
+    wal_path = DATABASE + '-wal'
+    wal_size = os.path.getsize(wal_path) if os.path.exists(wal_path) else 0
+    db_size = os.path.getsize(DATABASE) if os.path.exists(DATABASE) else 0
+    
+    with _checkpoint_lock:
+        seconds_since = time.monotonic() - _checkpoint_state['last_run']
+        return {
+            'profile': dict(STORAGE_PROFILE),
+            'db_size_bytes': db_size,
+            'wal_size_bytes': wal_size,
+            'checkpoint_runs': _checkpoint_state['runs'],
+            'seconds_since_checkpoint': round(seconds_since, 1),
+            'last_checkpoint': _checkpoint_state['last_result'],
+        }
+
+
+class ConnectionPool:
+    """Bounded pool of SQLite connections shared by all requests in a worker"""
+
+    def __init__(self, max_size=POOL_SIZE):
+        self.max_size = max_size
+        self._idle = deque()
+        self._lock = threading.Lock()
+        self._stats = {
+            'created': 0,
+            'reused': 0,
+            'released': 0,
+            'discarded': 0,
+            'in_use': 0,
+            'peak_in_use': 0,
+        }
+
+    def acquire(self):
+        """Take an idle connection from the pool or open a new one"""
+        with self._lock:
+            conn = self._idle.pop() if self._idle else None
+            if conn is not None:
+                self._stats['reused'] += 1
+            else:
+                self._stats['created'] += 1
+            self._stats['in_use'] += 1
+            self._stats['peak_in_use'] = max(self._stats['peak_in_use'], self._stats['in_use'])
+        
+        if conn is None:
+            conn = _connect()
+        return conn
+
+    def release(self, conn):
+        """Return a connection to the pool, closing it if the pool is full"""
+        try:
+            # Never hand out a connection with a half-finished transaction
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            self._discard(conn)
+            return
+        
+        with self._lock:
+            self._stats['in_use'] -= 1
+            if len(self._idle) < self.max_size:
+                self._idle.append(conn)
+                self._stats['released'] += 1
+                return
+            self._stats['discarded'] += 1
+        conn.close()
+
+    def _discard(self, conn):
+        """Drop a broken connection instead of returning it to the pool"""
+        with self._lock:
+            self._stats['in_use'] -= 1
+            self._stats['discarded'] += 1
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+
+    def close_all(self):
+        """Close every idle connection (used on shutdown and in scripts)"""
+        with self._lock:
+            idle = list(self._idle)
+            self._idle.clear()
+        for conn in idle:
+            conn.close()
+
+    def stats(self):
+        """Snapshot of pool counters for monitoring"""
+        with self._lock:
+            snapshot = dict(self._stats)
+            snapshot['idle'] = len(self._idle)
+            snapshot['max_size'] = self.max_size
+        return snapshot
+
+
+pool = ConnectionPool()
+
+
+def get_db():
+    """Get database connection
+    
+    Inside a Flask app context every caller shares one pooled connection for
+    the lifetime of the request; it is returned to the pool by close_db().
+    Outside an app context (scripts, seeding) a standalone connection is
+    returned and the caller is responsible for closing it.
+    """
+    if not has_app_context():
+        return _connect()
+    
+    if 'db' not in g:
+        g.db = pool.acquire()
+    return g.db
+
+
+def close_db(error=None):
+    """Return the request's connection to the pool"""
+    db = g.pop('db', None)
+    if db is not None:
+        if not db.in_transaction:
+            maybe_checkpoint(db)
+        pool.release(db)
+
+
+def get_pool_stats():
+    """Get connection pool metrics"""
+    return pool.stats()
+
+
+def get_counter(db, name):
+    """Read a named value from system_counters (0 if unset)"""
+    row = db.execute('SELECT value FROM system_counters WHERE name = ?', (name,)).fetchone()
+    return row['value'] if row else 0
+
+
+def set_counter(db, name, value):
+    """Store a named value in system_counters (caller commits)"""
+    db.execute(
+        '''INSERT INTO system_counters (name, value) VALUES (?, ?)
+           ON CONFLICT(name) DO UPDATE SET value = excluded.value''',
+        (name, value)
+    )
+
+
+def increment_counter(db, name):
+    """Atomically add one to a named value in system_counters (caller commits)"""
+    db.execute(
+        '''INSERT INTO system_counters (name, value) VALUES (?, 1)
+           ON CONFLICT(name) DO UPDATE SET value = value + 1''',
+        (name,)
+    )
+
+
+def init_app(app):
+    """Apply app.config['SQLITE_PROFILE'] and register the per-request connection teardown"""
+    configure_storage(**app.config.get('SQLITE_PROFILE', {}))
+    app.teardown_appcontext(close_db)
+
+
+# Secondary indexes for the hot read paths: (name, table, columns).
+# Created (and added to existing databases) by init_db via ensure_indexes().
+INDEXES = [
+    # Dashboard, badge checks and per-user stats filter attempts by user
+    # and order/filter by time
+    ('idx_attempts_user_time', 'attempts', 'user_id, attempted_at'),
+    # Question page history and completion lookups
+    ('idx_attempts_user_question', 'attempts', 'user_id, question_id, attempted_at'),
+    # Admin "recent activity" feed
+    ('idx_attempts_time', 'attempts', 'attempted_at'),
+    # Per-question joins from analytics
+    ('idx_attempts_question', 'attempts', 'question_id, is_correct'),
+    # /practice filters by track + active, then topic and difficulty
+    ('idx_questions_track_active', 'questions', 'language_track, is_active, topic, difficulty'),
+    ('idx_questions_topic', 'questions', 'topic, difficulty'),
+    # Leaderboard ordering
+    ('idx_user_stats_xp', 'user_stats', 'xp DESC, level DESC'),
+    ('idx_leaderboard_rollups_rank', 'leaderboard_rollups', 'period, period_start, xp DESC'),
+    ('idx_user_badges_user', 'user_badges', 'user_id, earned_at'),
+    ('idx_users_role', 'users', 'role'),
+    # Test taking: active attempt lookups and answer lookups
+    ('idx_test_attempts_lookup', 'test_attempts', 'test_id, user_id, status, started_at'),
+    # Test sweeper and the student's in-progress list; finalized attempts leave the in_progress range
+    ('idx_test_attempts_deadline', 'test_attempts', 'status, deadline'),
+    ('idx_test_attempt_answers_attempt', 'test_attempt_answers', 'test_attempt_id, question_id'),
+    ('idx_test_questions_order', 'test_questions', 'test_id, order_index'),
+    # Learning area
+    ('idx_notes_topic', 'notes', 'topic_id, visibility, order_index'),
+    ('idx_learning_materials_track_topic', 'learning_materials', 'language_track, topic, level, order_index'),
+    ('idx_course_enrollments_user', 'course_enrollments', 'user_id, status'),
+    # Job worker polls for runnable jobs; metrics count by status
+    ('idx_jobs_status', 'jobs', 'status, run_after'),
+]
+
+
+def ensure_indexes(db):
+    """Create any missing secondary indexes and refresh planner statistics"""
+    for name, table, columns in INDEXES:
+        db.execute(f'CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns})')
+    # Let the query planner see the new indexes' selectivity
+    db.execute('PRAGMA optimize')
+
+
+# Full-text indexes (see search.py): (FTS table, source table, [(column, source column, is_html)]).
+# Note and material bodies are HTML and only their visible text is indexed.
+# SQLite cannot strip HTML by itself and the triggers must work for any
+# client (sqlite3 shell, imports), so tables with HTML columns only get a
+# delete trigger: the app indexes the rows it inserts or updates with
+# index_search_rows(), and rebuild_search_index() repairs other writes.
+SEARCH_INDEXES = [
+    ('questions_fts', 'questions',
+     [('title', 'title', False), ('question_text', 'question_text', False), ('explanation', 'explanation', False)]),
+    ('notes_fts', 'notes', [('title', 'title', False), ('body', 'content', True)]),
+    ('learning_materials_fts', 'learning_materials', [('title', 'title', False), ('body', 'content', True)]),
+]
+
+# Two- and three-character prefix indexes make short prefix queries cheap
+SEARCH_TOKENIZER = "tokenize='unicode61 remove_diacritics 2', prefix='2 3'"
+
+# Rows read per batch when re-filling a full-text table
+SEARCH_REBUILD_BATCH = 500
+
+
+def _search_index(fts_table):
+    """(source table, columns) of a full-text table"""
+    for name, source, columns in SEARCH_INDEXES:
+        if name == fts_table:
+            return source, columns
+    raise ValueError(f'Unknown search index: {fts_table}')
+
+
+def _has_html(columns):
+    """Whether an index has HTML columns (indexed by the app rather than by triggers)"""
+    return any(is_html for _, _, is_html in columns)
+
+
+def ensure_search_indexes(db):
+    """Create the full-text tables and their sync triggers, filling any new table from its source"""
+    for fts_table, source, columns in SEARCH_INDEXES:
+        exists = db.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (fts_table,)
+        ).fetchone()
+        names = ', '.join(name for name, _, _ in columns)
+        db.execute(f'CREATE VIRTUAL TABLE IF NOT EXISTS {fts_table} USING fts5({names}, {SEARCH_TOKENIZER})')
+        
+        delete = f'DELETE FROM {fts_table} WHERE rowid = old.id;'
+        db.execute(f'CREATE TRIGGER IF NOT EXISTS {fts_table}_delete AFTER DELETE ON {source} BEGIN {delete} END')
+        if _has_html(columns):
+            # Earlier versions stripped HTML in these triggers through an
+            # app-registered function, which broke writes from other clients
+            db.execute(f'DROP TRIGGER IF EXISTS {fts_table}_insert')
+            db.execute(f'DROP TRIGGER IF EXISTS {fts_table}_update')
+        else:
+            values = ', '.join(f'new.{source_column}' for _, source_column, _ in columns)
+            insert = f'INSERT INTO {fts_table} (rowid, {names}) VALUES (new.id, {values});'
+            watched = ', '.join(source_column for _, source_column, _ in columns)
+            db.execute(f'CREATE TRIGGER IF NOT EXISTS {fts_table}_insert AFTER INSERT ON {source} BEGIN {insert} END')
+            db.execute(
+                f'CREATE TRIGGER IF NOT EXISTS {fts_table}_update AFTER UPDATE OF {watched} ON {source} '
+                f'BEGIN {delete} {insert} END'
+            )
+        
+        if not exists:
+            rebuild_search_index(db, fts_table)
+
+
+def _insert_search_rows(db, fts_table, columns, rows):
+    """Add source rows (id first, then the indexed columns) to a full-text table"""
+    names = ', '.join(name for name, _, _ in columns)
+    placeholders = ', '.join(['?'] * (len(columns) + 1))
+    db.executemany(
+        f'INSERT INTO {fts_table} (rowid, {names}) VALUES ({placeholders})',
+        [
+            (row[0], *(html_to_text(value) if is_html else value
+                       for value, (_, _, is_html) in zip(row[1:], columns)))
+            for row in rows
+        ]
+    )
+
+
+def index_search_rows(db, fts_table, ids):
+    """Re-index the given source rows of a full-text table after writing them (caller commits)"""
+    source, columns = _search_index(fts_table)
+    ids = list(ids)
+    if not ids:
+        return
+    placeholders = ','.join(['?'] * len(ids))
+    sources = ', '.join(source_column for _, source_column, _ in columns)
+    db.execute(f'DELETE FROM {fts_table} WHERE rowid IN ({placeholders})', ids)
+    rows = db.execute(f'SELECT id, {sources} FROM {source} WHERE id IN ({placeholders})', ids).fetchall()
+    _insert_search_rows(db, fts_table, columns, rows)
+
+
+def rebuild_search_index(db, fts_table):
+    """Re-fill one full-text table from its source table (caller commits)"""
+    source, columns = _search_index(fts_table)
+    sources = ', '.join(source_column for _, source_column, _ in columns)
+    db.execute(f'DELETE FROM {fts_table}')
+    cursor = db.execute(f'SELECT id, {sources} FROM {source}')
+    while True:
+        rows = cursor.fetchmany(SEARCH_REBUILD_BATCH)
+        if not rows:
+            break
+        _insert_search_rows(db, fts_table, columns, rows)
+
+
 def init_db():
     """Create all database tables"""
-    db = get_db()
+    db = _connect()
     
     # Users table
     db.execute('''
@@ -79,6 +484,25 @@ def init_db():
         )
     ''')
     
+    # Denormalized attempt counters, maintained by submit_practice_answer
+    for column in ('total_attempts', 'correct_attempts', 'questions_attempted'):
+        try:
+            db.execute(f'ALTER TABLE user_stats ADD COLUMN {column} INTEGER DEFAULT 0')
+        except sqlite3.OperationalError:
+            pass
+    
+    # Next unearned badge threshold per metric (JSON, see badges.py)
+    try:
+        db.execute('ALTER TABLE user_stats ADD COLUMN badge_watermarks TEXT')
+    except sqlite3.OperationalError:
+        pass
+    
+    # Bumped whenever the user's dashboard changes (see logic.get_dashboard)
+    try:
+        db.execute('ALTER TABLE user_stats ADD COLUMN dashboard_version INTEGER DEFAULT 0')
+    except sqlite3.OperationalError:
+        pass
+    
     # Attempts table
     db.execute('''
         CREATE TABLE IF NOT EXISTS attempts (
@@ -280,6 +704,50 @@ def init_db():
         )
     ''')
     
+    # Answer key versioning: a test's version moves on every edit to its
+    # questions, and each attempt is graded against the version it started on
+    try:
+        db.execute('ALTER TABLE tests ADD COLUMN answer_key_version INTEGER DEFAULT 0')
+    except sqlite3.OperationalError:
+        pass
+    try:
+        db.execute('ALTER TABLE test_attempts ADD COLUMN answer_key_version INTEGER')
+    except sqlite3.OperationalError:
+        pass
+    
+    # Server-side time limit: attempts past their deadline are finalized by
+    # the test sweeper (NULL for tests without a time limit)
+    try:
+        db.execute('ALTER TABLE test_attempts ADD COLUMN deadline TIMESTAMP')
+        db.execute('''
+            UPDATE test_attempts
+            SET deadline = (SELECT datetime(test_attempts.started_at, '+' || t.time_limit_minutes || ' minutes')
+                            FROM tests t
+                            WHERE t.id = test_attempts.test_id AND t.time_limit_minutes > 0)
+            WHERE status = 'in_progress'
+        ''')
+    except sqlite3.OperationalError:
+        pass
+    
+    # Compiled answer key snapshots, one per test version (see logic.py)
+    db.execute('''
+        CREATE TABLE IF NOT EXISTS test_answer_keys (
+            test_id INTEGER NOT NULL,
+            version INTEGER NOT NULL,
+            answer_key TEXT NOT NULL,
+            compiled_at TIMESTAMP,
+            PRIMARY KEY (test_id, version),
+            FOREIGN KEY (test_id) REFERENCES tests(id) ON DELETE CASCADE
+        )
+    ''')
+    
+    # Browser timestamp (ms) of the click that produced an autosaved answer,
+    # so a delayed batch cannot overwrite a newer choice
+    try:
+        db.execute('ALTER TABLE test_attempt_answers ADD COLUMN client_ts INTEGER')
+    except sqlite3.OperationalError:
+        pass
+    
     # Update users table for super_admin
     try:
         db.execute("ALTER TABLE users ADD COLUMN is_super_admin INTEGER DEFAULT 0")
@@ -341,6 +809,110 @@ def init_db():
         )
     ''')
     
+    # Named counters and watermarks shared by all workers
+    db.execute('''
+        CREATE TABLE IF NOT EXISTS system_counters (
+            name TEXT PRIMARY KEY,
+            value INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    
+    # Journal of users whose leaderboard entry changed; each worker's
+    # in-memory leaderboard applies new events since its last sync
+    db.execute('''
+        CREATE TABLE IF NOT EXISTS leaderboard_events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL
+        )
+    ''')
+    
+    # Per-user XP buckets for the day/week/month leaderboards
+    db.execute('''
+        CREATE TABLE IF NOT EXISTS leaderboard_rollups (
+            period TEXT NOT NULL CHECK(period IN ('day', 'week', 'month')),
+            period_start TEXT NOT NULL,
+            user_id INTEGER NOT NULL,
+            xp INTEGER DEFAULT 0,
+            attempts INTEGER DEFAULT 0,
+            correct INTEGER DEFAULT 0,
+            PRIMARY KEY (period, period_start, user_id),
+            FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+        )
+    ''')
+    
+    # Per-user daily activity rollup (dashboard chart, streaks)
+    db.execute('''
+        CREATE TABLE IF NOT EXISTS user_daily_activity (
+            user_id INTEGER NOT NULL,
+            day TEXT NOT NULL,
+            xp INTEGER DEFAULT 0,
+            attempts INTEGER DEFAULT 0,
+            correct INTEGER DEFAULT 0,
+            PRIMARY KEY (user_id, day),
+            FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+        )
+    ''')
+    
+    # Attempt counters by question, topic and difficulty (see analytics.py)
+    db.execute('''
+        CREATE TABLE IF NOT EXISTS analytics_counters (
+            dimension TEXT NOT NULL CHECK(dimension IN ('all', 'question', 'topic', 'difficulty')),
+            key TEXT NOT NULL,
+            attempts INTEGER DEFAULT 0,
+            correct INTEGER DEFAULT 0,
+            xp INTEGER DEFAULT 0,
+            PRIMARY KEY (dimension, key)
+        )
+    ''')
+    
+    # Per-question difficulty, discrimination and option rates (see item_analysis.py)
+    db.execute('''
+        CREATE TABLE IF NOT EXISTS question_item_stats (
+            question_id INTEGER PRIMARY KEY,
+            test_responses INTEGER DEFAULT 0,
+            p_value REAL,
+            point_biserial REAL,
+            practice_responses INTEGER DEFAULT 0,
+            rate_a REAL,
+            rate_b REAL,
+            rate_c REAL,
+            rate_d REAL,
+            computed_at TIMESTAMP
+        )
+    ''')
+    
+    # Per-user completion bitsets over question ids (see progress.py)
+    db.execute('''
+        CREATE TABLE IF NOT EXISTS user_completion_bitmaps (
+            user_id INTEGER PRIMARY KEY,
+            attempted BLOB,
+            solved BLOB,
+            updated_at TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+        )
+    ''')
+    
+    # Background job queue (see jobs.py)
+    db.execute('''
+        CREATE TABLE IF NOT EXISTS jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            kind TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            idempotency_key TEXT UNIQUE,
+            status TEXT DEFAULT 'pending' CHECK(status IN ('pending', 'running', 'done', 'failed')),
+            attempts INTEGER DEFAULT 0,
+            max_attempts INTEGER DEFAULT 5,
+            run_after REAL NOT NULL,
+            locked_until REAL,
+            last_error TEXT,
+            enqueued_at REAL NOT NULL,
+            finished_at REAL
+        )
+    ''')
+    
+    ensure_indexes(db)
+    ensure_search_indexes(db)
+    
     # Initialize default badges
     default_badges = [
         ('First Steps', 'Complete your first question', 'first_attempt', 1),
@@ -351,6 +923,8 @@ def init_db():
         ('Unstoppable', 'Maintain a 30-day streak', 'streak', 30),
         ('Centurion', 'Earn 1000 XP', 'xp', 1000),
         ('Champion', 'Earn 5000 XP', 'xp', 5000),
+        ('Sharpshooter', 'Answer 50 questions correctly', 'correct_answers', 50),
+        ('Explorer', 'Attempt 100 different questions', 'questions_attempted', 100),
     ]
     
     for badge_name, description, badge_type, requirement in default_badges:
@@ -0,0 +1,180 @@
+"""
+Data exports
+Streaming CSV/JSONL exports for admins. Rows are read from the cursor in
+batches with fetchmany and encoded as they go, so memory use does not
+grow with the size of the export.
+"""
+
+import csv
+import io
+import json
+from datetime import date, timedelta
+from itertools import groupby
+
+# Rows fetched from SQLite (and encoded into one response chunk) at a time
+EXPORT_BATCH_SIZE = 500
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'jsonl': 'application/x-ndjson'
+}
+
+
+def iter_rows(cursor, batch_size=EXPORT_BATCH_SIZE):
+    """Yield a cursor's rows, fetching `batch_size` at a time"""
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            return
+        yield from rows
+
+
+def stream_csv(columns, rows, batch_size=EXPORT_BATCH_SIZE):
+    """Encode rows (sequences in `columns` order) as CSV chunks"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    count = 0
+    for row in rows:
+        writer.writerow(row)
+        count += 1
+        if count % batch_size == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def stream_jsonl(columns, rows, batch_size=EXPORT_BATCH_SIZE):
+    """Encode rows (sequences in `columns` order) as JSON Lines chunks"""
+    lines = []
+    for row in rows:
+        lines.append(json.dumps(dict(zip(columns, row)), default=str))
+        if len(lines) >= batch_size:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+    if lines:
+        yield '\n'.join(lines) + '\n'
+
+
+def stream_export(export_format, columns, rows):
+    """Chunk generator for an export in 'csv' or 'jsonl' format"""
+    if export_format == 'jsonl':
+        return stream_jsonl(columns, rows)
+    return stream_csv(columns, rows)
+
+
+# ==================== EXPORT QUERIES ====================
+
+TEST_RESULT_COLUMNS = ['attempt_id', 'user_id', 'username', 'started_at', 'submitted_at',
+                       'score', 'correct_answers', 'total_questions', 'passed']
+
+
+def test_results_export(db, test_id):
+    """(columns, rows) for every completed attempt of a test, by student then start time
+
+    Both export queries on test_attempts follow the (test_id, user_id,
+    started_at) unique index, so no sort is buffered before the first row.
+    """
+    passing = db.execute('SELECT passing_score FROM tests WHERE id = ?', (test_id,)).fetchone()
+    passing_score = passing['passing_score'] if passing else 0
+
+    cursor = db.execute(
+        '''SELECT ta.id, ta.user_id, u.username, ta.started_at, ta.submitted_at,
+                  ta.score, ta.correct_answers, ta.total_questions
+           FROM test_attempts ta
+           JOIN users u ON u.id = ta.user_id
+           WHERE ta.test_id = ? AND ta.status = 'completed'
+           ORDER BY ta.user_id, ta.started_at''',
+        (test_id,)
+    )
+    rows = (
+        tuple(row) + (1 if (row['score'] or 0) >= passing_score else 0,)
+        for row in iter_rows(cursor)
+    )
+    return TEST_RESULT_COLUMNS, rows
+
+
+def answer_matrix_export(db, test_id):
+    """(columns, rows) with one row per completed attempt and two columns per question
+
+    `q<id>` is the selected answer and `q<id>_correct` is 1/0 (blank if
+    unanswered). Answers are streamed in attempt order and pivoted one
+    attempt at a time.
+    """
+    question_ids = [
+        row['question_id'] for row in db.execute(
+            'SELECT question_id FROM test_questions WHERE test_id = ? ORDER BY order_index, question_id',
+            (test_id,)
+        ).fetchall()
+    ]
+    columns = ['attempt_id', 'username', 'score']
+    for question_id in question_ids:
+        columns += [f'q{question_id}', f'q{question_id}_correct']
+
+    cursor = db.execute(
+        '''SELECT ta.id as attempt_id, u.username, ta.score,
+                  a.question_id, a.selected_answer, a.is_correct
+           FROM test_attempts ta
+           JOIN users u ON u.id = ta.user_id
+           LEFT JOIN test_attempt_answers a ON a.test_attempt_id = ta.id
+           WHERE ta.test_id = ? AND ta.status = 'completed'
+           ORDER BY ta.user_id, ta.started_at''',
+        (test_id,)
+    )
+
+    def rows():
+        for attempt_id, answers in groupby(iter_rows(cursor), key=lambda row: row['attempt_id']):
+            answers = list(answers)
+            by_question = {answer['question_id']: answer for answer in answers}
+            row = [attempt_id, answers[0]['username'], answers[0]['score']]
+            for question_id in question_ids:
+                answer = by_question.get(question_id)
+                if answer is None:
+                    row += ['', '']
+                else:
+                    row += [answer['selected_answer'] or '', 1 if answer['is_correct'] == 1 else 0]
+            yield row
+
+    return columns, rows()
+
+
+PRACTICE_ATTEMPT_COLUMNS = ['attempt_id', 'user_id', 'username', 'question_id', 'topic', 'difficulty',
+                            'selected_answer', 'is_correct', 'xp_earned', 'attempted_at']
+
+
+def practice_attempts_export(db, since=None, until=None, user_id=None):
+    """(columns, rows) for raw practice attempts, optionally by date range (inclusive) and user
+
+    Ordered by attempted_at so SQLite walks an index instead of sorting
+    the whole result in a temp b-tree before the first row.
+    """
+    conditions = []
+    params = []
+    if since:
+        conditions.append('a.attempted_at >= ?')
+        params.append(since.isoformat())
+    if until:
+        conditions.append('a.attempted_at < ?')
+        params.append((until + timedelta(days=1)).isoformat())
+    if user_id:
+        conditions.append('a.user_id = ?')
+        params.append(user_id)
+    where = ('WHERE ' + ' AND '.join(conditions)) if conditions else ''
+
+    cursor = db.execute(
+        f'''SELECT a.id, a.user_id, u.username, a.question_id, q.topic, q.difficulty,
+                   a.selected_answer, a.is_correct, a.xp_earned, a.attempted_at
+            FROM attempts a
+            JOIN users u ON u.id = a.user_id
+            LEFT JOIN questions q ON q.id = a.question_id
+            {where}
+            ORDER BY a.attempted_at''',
+        params
+    )
+    return PRACTICE_ATTEMPT_COLUMNS, (tuple(row) for row in iter_rows(cursor))
+
+
+def parse_export_date(value):
+    """date from a YYYY-MM-DD query parameter, or None if empty (ValueError if malformed)"""
+    return date.fromisoformat(value) if value else None
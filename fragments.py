@@ -0,0 +1,91 @@
+"""
+Rendered fragments
+Note and learning material bodies rendered once per revision and kept in a
+byte-bounded LRU, plus ETags so the learning pages that show them can
+answer conditional GETs with 304 Not Modified. A fragment is keyed by
+(kind, id) and versioned by the row's timestamps, so an edit made through
+any worker is picked up on the next view; admin routes that change a note
+also purge it here.
+"""
+
+import hashlib
+from collections import namedtuple
+from flask import current_app, get_flashed_messages, make_response, request, session
+from markupsafe import Markup
+from cache import LRUCache, register_cache
+
+FRAGMENT_CACHE_ENTRIES = 5000
+FRAGMENT_CACHE_BYTES = 32 * 1024 * 1024
+
+_fragment_cache = register_cache(
+    LRUCache('fragments', max_entries=FRAGMENT_CACHE_ENTRIES, max_bytes=FRAGMENT_CACHE_BYTES)
+)
+
+Fragment = namedtuple('Fragment', 'html etag')
+
+_templates_digest = None
+
+
+def _digest(data):
+    """Short hex digest of bytes"""
+    return hashlib.blake2b(data, digest_size=12).hexdigest()
+
+
+def revision(row):
+    """Version of a notes/learning_materials row (updated_at is unset on seeded rows)"""
+    return (row['updated_at'], row['created_at'])
+
+
+def get_fragment(kind, item_id, version, render):
+    """Cached Fragment for one item at `version`, calling render() for its HTML on a miss"""
+    key = (kind, item_id)
+    fragment = _fragment_cache.get(key, version=version)
+    if fragment is None:
+        html = Markup(render())
+        data = html.encode()
+        fragment = Fragment(html, _digest(data))
+        _fragment_cache.set(key, fragment, version=version, size=len(data))
+    return fragment
+
+
+def purge_fragment(kind, item_id):
+    """Drop one item's cached fragment"""
+    _fragment_cache.invalidate((kind, item_id))
+
+
+def _templates_version():
+    """Digest of every template's source, so a deploy that changes a page changes its ETags"""
+    global _templates_digest
+    if _templates_digest is None:
+        env = current_app.jinja_env
+        digest = hashlib.blake2b(digest_size=8)
+        for name in sorted(env.list_templates()):
+            digest.update(env.loader.get_source(env, name)[0].encode())
+        _templates_digest = digest.hexdigest()
+    return _templates_digest
+
+
+def page_etag(*parts):
+    """ETag for a page built from `parts` (plain values) for the signed-in user
+
+    The user is part of every ETag because the navigation bar names them.
+    """
+    user = (session.get('user_id'), session.get('username'), session.get('role'))
+    return _digest(repr((_templates_version(), user, parts)).encode())
+
+
+def conditional_page(etag, render):
+    """Response for a page with this ETag: 304 if the client has it, otherwise render()
+
+    A page with flash messages pending is rendered without an ETag, so the
+    message is shown once and never served again from the browser cache.
+    """
+    if get_flashed_messages():
+        return render()
+    if etag in request.if_none_match:
+        response = make_response('', 304)
+    else:
+        response = make_response(render())
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
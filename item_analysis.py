@@ -0,0 +1,188 @@
+"""
+Item analysis
+Classical item statistics per question, recomputed in bulk into
+question_item_stats: the difficulty index (p-value) and point-biserial
+discrimination from completed test attempts, and how often each option
+is picked in practice (distractor analysis).
+"""
+
+import math
+from collections import Counter, defaultdict
+from datetime import datetime
+from jobs import enqueue_job, job_handler
+from logic import AnswerKey
+
+OPTIONS = ('A', 'B', 'C', 'D')
+
+# Below this many responses a question's statistics are shown but it is
+# left out of the flag filters
+ITEM_MIN_RESPONSES = 20
+
+# Admin filters: name -> (label, condition on stats `s` and questions `q`)
+ITEM_FLAGS = {
+    'too_hard': ('Too hard (p < 0.30)',
+                 f's.test_responses >= {ITEM_MIN_RESPONSES} AND s.p_value < 0.30'),
+    'too_easy': ('Too easy (p > 0.90)',
+                 f's.test_responses >= {ITEM_MIN_RESPONSES} AND s.p_value > 0.90'),
+    'low_discrimination': ('Low discrimination (r < 0.20)',
+                           f's.test_responses >= {ITEM_MIN_RESPONSES} AND s.point_biserial < 0.20'),
+    'weak_distractor': ('Distractor picked < 5%',
+                        f's.practice_responses >= {ITEM_MIN_RESPONSES} AND (' + ' OR '.join(
+                            f"(UPPER(TRIM(q.correct_answer)) != '{option}' AND s.rate_{option.lower()} < 0.05)"
+                            for option in OPTIONS
+                        ) + ')'),
+}
+
+# Admin sorts: name -> ascending sort key on stats `s`; both statistics lie
+# in [-1, 1], so questions without them sort last at 2
+ITEM_SORTS = {
+    'p_value': 'COALESCE(s.p_value, 2)',
+    'discrimination': 'COALESCE(s.point_biserial, 2)',
+}
+
+# Point-biserial inputs come from two grouped queries. Every completed
+# attempt counts as a response to each question of the answer key it was
+# graded against (a blank answer is wrong), so responses and score sums per
+# question add up per-(test, key version) totals; only the correct answers
+# need scanning for the rest. Attempts without a pinned version were graded
+# against the test's current questions.
+_TEST_TOTALS_SQL = '''
+    SELECT test_id, answer_key_version AS version,
+           COUNT(*) AS n, SUM(score) AS sum_score, SUM(score * score) AS sum_score_sq
+    FROM test_attempts
+    WHERE status = 'completed' AND score IS NOT NULL
+    GROUP BY test_id, answer_key_version
+'''
+
+_TEST_CORRECT_SQL = '''
+    SELECT ta.test_id, ta.answer_key_version AS version, a.question_id,
+           COUNT(*) AS n_correct, SUM(ta.score) AS sum_score_correct
+    FROM test_attempt_answers a
+    JOIN test_attempts ta ON ta.id = a.test_attempt_id
+    WHERE a.is_correct = 1 AND ta.status = 'completed' AND ta.score IS NOT NULL
+    GROUP BY ta.test_id, ta.answer_key_version, a.question_id
+'''
+
+
+def attempt_question_sets(db):
+    """Lookup from (test_id, answer key version) to the question ids its attempts were graded on
+
+    Pinned versions use their stored key; attempts from before pinning
+    (version None) or whose key is missing use the test's current questions.
+    """
+    pinned = {
+        (row['test_id'], row['version']): set(AnswerKey.from_json(row['test_id'], row['version'],
+                                                                  row['answer_key']).entries)
+        for row in db.execute('SELECT test_id, version, answer_key FROM test_answer_keys')
+    }
+    current = defaultdict(set)
+    for row in db.execute('SELECT test_id, question_id FROM test_questions'):
+        current[row['test_id']].add(row['question_id'])
+    
+    def questions_for(test_id, version):
+        questions = pinned.get((test_id, version))
+        return questions if questions is not None else current.get(test_id, set())
+    return questions_for
+
+
+def test_response_sums(db):
+    """{question_id: [n, n_correct, sum_score, sum_score_sq, sum_score_correct]} over completed test attempts"""
+    questions_for = attempt_question_sets(db)
+    sums = defaultdict(lambda: [0, 0, 0, 0, 0])
+    for row in db.execute(_TEST_TOTALS_SQL):
+        for question_id in questions_for(row['test_id'], row['version']):
+            question_sums = sums[question_id]
+            question_sums[0] += row['n']
+            question_sums[2] += row['sum_score']
+            question_sums[3] += row['sum_score_sq']
+    for row in db.execute(_TEST_CORRECT_SQL):
+        # Answers to questions outside the attempt's key were never graded
+        if row['question_id'] in questions_for(row['test_id'], row['version']):
+            question_sums = sums[row['question_id']]
+            question_sums[1] += row['n_correct']
+            question_sums[4] += row['sum_score_correct']
+    return sums
+
+
+def practice_option_counts(db):
+    """{question_id: Counter of normalized options} from one scan of attempts
+
+    The two columns are read in table order and tallied in Python, which
+    is cheaper than a grouped query that sorts every row; answers are
+    normalized once per distinct (question, answer) pair.
+    """
+    cursor = db.cursor()
+    cursor.row_factory = None
+    raw = Counter(cursor.execute('SELECT question_id, selected_answer FROM attempts'))
+    counts = defaultdict(Counter)
+    for (question_id, answer), n in raw.items():
+        counts[question_id][(answer or '').strip().upper()] += n
+    return counts
+
+
+def point_biserial(n, n_correct, sum_score, sum_score_sq, sum_score_correct):
+    """Correlation between correctness (0/1) and score from their sums, or None if undefined"""
+    if n < 2:
+        return None
+    score_var = n * sum_score_sq - sum_score * sum_score
+    correct_var = n * n_correct - n_correct * n_correct
+    if score_var <= 0 or correct_var <= 0:
+        return None
+    return (n * sum_score_correct - n_correct * sum_score) / math.sqrt(score_var * correct_var)
+
+
+def compute_item_stats(db):
+    """Recompute question_item_stats for every question (caller commits)
+
+    The per-question sums come from grouped passes over the test history
+    (each attempt counted against its pinned answer key) and one over
+    practice attempts; the statistics are closed-form from those
+    sums, so there is no query per question. Returns the number of
+    questions written.
+    """
+    test_sums = test_response_sums(db)
+    option_counts = practice_option_counts(db)
+    computed_at = datetime.now()
+
+    rows = []
+    for (question_id,) in db.execute('SELECT id FROM questions'):
+        p_value = discrimination = None
+        sums = test_sums.get(question_id)
+        test_responses = sums[0] if sums else 0
+        if test_responses:
+            p_value = sums[1] / test_responses
+            discrimination = point_biserial(*sums)
+
+        counts = option_counts.get(question_id, Counter())
+        practice_responses = sum(counts.values())
+        rates = [counts[option] / practice_responses if practice_responses else None for option in OPTIONS]
+        rows.append((question_id, test_responses, p_value, discrimination, practice_responses,
+                     *rates, computed_at))
+
+    db.execute('DELETE FROM question_item_stats')
+    db.executemany(
+        '''INSERT INTO question_item_stats
+           (question_id, test_responses, p_value, point_biserial, practice_responses,
+            rate_a, rate_b, rate_c, rate_d, computed_at)
+           VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+        rows
+    )
+    return len(rows)
+
+
+@job_handler('item_analysis')
+def run_item_analysis(db, payload):
+    """Job: recompute the item statistics"""
+    compute_item_stats(db)
+
+
+def schedule_item_analysis(db):
+    """Queue a recompute (caller commits); requests within the same minute share one job"""
+    minute = int(datetime.now().timestamp() // 60)
+    enqueue_job(db, 'item_analysis', {}, key=f'item_analysis:{minute}')
+
+
+def last_computed_at(db):
+    """When the item statistics were last computed, or None"""
+    row = db.execute('SELECT MAX(computed_at) AS computed_at FROM question_item_stats').fetchone()
+    return row['computed_at']
@@ -0,0 +1,241 @@
+"""
+Background jobs
+SQLite-backed job queue for side effects that don't need to finish before
+the response (rollups, notifications). Jobs are enqueued in the same
+transaction as the write that caused them and run by a worker thread.
+"""
+
+import json
+import threading
+import time
+import traceback
+from database import get_db
+
+# Seconds the worker sleeps when the queue is empty (enqueue wakes it early)
+POLL_INTERVAL_SECONDS = 1.0
+
+# A claimed job whose worker died is retried after this many seconds
+LEASE_SECONDS = 60
+
+DEFAULT_MAX_ATTEMPTS = 5
+
+_handlers = {}
+
+
+def job_handler(kind):
+    """Register `func(db, payload)` as the handler for a job kind
+
+    Handlers run inside the transaction that marks the job done, so their
+    writes and the completion commit (or roll back) together.
+    """
+    def register(func):
+        _handlers[kind] = func
+        return func
+    return register
+
+
+def enqueue_job(db, kind, payload, key=None, max_attempts=DEFAULT_MAX_ATTEMPTS, delay=0):
+    """Queue a job to run after `delay` seconds (caller commits); a repeated idempotency `key` is ignored"""
+    now = time.time()
+    db.execute(
+        '''INSERT OR IGNORE INTO jobs (kind, payload, idempotency_key, max_attempts, run_after, enqueued_at)
+           VALUES (?, ?, ?, ?, ?, ?)''',
+        (kind, json.dumps(payload), key, max_attempts, now + max(delay, 0), now)
+    )
+
+
+def retry_delay(attempts):
+    """Exponential backoff: 2, 4, 8 ... seconds, capped at 5 minutes"""
+    return min(2 ** attempts, 300)
+
+
+_stats_lock = threading.Lock()
+_stats = {'processed': 0, 'retried': 0, 'failed': 0}
+
+
+def _count(name):
+    """Bump an in-process worker counter"""
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def claim_job(db):
+    """Atomically take the oldest runnable job, or None if the queue is idle"""
+    now = time.time()
+    # Cheap read first, so an idle worker doesn't take the write lock every poll
+    runnable = db.execute(
+        '''SELECT 1 FROM jobs
+           WHERE (status = 'pending' AND run_after <= ?)
+              OR (status = 'running' AND locked_until < ?)
+           LIMIT 1''',
+        (now, now)
+    ).fetchone()
+    if runnable is None:
+        return None
+
+    rows = db.execute(
+        '''UPDATE jobs SET status = 'running', attempts = attempts + 1, locked_until = ?
+           WHERE id = (SELECT id FROM jobs
+                       WHERE (status = 'pending' AND run_after <= ?)
+                          OR (status = 'running' AND locked_until < ?)
+                       ORDER BY id LIMIT 1)
+           RETURNING id, kind, payload, attempts, max_attempts''',
+        (now + LEASE_SECONDS, now, now)
+    ).fetchall()
+    db.commit()
+    return rows[0] if rows else None
+
+
+def run_job(db, job):
+    """Run one claimed job, recording success, a retry or a permanent failure"""
+    try:
+        handler = _handlers.get(job['kind'])
+        if handler is None:
+            raise LookupError(f"No handler registered for job kind '{job['kind']}'")
+        handler(db, json.loads(job['payload']))
+        db.execute(
+            "UPDATE jobs SET status = 'done', finished_at = ?, last_error = NULL WHERE id = ?",
+            (time.time(), job['id'])
+        )
+        db.commit()
+        _count('processed')
+        return True
+    except Exception as e:
+        db.rollback()
+        error = f"{type(e).__name__}: {str(e)}"
+        if job['attempts'] >= job['max_attempts']:
+            db.execute(
+                "UPDATE jobs SET status = 'failed', finished_at = ?, last_error = ? WHERE id = ?",
+                (time.time(), error, job['id'])
+            )
+            _count('failed')
+            print(f"Job {job['id']} ({job['kind']}) failed permanently: {error}")
+        else:
+            db.execute(
+                "UPDATE jobs SET status = 'pending', run_after = ?, last_error = ? WHERE id = ?",
+                (time.time() + retry_delay(job['attempts']), error, job['id'])
+            )
+            _count('retried')
+        db.commit()
+        return False
+
+
+def run_pending_jobs(limit=None, db=None):
+    """Run runnable jobs until the queue is idle (or `limit` jobs ran)"""
+    db = db or get_db()
+    ran = 0
+    while limit is None or ran < limit:
+        job = claim_job(db)
+        if job is None:
+            break
+        run_job(db, job)
+        ran += 1
+    return ran
+
+
+class JobWorker:
+    """Daemon thread that drains the job queue"""
+
+    def __init__(self, poll_interval=POLL_INTERVAL_SECONDS):
+        self.poll_interval = poll_interval
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Start the thread (once)"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='job-worker', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5):
+        """Ask the thread to exit and wait for it"""
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+    def wake(self):
+        """Process newly committed jobs without waiting for the next poll"""
+        self._wake.set()
+
+    @property
+    def running(self):
+        """Whether the thread is alive"""
+        return bool(self._thread and self._thread.is_alive())
+
+    def _run(self):
+        """Thread body: drain, then sleep until woken or the poll interval passes"""
+        # No app context in this thread, so this is a dedicated connection
+        db = get_db()
+        try:
+            while not self._stop.is_set():
+                self._wake.clear()
+                try:
+                    run_pending_jobs(db=db)
+                except Exception:
+                    traceback.print_exc()
+                self._wake.wait(self.poll_interval)
+        finally:
+            db.close()
+
+
+worker = JobWorker()
+_start_lock = threading.Lock()
+
+
+def start_job_worker():
+    """Start this process's job worker thread; True if it was not already running"""
+    with _start_lock:
+        if worker.running:
+            return False
+        worker.start()
+        return True
+
+
+def wake_job_worker():
+    """Nudge the worker after committing new jobs (no-op if it isn't running)"""
+    if worker.running:
+        worker.wake()
+
+
+def prune_jobs(older_than_days=7):
+    """Delete finished jobs older than the given age; returns rows deleted"""
+    db = get_db()
+    try:
+        cursor = db.execute(
+            "DELETE FROM jobs WHERE status = 'done' AND finished_at < ?",
+            (time.time() - older_than_days * 86400,)
+        )
+        db.commit()
+        return cursor.rowcount
+    except Exception:
+        db.rollback()
+        raise
+
+
+def get_job_stats():
+    """Queue backlog and worker counters"""
+    db = get_db()
+    counts = {
+        row['status']: row['count'] for row in db.execute(
+            'SELECT status, COUNT(*) as count FROM jobs GROUP BY status'
+        ).fetchall()
+    }
+    oldest = db.execute(
+        "SELECT MIN(enqueued_at) as oldest FROM jobs WHERE status IN ('pending', 'running')"
+    ).fetchone()['oldest']
+
+    with _stats_lock:
+        stats = dict(_stats)
+    stats.update({
+        'pending': counts.get('pending', 0),
+        'running': counts.get('running', 0),
+        'failed_total': counts.get('failed', 0),
+        'done_total': counts.get('done', 0),
+        'oldest_pending_seconds': round(time.time() - oldest, 1) if oldest else 0,
+        'worker_running': worker.running
+    })
+    return stats
@@ -0,0 +1,403 @@
+"""
+Leaderboard engine
+In-process ranked index of students by XP, kept current from the
+leaderboard_events journal instead of sorting user_stats on every view
+"""
+
+import threading
+from bisect import bisect_left, insort
+from datetime import date, timedelta
+from database import get_db, get_counter, set_counter
+
+# Users fetched per query when applying journal events
+FETCH_CHUNK_SIZE = 500
+
+PRUNED_COUNTER = 'leaderboard_pruned_through'
+
+
+def record_leaderboard_event(db, user_id):
+    """Journal that a user's leaderboard entry may have changed (caller commits)"""
+    db.execute('INSERT INTO leaderboard_events (user_id) VALUES (?)', (user_id,))
+
+
+def prune_leaderboard_events(keep=10000):
+    """Delete all but the newest `keep` journal events
+
+    Workers whose watermark falls behind the pruned range reload in full.
+    Returns the number of events deleted.
+    """
+    db = get_db()
+    try:
+        max_id = db.execute('SELECT COALESCE(MAX(id), 0) as max_id FROM leaderboard_events').fetchone()['max_id']
+        cutoff = max_id - keep
+        if cutoff <= 0:
+            return 0
+        cursor = db.execute('DELETE FROM leaderboard_events WHERE id <= ?', (cutoff,))
+        set_counter(db, PRUNED_COUNTER, max(cutoff, get_counter(db, PRUNED_COUNTER)))
+        db.commit()
+        return cursor.rowcount
+    except Exception:
+        db.rollback()
+        raise
+
+
+def _fetch_entries(db, user_ids=None):
+    """Load leaderboard rows for students (all, or only the given ids)"""
+    query = '''SELECT u.id, u.username, u.role, us.xp, us.level, us.streak
+               FROM users u
+               JOIN user_stats us ON u.id = us.user_id'''
+    if user_ids is None:
+        return db.execute(query + " WHERE u.role = 'student'").fetchall()
+
+    rows = []
+    user_ids = list(user_ids)
+    for i in range(0, len(user_ids), FETCH_CHUNK_SIZE):
+        chunk = user_ids[i:i + FETCH_CHUNK_SIZE]
+        placeholders = ','.join(['?'] * len(chunk))
+        rows.extend(db.execute(query + f' WHERE u.id IN ({placeholders})', chunk).fetchall())
+    return rows
+
+
+class RankedLeaderboard:
+    """Students kept sorted by (xp DESC, level DESC) for O(log n) rank lookups"""
+
+    def __init__(self):
+        self._keys = []
+        self._entries = {}
+        self._last_event_id = None
+        self._lock = threading.Lock()
+        self._stats = {'full_loads': 0, 'syncs': 0, 'events_applied': 0}
+
+    @staticmethod
+    def _key(entry):
+        return (-entry['xp'], -entry['level'], entry['id'])
+
+    @staticmethod
+    def _make_entry(row):
+        return {
+            'id': row['id'],
+            'username': row['username'],
+            'xp': row['xp'] or 0,
+            'level': row['level'] or 1,
+            'streak': row['streak'] or 0,
+        }
+
+    def _add(self, row):
+        entry = self._make_entry(row)
+        self._entries[entry['id']] = entry
+        insort(self._keys, self._key(entry))
+
+    def _remove(self, user_id):
+        entry = self._entries.pop(user_id, None)
+        if entry is None:
+            return
+        key = self._key(entry)
+        index = bisect_left(self._keys, key)
+        if index < len(self._keys) and self._keys[index] == key:
+            del self._keys[index]
+
+    def _load(self, db):
+        # Read the watermark first: events committed during the snapshot are
+        # re-applied on the next sync, which is harmless
+        last_event_id = db.execute(
+            'SELECT COALESCE(MAX(id), 0) as max_id FROM leaderboard_events'
+        ).fetchone()['max_id']
+        # The journal may be empty right after pruning
+        last_event_id = max(last_event_id, get_counter(db, PRUNED_COUNTER))
+
+        self._entries = {row['id']: self._make_entry(row) for row in _fetch_entries(db)}
+        self._keys = sorted(self._key(e) for e in self._entries.values())
+        self._last_event_id = last_event_id
+        self._stats['full_loads'] += 1
+
+    def sync(self, db=None):
+        """Apply journal events written since the last sync (any worker)"""
+        db = db or get_db()
+        with self._lock:
+            if self._last_event_id is None or self._last_event_id < get_counter(db, PRUNED_COUNTER):
+                self._load(db)
+                return
+
+            events = db.execute(
+                'SELECT id, user_id FROM leaderboard_events WHERE id > ? ORDER BY id',
+                (self._last_event_id,)
+            ).fetchall()
+            if not events:
+                return
+
+            user_ids = {e['user_id'] for e in events}
+            rows = {row['id']: row for row in _fetch_entries(db, user_ids)}
+            for user_id in user_ids:
+                self._remove(user_id)
+                row = rows.get(user_id)
+                if row is not None and row['role'] == 'student':
+                    self._add(row)
+
+            self._last_event_id = events[-1]['id']
+            self._stats['syncs'] += 1
+            self._stats['events_applied'] += len(events)
+
+    def _rank_at(self, index):
+        """Competition rank: users tied on XP and level share a rank"""
+        return bisect_left(self._keys, self._keys[index][:2]) + 1
+
+    def _entry_at(self, index):
+        entry = dict(self._entries[self._keys[index][2]])
+        entry['rank'] = self._rank_at(index)
+        return entry
+
+    def top(self, limit=20):
+        """Top `limit` students with their ranks"""
+        self.sync()
+        with self._lock:
+            return [self._entry_at(i) for i in range(min(limit, len(self._keys)))]
+
+    def rank_of(self, user_id):
+        """A student's rank, or None if they are not on the leaderboard"""
+        self.sync()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            return bisect_left(self._keys, self._key(entry)[:2]) + 1
+
+    def around(self, user_id, radius=2):
+        """A student's entry with up to `radius` neighbours on each side"""
+        self.sync()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return []
+            index = bisect_left(self._keys, self._key(entry))
+            start = max(0, index - radius)
+            end = min(len(self._keys), index + radius + 1)
+            return [self._entry_at(i) for i in range(start, end)]
+
+    def stats(self):
+        """Snapshot of leaderboard engine counters"""
+        with self._lock:
+            snapshot = dict(self._stats)
+            snapshot['size'] = len(self._keys)
+            snapshot['last_event_id'] = self._last_event_id
+        return snapshot
+
+
+ranked_leaderboard = RankedLeaderboard()
+
+
+def get_top(limit=20):
+    """Get the top students by XP"""
+    return ranked_leaderboard.top(limit)
+
+
+def get_rank(user_id):
+    """Get a student's leaderboard rank"""
+    return ranked_leaderboard.rank_of(user_id)
+
+
+def get_neighbours(user_id, radius=2):
+    """Get the students ranked around a user"""
+    return ranked_leaderboard.around(user_id, radius)
+
+
+def get_leaderboard_stats():
+    """Get leaderboard engine metrics"""
+    return ranked_leaderboard.stats()
+
+
+# ==================== TIME-WINDOWED LEADERBOARDS ====================
+
+# Windows served from leaderboard_rollups; 'all' is served from user_stats
+WINDOWS = ('day', 'week', 'month')
+
+# How many past buckets of each window the compaction job keeps
+ROLLUP_RETENTION = {'day': 14, 'week': 12, 'month': 12}
+
+# Rows kept per closed window (enough for "last week's winners")
+CLOSED_WINDOW_TOP_N = 100
+
+COMPACTED_COUNTER = 'rollups_compacted_at'
+
+
+def window_start(window, day=None):
+    """First day of the window containing `day`"""
+    day = day or date.today()
+    if window == 'day':
+        return day
+    if window == 'week':
+        return day - timedelta(days=day.weekday())
+    if window == 'month':
+        return day.replace(day=1)
+    raise ValueError(f"Unknown leaderboard window: {window}")
+
+
+def _retention_cutoff(window, day):
+    """Oldest window start still inside the retention period"""
+    keep = ROLLUP_RETENTION[window]
+    if window == 'day':
+        return day - timedelta(days=keep - 1)
+    if window == 'week':
+        return window_start('week', day) - timedelta(weeks=keep - 1)
+    month_index = day.year * 12 + day.month - 1 - (keep - 1)
+    return date(month_index // 12, month_index % 12 + 1, 1)
+
+
+# SQL equivalents of window_start() for rebuilding from attempts
+_WINDOW_START_SQL = {
+    'day': "DATE(attempted_at)",
+    'week': "DATE(attempted_at, 'weekday 0', '-6 days')",
+    'month': "DATE(attempted_at, 'start of month')",
+}
+
+
+def record_xp_rollups(db, user_id, xp_earned, is_correct, day=None):
+    """Add one attempt to the user's day/week/month buckets (caller commits)"""
+    day = day or date.today()
+    correct = 1 if is_correct else 0
+    params = []
+    for window in WINDOWS:
+        params.extend([window, window_start(window, day).isoformat(), user_id, xp_earned, correct])
+    
+    db.execute(
+        '''INSERT INTO leaderboard_rollups (period, period_start, user_id, xp, attempts, correct)
+           VALUES (?, ?, ?, ?, 1, ?), (?, ?, ?, ?, 1, ?), (?, ?, ?, ?, 1, ?)
+           ON CONFLICT(period, period_start, user_id) DO UPDATE SET
+               xp = xp + excluded.xp,
+               attempts = attempts + 1,
+               correct = correct + excluded.correct''',
+        params
+    )
+
+
+def get_window_leaderboard(window='week', limit=20, course_id=None, day=None):
+    """Top students for a time window, optionally limited to a course's students"""
+    db = get_db()
+    
+    if window == 'all':
+        query = '''SELECT u.id, u.username, us.xp, us.level, us.streak
+                   FROM user_stats us
+                   JOIN users u ON u.id = us.user_id'''
+        params = []
+        if course_id:
+            query += ''' JOIN course_enrollments ce
+                           ON ce.user_id = us.user_id AND ce.course_id = ? AND ce.status = 'active' '''
+            params.append(course_id)
+        query += " WHERE u.role = 'student' ORDER BY us.xp DESC, us.level DESC LIMIT ?"
+        params.append(limit)
+    else:
+        query = '''SELECT u.id, u.username, r.xp, r.attempts, r.correct, us.level, us.streak
+                   FROM leaderboard_rollups r
+                   JOIN users u ON u.id = r.user_id
+                   LEFT JOIN user_stats us ON us.user_id = r.user_id'''
+        params = []
+        if course_id:
+            query += ''' JOIN course_enrollments ce
+                           ON ce.user_id = r.user_id AND ce.course_id = ? AND ce.status = 'active' '''
+            params.append(course_id)
+        query += ''' WHERE r.period = ? AND r.period_start = ? AND u.role = 'student'
+                    ORDER BY r.xp DESC, r.correct DESC LIMIT ?'''
+        params.extend([window, window_start(window, day).isoformat(), limit])
+    
+    rows = db.execute(query, params).fetchall()
+    
+    result = []
+    previous_xp = None
+    for index, row in enumerate(rows):
+        entry = dict(row)
+        entry['level'] = entry.get('level') or 1
+        entry['streak'] = entry.get('streak') or 0
+        # Competition ranking: ties on XP share a rank
+        entry['rank'] = result[-1]['rank'] if row['xp'] == previous_xp else index + 1
+        previous_xp = row['xp']
+        result.append(entry)
+    
+    return result
+
+
+def get_window_rank(user_id, window='week', day=None):
+    """A student's rank within a time window, or None if inactive in it"""
+    db = get_db()
+    period_start = window_start(window, day).isoformat()
+    mine = db.execute(
+        'SELECT xp FROM leaderboard_rollups WHERE period = ? AND period_start = ? AND user_id = ?',
+        (window, period_start, user_id)
+    ).fetchone()
+    if not mine:
+        return None
+    
+    ahead = db.execute(
+        '''SELECT COUNT(*) as count FROM leaderboard_rollups r
+           JOIN users u ON u.id = r.user_id
+           WHERE r.period = ? AND r.period_start = ? AND r.xp > ? AND u.role = 'student' ''',
+        (window, period_start, mine['xp'])
+    ).fetchone()['count']
+    return ahead + 1
+
+
+def compact_rollups(day=None):
+    """Roll windows over: trim closed windows and drop expired buckets
+    
+    Closed windows keep only their top CLOSED_WINDOW_TOP_N rows; buckets
+    older than ROLLUP_RETENTION are deleted. Meant to run on a schedule.
+    Returns the number of rows deleted.
+    """
+    day = day or date.today()
+    db = get_db()
+    deleted = 0
+    try:
+        for window in WINDOWS:
+            cursor = db.execute(
+                'DELETE FROM leaderboard_rollups WHERE period = ? AND period_start < ?',
+                (window, _retention_cutoff(window, day).isoformat())
+            )
+            deleted += cursor.rowcount
+            
+            current_start = window_start(window, day).isoformat()
+            cursor = db.execute(
+                '''DELETE FROM leaderboard_rollups
+                   WHERE period = ? AND period_start < ?
+                     AND rowid NOT IN (
+                         SELECT rowid FROM (
+                             SELECT rowid, ROW_NUMBER() OVER (
+                                 PARTITION BY period_start ORDER BY xp DESC, correct DESC
+                             ) as position
+                             FROM leaderboard_rollups
+                             WHERE period = ? AND period_start < ?
+                         ) WHERE position <= ?
+                     )''',
+                (window, current_start, window, current_start, CLOSED_WINDOW_TOP_N)
+            )
+            deleted += cursor.rowcount
+        
+        set_counter(db, COMPACTED_COUNTER, int(day.strftime('%Y%m%d')))
+        db.commit()
+        return deleted
+    except Exception:
+        db.rollback()
+        raise
+
+
+def rebuild_rollups(day=None):
+    """Recompute all retained rollup buckets from the attempts table"""
+    day = day or date.today()
+    db = get_db()
+    try:
+        db.execute('DELETE FROM leaderboard_rollups')
+        for window in WINDOWS:
+            start_sql = _WINDOW_START_SQL[window]
+            db.execute(
+                f'''INSERT INTO leaderboard_rollups (period, period_start, user_id, xp, attempts, correct)
+                    SELECT ?, {start_sql} as bucket, user_id,
+                           SUM(xp_earned), COUNT(*),
+                           SUM(CASE WHEN is_correct = 1 THEN 1 ELSE 0 END)
+                    FROM attempts
+                    WHERE attempted_at >= ?
+                    GROUP BY bucket, user_id''',
+                (window, _retention_cutoff(window, day).isoformat())
+            )
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    
+    return compact_rollups(day)
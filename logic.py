@@ -2,8 +2,18 @@
 Business logic for XP, levels, badges, and stats
 """
 
-from datetime import datetime, date
+import json
+from collections import namedtuple
+from datetime import datetime, date, timedelta
+from types import MappingProxyType
 from database import get_db
+from leaderboard import record_leaderboard_event, record_xp_rollups, get_top
+from badges import evaluate_badges
+from cache import LRUCache, register_cache
+from progress import mark_question_bits
+from analytics import record_attempt_aggregates
+from jobs import enqueue_job, job_handler, wake_job_worker
+from batcher import group_commit
 import math
 
 
@@ -43,101 +53,6 @@ def get_xp_for_next_level(current_level):
     return get_xp_for_level(current_level + 1)
 
 
-def update_streak(user_id):
-    """Update user's daily streak"""
-    db = get_db()
-    today = date.today()
-    
-    user_stats = db.execute(
-        'SELECT streak, last_activity_date FROM user_stats WHERE user_id = ?',
-        (user_id,)
-    ).fetchone()
-    
-    if not user_stats:
-        db.execute(
-            'INSERT INTO user_stats (user_id, streak, last_activity_date) VALUES (?, 1, ?)',
-            (user_id, today)
-        )
-        db.commit()
-        return
-    
-    last_activity = user_stats['last_activity_date']
-    current_streak = user_stats['streak'] or 0
-    
-    if last_activity:
-        if isinstance(last_activity, str):
-            last_activity = datetime.strptime(last_activity, '%Y-%m-%d').date()
-        
-        days_diff = (today - last_activity).days
-        
-        if days_diff == 0:
-            pass
-        elif days_diff == 1:
-            current_streak += 1
-        else:
-            current_streak = 1
-    else:
-        current_streak = 1
-    
-    db.execute(
-        'UPDATE user_stats SET streak = ?, last_activity_date = ? WHERE user_id = ?',
-        (current_streak, today, user_id)
-    )
-    db.commit()
-
-
-def check_badge_unlock(user_id, current_xp, current_level):
-    """Check if user qualifies for any new badges"""
-    db = get_db()
-    unlocked_badges = []
-    
-    user_stats = db.execute(
-        'SELECT streak FROM user_stats WHERE user_id = ?',
-        (user_id,)
-    ).fetchone()
-    
-    current_streak = user_stats['streak'] if user_stats else 0
-    
-    all_badges = db.execute(
-        '''SELECT id, name, badge_type, requirement_value
-           FROM badges
-           WHERE id NOT IN (SELECT badge_id FROM user_badges WHERE user_id = ?)''',
-        (user_id,)
-    ).fetchall()
-    
-    for badge in all_badges:
-        badge_type = badge['badge_type']
-        requirement = badge['requirement_value']
-        
-        unlocked = False
-        
-        if badge_type == 'level' and current_level >= requirement:
-            unlocked = True
-        elif badge_type == 'xp' and current_xp >= requirement:
-            unlocked = True
-        elif badge_type == 'streak' and current_streak >= requirement:
-            unlocked = True
-        elif badge_type == 'first_attempt':
-            attempts = db.execute(
-                'SELECT COUNT(*) as count FROM attempts WHERE user_id = ?',
-                (user_id,)
-            ).fetchone()
-            if attempts and attempts['count'] >= requirement:
-                unlocked = True
-        
-        if unlocked:
-            db.execute(
-                'INSERT INTO user_badges (user_id, badge_id, earned_at) VALUES (?, ?, ?)',
-                (user_id, badge['id'], datetime.now())
-            )
-            unlocked_badges.append(badge['name'])
-    
-    if unlocked_badges:
-        db.commit()
-    
-    return unlocked_badges
-
-
 def get_streak_bonus(streak):
     """Calculate XP bonus based on streak"""
     if streak >= 30:
@@ -165,51 +80,876 @@ def check_question_completion(user_id, question_id):
         return False
 
 
-def record_question_completion(user_id, question_id, is_correct):
-    """Record question completion status"""
-    try:
+def upsert_question_completion(db, user_id, question_id, is_correct):
+    """Count an attempt against the user's completion row and bitmaps (caller commits)"""
+    db.execute(
+        '''INSERT INTO question_completions (user_id, question_id, first_correct_at, total_attempts)
+           VALUES (?, ?, ?, 1)
+           ON CONFLICT(user_id, question_id) DO UPDATE SET
+               total_attempts = total_attempts + 1,
+               first_correct_at = COALESCE(first_correct_at, excluded.first_correct_at)''',
+        (user_id, question_id, datetime.now() if is_correct else None)
+    )
+    mark_question_bits(db, user_id, question_id, is_correct)
+
+
+# ==================== ANSWER ENGINE ====================
+
+def normalize_answer(answer):
+    """Normalize answer for comparison - handles case, whitespace, and None values"""
+    if answer is None:
+        return ''
+    return ''.join(str(answer).split()).upper()
+
+
+def compare_answers(student_answer, correct_answer):
+    """Compare answers after normalization"""
+    student_norm = normalize_answer(student_answer)
+    correct_norm = normalize_answer(correct_answer)
+    
+    if not student_norm or not correct_norm:
+        return False
+    
+    return student_norm == correct_norm
+
+
+def apply_practice_answer(db, user_id, question_id, selected_answer):
+    """Grade a practice answer and write all of its effects (caller owns the transaction)
+    
+    Reads the question, completion and stats rows, then writes the
+    completion, attempt, XP/level/streak, badge unlocks and queued rollups.
+    Returns None if the question does not exist.
+    """
+    today = date.today()
+    now = datetime.now()
+    
+    question = db.execute(
+        'SELECT * FROM questions WHERE id = ?', (question_id,)
+    ).fetchone()
+    
+    if not question:
+        return None
+    
+    is_correct = compare_answers(selected_answer, question['correct_answer'])
+    
+    # XP farming prevention: only the first correct answer earns full XP
+    completion = db.execute(
+        'SELECT first_correct_at FROM question_completions WHERE user_id = ? AND question_id = ?',
+        (user_id, question_id)
+    ).fetchone()
+    already_completed = completion is not None and completion['first_correct_at'] is not None
+    first_try_at_question = completion is None
+    
+    if not is_correct:
+        should_award, award_reason = True, 'participation'
+    elif already_completed:
+        should_award, award_reason = False, 'already_completed'
+    else:
+        should_award, award_reason = True, 'first_correct'
+    
+    xp_earned = calculate_xp(is_correct, question['difficulty'], question['points']) if should_award else 0
+    
+    upsert_question_completion(db, user_id, question_id, is_correct)
+    
+    is_final_attempt = 1 if (is_correct and should_award) else 0
+    attempt_id = db.execute(
+        '''INSERT INTO attempts (user_id, question_id, selected_answer, is_correct, xp_earned, attempted_at, is_final_attempt)
+           VALUES (?, ?, ?, ?, ?, ?, ?)''',
+        (user_id, question_id, selected_answer, is_correct, xp_earned, now, is_final_attempt)
+    ).lastrowid
+    
+    stats = db.execute(
+        '''SELECT xp, streak, last_activity_date, total_attempts, correct_attempts,
+                  questions_attempted, badge_watermarks
+           FROM user_stats WHERE user_id = ?''',
+        (user_id,)
+    ).fetchone()
+    
+    current_xp = stats['xp'] or 0 if stats else 0
+    last_activity = parse_activity_day(stats['last_activity_date']) if stats else None
+    if last_activity == today:
+        new_streak = stats['streak'] or 1
+    else:
+        # First answer of the day: count back through the daily activity rollup
+        new_streak = calculate_activity_streak(db, user_id, today, last_activity)
+    
+    new_xp = current_xp + xp_earned
+    new_level = check_level_up(new_xp)
+    
+    # Only badge thresholds this answer could have crossed are checked
+    metrics = {
+        'xp': new_xp,
+        'level': new_level,
+        'streak': new_streak,
+        'total_attempts': (stats['total_attempts'] or 0 if stats else 0) + 1,
+        'correct_attempts': (stats['correct_attempts'] or 0 if stats else 0) + (1 if is_correct else 0),
+        'questions_attempted': (stats['questions_attempted'] or 0 if stats else 0) + (1 if first_try_at_question else 0),
+    }
+    badge_unlocked, badge_watermarks = evaluate_badges(
+        db, user_id, metrics, stats['badge_watermarks'] if stats else None
+    )
+    
+    db.execute(
+        '''INSERT INTO user_stats (user_id, xp, level, streak, last_activity_date,
+                                 total_attempts, correct_attempts, questions_attempted,
+                                 badge_watermarks, dashboard_version)
+           VALUES (?, ?, ?, ?, ?, 1, ?, ?, ?, 1)
+           ON CONFLICT(user_id) DO UPDATE SET
+               xp = excluded.xp,
+               level = excluded.level,
+               streak = excluded.streak,
+               last_activity_date = excluded.last_activity_date,
+               total_attempts = COALESCE(total_attempts, 0) + 1,
+               correct_attempts = COALESCE(correct_attempts, 0) + excluded.correct_attempts,
+               questions_attempted = COALESCE(questions_attempted, 0) + excluded.questions_attempted,
+               badge_watermarks = excluded.badge_watermarks,
+               dashboard_version = COALESCE(dashboard_version, 0) + 1''',
+        (user_id, new_xp, new_level, new_streak, today,
+         1 if is_correct else 0, 1 if first_try_at_question else 0, badge_watermarks)
+    )
+    
+    record_leaderboard_event(db, user_id)
+    
+    # Rollups are applied by the job worker; the job commits with the attempt
+    enqueue_job(db, 'attempt_rollups', {
+        'attempt_id': attempt_id,
+        'user_id': user_id,
+        'question_id': question_id,
+        'xp_earned': xp_earned,
+        'is_correct': bool(is_correct),
+        'day': today.isoformat()
+    }, key=f'attempt_rollups:{attempt_id}')
+    
+    return {
+        'question': question,
+        'is_correct': is_correct,
+        'xp_earned': xp_earned,
+        'new_xp': new_xp,
+        'new_level': new_level,
+        'streak': new_streak,
+        'badge_unlocked': badge_unlocked,
+        'xp_awarded': should_award,
+        'award_reason': award_reason
+    }
+
+
+def submit_practice_answer(user_id, question_id, selected_answer):
+    """Grade a practice answer and commit all of its effects in one transaction
+    
+    With group commit enabled (see batcher.py) the write shares a
+    transaction with other concurrent submissions; either way this returns
+    only after the attempt is committed. Returns None if the question does
+    not exist.
+    """
+    if group_commit.enabled:
+        result = group_commit.submit(
+            lambda db: apply_practice_answer(db, user_id, question_id, selected_answer)
+        )
+    else:
         db = get_db()
+        # Take the write lock up front so the reads cannot go stale
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            result = apply_practice_answer(db, user_id, question_id, selected_answer)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+    
+    if result is not None:
+        wake_job_worker()
+        invalidate_dashboard(user_id)
+    
+    return result
+
+
+# ==================== ANSWER KEYS ====================
+
+# Compiled answer keys kept per worker; a key never changes once compiled
+ANSWER_KEY_CACHE_SIZE = 256
+
+AnswerKeyEntry = namedtuple('AnswerKeyEntry', 'correct_answer normalized points order explanation')
+
+
+class AnswerKey:
+    """Grading data for one version of a test: question_id -> correct answer, points, order"""
+    
+    def __init__(self, test_id, version, entries):
+        self.test_id = test_id
+        self.version = version
+        self.entries = MappingProxyType(dict(entries))
+        self.question_ids = tuple(sorted(self.entries, key=lambda qid: (self.entries[qid].order, qid)))
+        self.max_score = sum(entry.points for entry in self.entries.values())
+    
+    def __contains__(self, question_id):
+        return question_id in self.entries
+    
+    def __len__(self):
+        return len(self.entries)
+    
+    def get(self, question_id):
+        """Entry for a question, or None if it is not in this version of the test"""
+        return self.entries.get(question_id)
+    
+    def grade(self, question_id, answer):
+        """(is_correct, points_earned) for an answer to a question in the key"""
+        entry = self.entries[question_id]
+        selected = normalize_answer(answer)
+        is_correct = bool(selected) and bool(entry.normalized) and selected == entry.normalized
+        return is_correct, entry.points if is_correct else 0
+    
+    def to_json(self):
+        """Serialized form stored in test_answer_keys"""
+        return json.dumps({str(question_id): list(entry) for question_id, entry in self.entries.items()})
+    
+    @classmethod
+    def from_json(cls, test_id, version, data):
+        """Rebuild a key from its stored form"""
+        return cls(test_id, version, {
+            int(question_id): AnswerKeyEntry(*values) for question_id, values in json.loads(data).items()
+        })
+
+
+_answer_key_cache = register_cache(LRUCache('answer_keys', max_entries=ANSWER_KEY_CACHE_SIZE))
+
+
+def compile_answer_key(db, test_id):
+    """Build the answer key for a test's current version from the live tables
+    
+    Version and questions are read in one statement, so the key always
+    matches the version it is labelled with. Returns None if the test
+    does not exist.
+    """
+    rows = db.execute(
+        '''SELECT t.answer_key_version, tq.question_id, tq.points, tq.order_index,
+                  q.correct_answer, q.explanation
+           FROM tests t
+           LEFT JOIN test_questions tq ON tq.test_id = t.id
+           LEFT JOIN questions q ON q.id = tq.question_id
+           WHERE t.id = ?''',
+        (test_id,)
+    ).fetchall()
+    if not rows:
+        return None
+    
+    entries = {
+        row['question_id']: AnswerKeyEntry(
+            row['correct_answer'],
+            normalize_answer(row['correct_answer']),
+            row['points'] if row['points'] is not None else 1,
+            row['order_index'] or 0,
+            row['explanation'] or ''
+        )
+        for row in rows if row['correct_answer'] is not None
+    }
+    return AnswerKey(test_id, rows[0]['answer_key_version'] or 0, entries)
+
+
+def get_answer_key(db, test_id, version=None):
+    """Answer key for a version of a test (the current version if None)
+    
+    Served from the in-process cache, then the stored snapshot; only a
+    version that was never stored is compiled from the live tables.
+    Returns None if the test does not exist.
+    """
+    if version is None:
+        row = db.execute('SELECT answer_key_version FROM tests WHERE id = ?', (test_id,)).fetchone()
+        if not row:
+            return None
+        version = row['answer_key_version'] or 0
+    
+    answer_key = _answer_key_cache.get((test_id, version))
+    if answer_key is not None:
+        return answer_key
+    
+    stored = db.execute(
+        'SELECT answer_key FROM test_answer_keys WHERE test_id = ? AND version = ?',
+        (test_id, version)
+    ).fetchone()
+    if stored:
+        answer_key = AnswerKey.from_json(test_id, version, stored['answer_key'])
+    else:
+        answer_key = compile_answer_key(db, test_id)
+        if answer_key is None:
+            return None
+    
+    _answer_key_cache.set((test_id, answer_key.version), answer_key)
+    return answer_key
+
+
+def get_attempt_answer_key(db, attempt):
+    """Answer key an attempt is graded against (attempts from before pinning use the current one)"""
+    return get_answer_key(db, attempt['test_id'], attempt['answer_key_version'])
+
+
+def pin_answer_key(db, test_id):
+    """Snapshot the test's current answer key for a new attempt (caller commits)
+    
+    Returns the version to store on the attempt, or None if the test does
+    not exist.
+    """
+    answer_key = get_answer_key(db, test_id)
+    if answer_key is None:
+        return None
+    db.execute(
+        '''INSERT OR IGNORE INTO test_answer_keys (test_id, version, answer_key, compiled_at)
+           VALUES (?, ?, ?, ?)''',
+        (test_id, answer_key.version, answer_key.to_json(), datetime.now())
+    )
+    return answer_key.version
+
+
+def bump_answer_key_version(db, test_id=None, question_id=None):
+    """Move a test, or every test using a question, to a new answer key version (caller commits)
+    
+    Attempts already in progress keep grading against their pinned version.
+    """
+    if test_id is not None:
+        db.execute(
+            'UPDATE tests SET answer_key_version = answer_key_version + 1 WHERE id = ?',
+            (test_id,)
+        )
+    if question_id is not None:
+        db.execute(
+            '''UPDATE tests SET answer_key_version = answer_key_version + 1
+               WHERE id IN (SELECT test_id FROM test_questions WHERE question_id = ?)''',
+            (question_id,)
+        )
+
+
+def get_answer_key_questions(db, answer_key):
+    """Questions of an answer key in test order, with points, order and correct answer from the key"""
+    if not len(answer_key):
+        return []
+    placeholders = ','.join(['?'] * len(answer_key))
+    rows = {
+        row['id']: row for row in db.execute(
+            f'''SELECT id, title, question_text, option_a, option_b, option_c, option_d, difficulty
+                FROM questions WHERE id IN ({placeholders})''',
+            list(answer_key.question_ids)
+        ).fetchall()
+    }
+    
+    questions = []
+    for question_id in answer_key.question_ids:
+        row = rows.get(question_id)
+        if row is None:
+            continue
+        entry = answer_key.get(question_id)
+        question = dict(row)
+        question.update({
+            'question_id': question_id,
+            'points': entry.points,
+            'order_index': entry.order,
+            'correct_answer': entry.correct_answer,
+            'explanation': entry.explanation
+        })
+        questions.append(question)
+    return questions
+
+
+# ==================== TEST ANSWERS ====================
+
+# Most answers accepted in one autosave request
+MAX_TEST_ANSWER_BATCH = 200
+
+
+def save_test_answers(db, answer_key, attempt_id, entries):
+    """Grade and upsert a batch of test answers for one attempt (caller commits)
+    
+    `entries` are dicts with question_id, answer and an optional client_ts
+    (browser milliseconds). Per question the newest entry wins; an entry
+    without client_ts (the finish form) always wins. Entries older than
+    the stored answer are skipped as stale, and questions that are not in
+    the attempt's answer key are rejected.
+    
+    Returns (saved, stale_ids, rejected_ids) where saved is a list of
+    per-question result dicts.
+    """
+    latest = {}
+    for entry in entries:
+        question_id = entry['question_id']
+        client_ts = entry.get('client_ts')
+        current = latest.get(question_id)
+        if current is None or current.get('client_ts') is not None and (
+                client_ts is None or client_ts >= current['client_ts']):
+            latest[question_id] = entry
+    
+    rejected = [question_id for question_id in latest if question_id not in answer_key]
+    question_ids = [question_id for question_id in latest if question_id in answer_key]
+    if not question_ids:
+        return [], [], rejected
+    
+    placeholders = ','.join(['?'] * len(question_ids))
+    existing = {
+        row['question_id']: row for row in db.execute(
+            f'''SELECT id, question_id, client_ts
+                FROM test_attempt_answers
+                WHERE test_attempt_id = ? AND question_id IN ({placeholders})''',
+            [attempt_id] + question_ids
+        ).fetchall()
+    }
+    
+    now = datetime.now()
+    saved, stale = [], []
+    updates, inserts = [], []
+    for question_id in question_ids:
+        entry = latest[question_id]
+        client_ts = entry.get('client_ts')
+        row = existing.get(question_id)
+        if row is not None and client_ts is not None and row['client_ts'] is not None \
+                and client_ts < row['client_ts']:
+            stale.append(question_id)
+            continue
         
-        completion = db.execute(
-            'SELECT * FROM question_completions WHERE user_id = ? AND question_id = ?',
-            (user_id, question_id)
-        ).fetchone()
+        key = answer_key.get(question_id)
+        is_correct, points_earned = answer_key.grade(question_id, entry['answer'])
+        selected = normalize_answer(entry['answer'])
         
-        if completion:
-            db.execute(
-                'UPDATE question_completions SET total_attempts = total_attempts + 1 WHERE user_id = ? AND question_id = ?',
-                (user_id, question_id)
-            )
-            if is_correct and not completion['first_correct_at']:
-                db.execute(
-                    'UPDATE question_completions SET first_correct_at = ? WHERE user_id = ? AND question_id = ?',
-                    (datetime.now(), user_id, question_id)
-                )
+        if row is not None:
+            updates.append((selected, 1 if is_correct else 0, points_earned, now, client_ts, row['id']))
         else:
-            db.execute(
-                '''INSERT INTO question_completions (user_id, question_id, first_correct_at, total_attempts)
-                   VALUES (?, ?, ?, 1)''',
-                (user_id, question_id, datetime.now() if is_correct else None, 1)
-            )
+            inserts.append((attempt_id, question_id, selected, 1 if is_correct else 0, points_earned, now, client_ts))
         
+        saved.append({
+            'question_id': question_id,
+            'is_correct': 1 if is_correct else 0,
+            'correct_answer': key.correct_answer,
+            'selected_answer': selected,
+            'explanation': key.explanation,
+            'points_earned': points_earned,
+            'total_points': key.points
+        })
+    
+    if updates:
+        db.executemany(
+            '''UPDATE test_attempt_answers
+               SET selected_answer = ?, is_correct = ?, points_earned = ?, answered_at = ?, client_ts = ?
+               WHERE id = ?''',
+            updates
+        )
+    if inserts:
+        db.executemany(
+            '''INSERT INTO test_attempt_answers (test_attempt_id, question_id, selected_answer, is_correct,
+                                                points_earned, answered_at, client_ts)
+               VALUES (?, ?, ?, ?, ?, ?, ?)''',
+            inserts
+        )
+    
+    return saved, stale, rejected
+
+
+def grade_attempt_answers(answer_key, answers):
+    """Grade an attempt's answer rows against its key
+    
+    Returns (fixes, result): `fixes` are (is_correct, points_earned, id)
+    for rows whose stored grade disagrees, and `result` has score (whole
+    percent), percentage, total_questions and correct_answers. Answers to
+    questions that are not in the key do not count.
+    """
+    fixes = []
+    correct_answers = 0
+    total_score = 0
+    for answer in answers:
+        if answer['question_id'] not in answer_key:
+            continue
+        is_correct, points_earned = answer_key.grade(answer['question_id'], answer['selected_answer'])
+        if (answer['is_correct'] == 1) != is_correct or (answer['points_earned'] or 0) != points_earned:
+            fixes.append((1 if is_correct else 0, points_earned, answer['id']))
+        if is_correct:
+            correct_answers += 1
+            total_score += points_earned
+    
+    # Tests whose questions carry no points are scored one point per question
+    max_score = answer_key.max_score or len(answer_key)
+    percentage = (total_score / max_score * 100) if max_score > 0 else 0
+    
+    return fixes, {
+        'score': int(percentage),
+        'percentage': percentage,
+        'total_questions': len(answer_key),
+        'correct_answers': correct_answers
+    }
+
+
+def write_answer_grades(db, fixes):
+    """Store corrected grades, (is_correct, points_earned, answer id) tuples, in one statement (caller commits)"""
+    if not fixes:
+        return
+    db.execute(
+        '''UPDATE test_attempt_answers
+           SET is_correct = json_extract(fix.value, '$[0]'),
+               points_earned = json_extract(fix.value, '$[1]')
+           FROM json_each(?) AS fix
+           WHERE test_attempt_answers.id = json_extract(fix.value, '$[2]')''',
+        (json.dumps(fixes),)
+    )
+
+
+def score_test_attempt(db, answer_key, attempt_id):
+    """Re-grade and score an attempt against its answer key (caller commits)
+    
+    Reads the attempt's answers once and writes back only rows whose stored
+    grade disagrees, in a single statement, so the query count does not grow
+    with the number of questions. Returns the result dict from
+    grade_attempt_answers.
+    """
+    answers = db.execute(
+        '''SELECT id, question_id, selected_answer, is_correct, points_earned
+           FROM test_attempt_answers WHERE test_attempt_id = ?''',
+        (attempt_id,)
+    ).fetchall()
+    
+    fixes, result = grade_attempt_answers(answer_key, answers)
+    write_answer_grades(db, fixes)
+    return result
+
+
+def finish_test_attempt(db, attempt, final_answers=None):
+    """Save the final answers, score the attempt and mark it completed in one transaction
+    
+    Final answers sent after the deadline (plus grace) are ignored; the
+    answers saved in time are graded. Returns the score dict from
+    score_test_attempt, or None if the attempt was no longer in progress
+    (already finished elsewhere).
+    """
+    answer_key = get_attempt_answer_key(db, attempt)
+    if answer_key is None:
+        raise LookupError(f"Test {attempt['test_id']} no longer exists")
+    if is_attempt_expired(attempt):
+        final_answers = None
+    
+    db.execute('BEGIN IMMEDIATE')
+    try:
+        if final_answers:
+            save_test_answers(db, answer_key, attempt['id'], final_answers)
+        result = score_test_attempt(db, answer_key, attempt['id'])
+        cursor = db.execute(
+            '''UPDATE test_attempts SET submitted_at = ?, status = 'completed',
+               score = ?, total_questions = ?, correct_answers = ?
+               WHERE id = ? AND status = 'in_progress' ''',
+            (datetime.now(), result['score'], result['total_questions'],
+             result['correct_answers'], attempt['id'])
+        )
+        if cursor.rowcount == 0:
+            db.rollback()
+            return None
         db.commit()
-    except Exception as e:
-        print(f"Error in record_question_completion: {str(e)}")
+    except Exception:
+        db.rollback()
+        raise
+    
+    return result
+
+
+# ==================== TEST DEADLINES ====================
+
+# Answers arriving this long after the deadline still count (slow networks, final submit)
+TEST_DEADLINE_GRACE_SECONDS = 30
+
+# Expired attempts are swept in time slots of this length, one queued sweep per slot
+TEST_SWEEP_SLOT_SECONDS = 60
+
+# Expired attempts finalized per sweep batch
+TEST_SWEEP_BATCH_SIZE = 200
+
+
+def attempt_deadline(started_at, time_limit_minutes):
+    """Deadline for an attempt, or None if the test has no time limit"""
+    if not time_limit_minutes or time_limit_minutes <= 0:
+        return None
+    return started_at + timedelta(minutes=time_limit_minutes)
+
+
+def _parse_timestamp(value):
+    """datetime from a stored TIMESTAMP value"""
+    if value is None or isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(value)
+
+
+def seconds_remaining(attempt, now=None):
+    """Seconds until the attempt's deadline (never negative), or None without a time limit"""
+    deadline = _parse_timestamp(attempt['deadline'])
+    if deadline is None:
+        return None
+    return max(0, int((deadline - (now or datetime.now())).total_seconds()))
+
+
+def is_attempt_expired(attempt, now=None):
+    """Whether the attempt is past its deadline plus the grace period"""
+    deadline = _parse_timestamp(attempt['deadline'])
+    if deadline is None:
+        return False
+    return (now or datetime.now()) > deadline + timedelta(seconds=TEST_DEADLINE_GRACE_SECONDS)
+
+
+def schedule_test_sweep(db, deadline=None):
+    """Queue a sweep for the slot after `deadline` (now if None) plus grace (caller commits)
+    
+    Attempts expiring within the same slot share one queued sweep.
+    """
+    due = (deadline or datetime.now()) + timedelta(seconds=TEST_DEADLINE_GRACE_SECONDS)
+    slot = math.ceil(due.timestamp() / TEST_SWEEP_SLOT_SECONDS) * TEST_SWEEP_SLOT_SECONDS
+    enqueue_job(
+        db, 'sweep_expired_tests', {},
+        key=f'sweep_expired_tests:{slot}',
+        delay=slot - datetime.now().timestamp()
+    )
+
+
+def finalize_expired_attempts(db, now=None, limit=TEST_SWEEP_BATCH_SIZE):
+    """Score and complete up to `limit` in-progress attempts past their deadline (caller commits)
+    
+    One query loads the batch's answers. Each attempt is graded by
+    grade_attempt_answers, as in finish_test_attempt, and the batch's
+    corrections are written by write_answer_grades in one statement.
+    Attempts are marked submitted at their deadline. Returns the number of
+    attempts finalized.
+    """
+    cutoff = (now or datetime.now()) - timedelta(seconds=TEST_DEADLINE_GRACE_SECONDS)
+    attempts = db.execute(
+        '''SELECT id, test_id, answer_key_version, deadline
+           FROM test_attempts
+           WHERE status = 'in_progress' AND deadline <= ?
+           ORDER BY deadline
+           LIMIT ?''',
+        (cutoff, limit)
+    ).fetchall()
+    if not attempts:
+        return 0
+    
+    placeholders = ','.join(['?'] * len(attempts))
+    answers_by_attempt = {}
+    for row in db.execute(
+        f'''SELECT id, test_attempt_id, question_id, selected_answer, is_correct, points_earned
+            FROM test_attempt_answers
+            WHERE test_attempt_id IN ({placeholders})''',
+        [attempt['id'] for attempt in attempts]
+    ):
+        answers_by_attempt.setdefault(row['test_attempt_id'], []).append(row)
+    
+    fixes, updates = [], []
+    for attempt in attempts:
+        # A deleted test leaves nothing to grade against: score it as empty
+        answer_key = get_attempt_answer_key(db, attempt) or AnswerKey(attempt['test_id'], None, {})
+        attempt_fixes, result = grade_attempt_answers(answer_key, answers_by_attempt.get(attempt['id'], ()))
+        fixes.extend(attempt_fixes)
+        updates.append((attempt['deadline'], result['score'], result['total_questions'],
+                        result['correct_answers'], attempt['id']))
+    
+    write_answer_grades(db, fixes)
+    db.executemany(
+        '''UPDATE test_attempts SET submitted_at = ?, status = 'completed',
+           score = ?, total_questions = ?, correct_answers = ?
+           WHERE id = ? AND status = 'in_progress' ''',
+        updates
+    )
+    return len(attempts)
+
+
+@job_handler('sweep_expired_tests')
+def sweep_expired_tests(db, payload):
+    """Job: finalize every attempt that has run out of time"""
+    while finalize_expired_attempts(db) == TEST_SWEEP_BATCH_SIZE:
+        pass
+
+
+def sweep_expired_attempts(batch_size=TEST_SWEEP_BATCH_SIZE):
+    """Finalize every expired attempt, one transaction per batch; returns the number finalized"""
+    db = get_db()
+    total = 0
+    while True:
         try:
+            finalized = finalize_expired_attempts(db, limit=batch_size)
+            db.commit()
+        except Exception:
             db.rollback()
-        except:
-            pass
+            raise
+        total += finalized
+        if finalized < batch_size:
+            return total
 
 
-def should_award_xp(user_id, question_id, is_correct):
-    """Determine if XP should be awarded for this attempt"""
-    if not is_correct:
-        return True, "participation"
+# ==================== DAILY ACTIVITY ====================
+
+def record_daily_activity(db, user_id, xp_earned, is_correct, day=None):
+    """Add one attempt to the user's daily activity rollup (caller commits)"""
+    day = day or date.today()
+    db.execute(
+        '''INSERT INTO user_daily_activity (user_id, day, xp, attempts, correct)
+           VALUES (?, ?, ?, 1, ?)
+           ON CONFLICT(user_id, day) DO UPDATE SET
+               xp = xp + excluded.xp,
+               attempts = attempts + 1,
+               correct = correct + excluded.correct''',
+        (user_id, day.isoformat(), xp_earned, 1 if is_correct else 0)
+    )
+
+
+def get_daily_activity(user_id, days=30, today=None):
+    """Daily xp/attempts/correct rows for the last `days` days (active days only)"""
+    today = today or date.today()
+    db = get_db()
+    return db.execute(
+        '''SELECT day, xp, attempts, correct
+           FROM user_daily_activity
+           WHERE user_id = ? AND day > ?
+           ORDER BY day''',
+        (user_id, (today - timedelta(days=days)).isoformat())
+    ).fetchall()
+
+
+def parse_activity_day(value):
+    """date from a stored DATE value (None stays None)"""
+    if value is None or isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
+
+
+def calculate_activity_streak(db, user_id, today=None, last_active_day=None):
+    """Streak of consecutive active days ending today, counting today as active
+    
+    Walks the user's rollup rows newest-first and stops at the first gap,
+    so the cost is proportional to the streak length. The rollup is written
+    by the job worker, so `last_active_day` (user_stats.last_activity_date)
+    counts as active even if its rollup row has not been written yet.
+    """
+    today = today or date.today()
+    days = (row['day'] for row in db.execute(
+        '''SELECT day FROM user_daily_activity
+           WHERE user_id = ? AND day < ?
+           ORDER BY day DESC''',
+        (user_id, today.isoformat())
+    ))
     
-    if check_question_completion(user_id, question_id):
-        return False, "already_completed"
+    streak = 1
+    expected = today - timedelta(days=1)
+    day = next(days, None)
+    while True:
+        if day == expected.isoformat():
+            day = next(days, None)
+        elif last_active_day != expected:
+            break
+        streak += 1
+        expected -= timedelta(days=1)
+    
+    return streak
+
+
+def rebuild_daily_activity(user_id=None):
+    """Recompute user_daily_activity from the attempts table"""
+    db = get_db()
+    user_filter = ' WHERE user_id = ?' if user_id else ''
+    params = (user_id,) if user_id else ()
+    try:
+        db.execute('DELETE FROM user_daily_activity' + user_filter, params)
+        cursor = db.execute(
+            f'''INSERT INTO user_daily_activity (user_id, day, xp, attempts, correct)
+                SELECT user_id, DATE(attempted_at), COALESCE(SUM(xp_earned), 0), COUNT(*),
+                       SUM(CASE WHEN is_correct = 1 THEN 1 ELSE 0 END)
+                FROM attempts{user_filter}
+                GROUP BY user_id, DATE(attempted_at)''',
+            params
+        )
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
     
-    return True, "first_correct"
+    return cursor.rowcount
+
+
+@job_handler('attempt_rollups')
+def apply_attempt_rollups(db, payload):
+    """Job: add an attempt to the leaderboard, daily activity and analytics rollups"""
+    user_id = payload['user_id']
+    day = date.fromisoformat(payload['day'])
+    record_xp_rollups(db, user_id, payload['xp_earned'], payload['is_correct'], day)
+    record_daily_activity(db, user_id, payload['xp_earned'], payload['is_correct'], day)
+    record_attempt_aggregates(db, payload.get('attempt_id'), payload.get('question_id'),
+                              payload['is_correct'], payload['xp_earned'])
+    # The dashboard chart reads the rollup, so cached dashboards must rebuild
+    db.execute(
+        'UPDATE user_stats SET dashboard_version = COALESCE(dashboard_version, 0) + 1 WHERE user_id = ?',
+        (user_id,)
+    )
+
+
+# ==================== DASHBOARD ====================
+
+# Upper bound on staleness for changes that don't bump dashboard_version
+DASHBOARD_CACHE_TTL = 300
+
+_dashboard_cache = register_cache(LRUCache('dashboard', max_entries=5000, ttl=DASHBOARD_CACHE_TTL))
+
+
+def build_dashboard(user_id):
+    """Run the dashboard queries and return a plain-dict view-model"""
+    db = get_db()
+    
+    recent_attempts = db.execute(
+        '''SELECT q.title, a.is_correct, a.attempted_at, q.difficulty, q.topic
+           FROM attempts a
+           JOIN questions q ON a.question_id = q.id
+           WHERE a.user_id = ?
+           ORDER BY a.attempted_at DESC
+           LIMIT 10''',
+        (user_id,)
+    ).fetchall()
+    
+    topic_stats = db.execute(
+        '''SELECT q.topic, 
+                  COUNT(*) as total,
+                  SUM(CASE WHEN a.is_correct = 1 THEN 1 ELSE 0 END) as correct
+           FROM attempts a
+           JOIN questions q ON a.question_id = q.id
+           WHERE a.user_id = ?
+           GROUP BY q.topic''',
+        (user_id,)
+    ).fetchall()
+    
+    badges = db.execute(
+        '''SELECT b.name, b.description, ub.earned_at
+           FROM user_badges ub
+           JOIN badges b ON ub.badge_id = b.id
+           WHERE ub.user_id = ?
+           ORDER BY ub.earned_at DESC''',
+        (user_id,)
+    ).fetchall()
+    
+    # XP history for charts (last 30 days)
+    xp_history = get_daily_activity(user_id, days=30)
+    
+    return {
+        'recent_attempts': [dict(row) for row in recent_attempts],
+        'topic_stats': [{'topic': row['topic'], 'total': row['total'], 'correct': row['correct']} for row in topic_stats],
+        'badges': [dict(row) for row in badges],
+        'xp_history': [{'date': row['day'], 'daily_xp': int(row['xp'])} for row in xp_history]
+    }
+
+
+def get_dashboard(user_id):
+    """Dashboard view-model, served from cache while dashboard_version is unchanged
+    
+    Stats come from the single user_stats row read on every request; the
+    heavier attempt/badge aggregates are rebuilt only after the version
+    moves (an answer or badge unlock, from any worker) or the TTL expires.
+    """
+    stats = get_user_stats(user_id)
+    key = (user_id, date.today().isoformat())
+    
+    view = _dashboard_cache.get(key, version=stats['dashboard_version'])
+    if view is None:
+        view = build_dashboard(user_id)
+        _dashboard_cache.set(key, view, version=stats['dashboard_version'])
+    
+    return dict(view, stats=stats)
+
+
+def invalidate_dashboard(user_id):
+    """Drop this worker's cached dashboard for a user"""
+    _dashboard_cache.invalidate((user_id, date.today().isoformat()))
 
 
 # ==================== CONTENT GENERATION ====================
@@ -268,7 +1008,9 @@ def get_user_stats(user_id):
     db = get_db()
     
     stats = db.execute(
-        '''SELECT xp, level, streak, last_activity_date
+        '''SELECT xp, level, streak, last_activity_date,
+                  total_attempts, correct_attempts, questions_attempted,
+                  dashboard_version
            FROM user_stats WHERE user_id = ?''',
         (user_id,)
     ).fetchone()
@@ -286,20 +1028,13 @@ def get_user_stats(user_id):
             'xp_for_next_level': xp_for_next,
             'xp_needed': xp_for_next,
             'xp_progress': 0,
-            'xp_range': xp_for_next - get_xp_for_level(1)
+            'xp_range': xp_for_next - get_xp_for_level(1),
+            'dashboard_version': 0
         }
     
-    attempts_stats = db.execute(
-        '''SELECT COUNT(*) as total_attempts,
-                  SUM(CASE WHEN is_correct = 1 THEN 1 ELSE 0 END) as correct_attempts,
-                  COUNT(DISTINCT question_id) as questions_attempted
-           FROM attempts WHERE user_id = ?''',
-        (user_id,)
-    ).fetchone()
-    
-    total_attempts = attempts_stats['total_attempts'] or 0
-    correct_attempts = attempts_stats['correct_attempts'] or 0
-    questions_attempted = attempts_stats['questions_attempted'] or 0
+    total_attempts = stats['total_attempts'] or 0
+    correct_attempts = stats['correct_attempts'] or 0
+    questions_attempted = stats['questions_attempted'] or 0
     
     accuracy = (correct_attempts / total_attempts * 100) if total_attempts > 0 else 0
     
@@ -319,7 +1054,8 @@ def get_user_stats(user_id):
         'xp_for_next_level': xp_for_next,
         'xp_needed': max(0, xp_needed),
         'xp_progress': current_xp - get_xp_for_level(current_level),
-        'xp_range': xp_for_next - get_xp_for_level(current_level)
+        'xp_range': xp_for_next - get_xp_for_level(current_level),
+        'dashboard_version': stats['dashboard_version'] or 0
     }
 
 
@@ -327,33 +1063,80 @@ def get_accuracy_percentage(user_id):
     """Get user's overall accuracy percentage"""
     db = get_db()
     result = db.execute(
-        '''SELECT 
-            COUNT(*) as total,
-            SUM(CASE WHEN is_correct = 1 THEN 1 ELSE 0 END) as correct
-           FROM attempts WHERE user_id = ?''',
+        'SELECT total_attempts, correct_attempts FROM user_stats WHERE user_id = ?',
         (user_id,)
     ).fetchone()
     
-    if result and result['total'] and result['total'] > 0:
-        return round((result['correct'] / result['total']) * 100, 2)
+    if result and result['total_attempts'] and result['total_attempts'] > 0:
+        return round(((result['correct_attempts'] or 0) / result['total_attempts']) * 100, 2)
     return 0
 
 
-def get_leaderboard(limit=20):
-    """Get leaderboard sorted by XP"""
-    db = get_db()
+def reconcile_user_counters(user_id=None):
+    """Rebuild the denormalized attempt counters from the attempts table
     
-    leaderboard = db.execute(
-        '''SELECT u.id, u.username, us.xp, us.level, us.streak
-           FROM users u
-           JOIN user_stats us ON u.id = us.user_id
-           WHERE u.role = 'student'
-           ORDER BY us.xp DESC, us.level DESC
-           LIMIT ?''',
-        (limit,)
-    ).fetchall()
+    Also backfills question_completions so the incremental
+    questions_attempted counter stays correct afterwards.
+    Returns the number of users whose counters were corrected.
+    """
+    db = get_db()
+    user_filter = 'WHERE user_id = ?' if user_id else 'WHERE 1'
+    params = (user_id,) if user_id else ()
     
-    return leaderboard
+    try:
+        db.execute(
+            f'''INSERT INTO question_completions (user_id, question_id, first_correct_at, total_attempts)
+                SELECT user_id, question_id,
+                       MIN(CASE WHEN is_correct = 1 THEN attempted_at END),
+                       COUNT(*)
+                FROM attempts {user_filter}
+                GROUP BY user_id, question_id
+                ON CONFLICT(user_id, question_id) DO UPDATE SET
+                    total_attempts = excluded.total_attempts,
+                    first_correct_at = COALESCE(first_correct_at, excluded.first_correct_at)''',
+            params
+        )
+        
+        db.execute('DROP TABLE IF EXISTS temp.attempt_counts')
+        db.execute(
+            f'''CREATE TEMP TABLE attempt_counts AS
+                SELECT user_id,
+                       COUNT(*) as total,
+                       SUM(CASE WHEN is_correct = 1 THEN 1 ELSE 0 END) as correct,
+                       COUNT(DISTINCT question_id) as distinct_questions
+                FROM attempts {user_filter}
+                GROUP BY user_id''',
+            params
+        )
+        
+        cursor = db.execute(
+            f'''UPDATE user_stats SET
+                   total_attempts = COALESCE(c.total, 0),
+                   correct_attempts = COALESCE(c.correct, 0),
+                   questions_attempted = COALESCE(c.distinct_questions, 0)
+                FROM (SELECT us.user_id, ac.total, ac.correct, ac.distinct_questions
+                      FROM user_stats us
+                      LEFT JOIN attempt_counts ac ON ac.user_id = us.user_id) c
+                WHERE c.user_id = user_stats.user_id
+                  {'AND user_stats.user_id = ?' if user_id else ''}
+                  AND (user_stats.total_attempts IS NOT COALESCE(c.total, 0)
+                       OR user_stats.correct_attempts IS NOT COALESCE(c.correct, 0)
+                       OR user_stats.questions_attempted IS NOT COALESCE(c.distinct_questions, 0))''',
+            params
+        )
+        corrected = cursor.rowcount
+        
+        db.execute('DROP TABLE temp.attempt_counts')
+        db.commit()
+        return corrected
+    except Exception:
+        db.rollback()
+        raise
+
+
+def get_leaderboard(limit=20):
+    """Get leaderboard sorted by XP"""
+    return get_top(limit)
 
 
 def get_topic_performance(user_id):
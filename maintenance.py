@@ -0,0 +1,224 @@
+"""
+Maintenance Commands
+Backfill and rebuild jobs for denormalized tables
+
+Usage:
+    python maintenance.py reconcile-counters [--user-id ID]
+    python maintenance.py prune-leaderboard-events [--keep N]
+    python maintenance.py compact-rollups
+    python maintenance.py rebuild-rollups
+    python maintenance.py backfill-badges [--badge-id ID] [--batch-size N] [--reconcile]
+    python maintenance.py rebuild-daily-activity [--user-id ID]
+    python maintenance.py rebuild-completion-bitmaps [--user-id ID]
+    python maintenance.py run-jobs [--limit N]
+    python maintenance.py prune-jobs [--older-than-days N]
+    python maintenance.py sweep-tests [--batch-size N]
+    python maintenance.py rebuild-analytics
+    python maintenance.py check-analytics [--fix]
+    python maintenance.py compute-item-stats
+    python maintenance.py rebuild-search-index [--table NAME]
+"""
+
+import argparse
+import time
+from database import init_db, get_db, rebuild_search_index, SEARCH_INDEXES
+from logic import reconcile_user_counters, rebuild_daily_activity, sweep_expired_attempts
+from leaderboard import prune_leaderboard_events, compact_rollups, rebuild_rollups
+from badges import backfill_badges
+from progress import rebuild_completion_bitmaps
+from jobs import run_pending_jobs, prune_jobs
+from analytics import rebuild_analytics, check_analytics
+from item_analysis import compute_item_stats
+
+
+def cmd_reconcile_counters(args):
+    """Rebuild user_stats attempt counters from the attempts table"""
+    started = time.monotonic()
+    corrected = reconcile_user_counters(args.user_id)
+    elapsed = time.monotonic() - started
+    print(f"Reconciled attempt counters: {corrected} user(s) corrected in {elapsed:.2f}s")
+
+
+def cmd_prune_leaderboard_events(args):
+    """Trim the leaderboard_events journal to the newest events"""
+    deleted = prune_leaderboard_events(args.keep)
+    print(f"Pruned {deleted} leaderboard event(s), kept the newest {args.keep}")
+
+
+def cmd_compact_rollups(args):
+    """Roll leaderboard windows over and drop expired buckets (run daily)"""
+    deleted = compact_rollups()
+    print(f"Compacted leaderboard rollups: {deleted} row(s) removed")
+
+
+def cmd_rebuild_rollups(args):
+    """Recompute day/week/month leaderboard rollups from attempts"""
+    started = time.monotonic()
+    deleted = rebuild_rollups()
+    elapsed = time.monotonic() - started
+    print(f"Rebuilt leaderboard rollups in {elapsed:.2f}s ({deleted} row(s) compacted)")
+
+
+def cmd_backfill_badges(args):
+    """Award badges to every user who already meets their requirement"""
+    if args.reconcile:
+        cmd_reconcile_counters(argparse.Namespace(user_id=None))
+    summary = backfill_badges(args.badge_id, args.batch_size)
+    rate = summary['users'] / summary['seconds'] if summary['seconds'] else 0
+    print(f"Backfilled {summary['awarded']} badge(s) across {summary['users']} user(s) "
+          f"in {summary['seconds']:.2f}s ({rate:.0f} users/s)")
+
+
+def cmd_rebuild_daily_activity(args):
+    """Recompute the per-user daily activity rollup from attempts"""
+    started = time.monotonic()
+    rows = rebuild_daily_activity(args.user_id)
+    elapsed = time.monotonic() - started
+    print(f"Rebuilt daily activity: {rows} user-day row(s) in {elapsed:.2f}s")
+
+
+def cmd_rebuild_completion_bitmaps(args):
+    """Recompute per-user solved/attempted bitmaps from question_completions"""
+    started = time.monotonic()
+    users = rebuild_completion_bitmaps(args.user_id)
+    elapsed = time.monotonic() - started
+    print(f"Rebuilt completion bitmaps for {users} user(s) in {elapsed:.2f}s")
+
+
+def cmd_run_jobs(args):
+    """Run queued background jobs until the queue is idle"""
+    started = time.monotonic()
+    ran = run_pending_jobs(args.limit)
+    elapsed = time.monotonic() - started
+    print(f"Ran {ran} job(s) in {elapsed:.2f}s")
+
+
+def cmd_prune_jobs(args):
+    """Delete finished background jobs older than the given age"""
+    deleted = prune_jobs(args.older_than_days)
+    print(f"Pruned {deleted} finished job(s) older than {args.older_than_days} day(s)")
+
+
+def cmd_sweep_tests(args):
+    """Submit every in-progress test attempt that is past its deadline"""
+    finalized = sweep_expired_attempts(args.batch_size)
+    print(f"Finalized {finalized} expired test attempt(s)")
+
+
+def cmd_rebuild_analytics(args):
+    """Recompute the admin analytics counters from the attempts table"""
+    started = time.monotonic()
+    rows = rebuild_analytics()
+    elapsed = time.monotonic() - started
+    print(f"Rebuilt {rows} analytics counter(s) in {elapsed:.2f}s")
+
+
+def cmd_check_analytics(args):
+    """Compare the analytics counters with a recount from attempts"""
+    mismatches = check_analytics()
+    for dimension, key, stored, actual in mismatches:
+        print(f"{dimension} {key!r}: stored (attempts, correct, xp) = {stored}, actual = {actual}")
+    if not mismatches:
+        print("Analytics counters are consistent")
+    elif args.fix:
+        rows = rebuild_analytics()
+        print(f"Found {len(mismatches)} mismatch(es); rebuilt {rows} counter(s)")
+    else:
+        print(f"Found {len(mismatches)} mismatch(es); run with --fix (after run-jobs) to rebuild")
+
+
+def cmd_compute_item_stats(args):
+    """Recompute question difficulty, discrimination and option rates"""
+    started = time.monotonic()
+    db = get_db()
+    try:
+        questions = compute_item_stats(db)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    elapsed = time.monotonic() - started
+    print(f"Computed item statistics for {questions} question(s) in {elapsed:.2f}s")
+
+
+def cmd_rebuild_search_index(args):
+    """Re-fill the full-text search tables from questions, notes and learning materials"""
+    tables = [args.table] if args.table else [name for name, _, _ in SEARCH_INDEXES]
+    db = get_db()
+    try:
+        for table in tables:
+            rebuild_search_index(db, table)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    print(f"Rebuilt {len(tables)} search index(es): {', '.join(tables)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Gamified Coding maintenance commands')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    reconcile = subparsers.add_parser('reconcile-counters', help=cmd_reconcile_counters.__doc__)
+    reconcile.add_argument('--user-id', type=int, help='Only reconcile this user')
+    reconcile.set_defaults(func=cmd_reconcile_counters)
+
+    prune = subparsers.add_parser('prune-leaderboard-events', help=cmd_prune_leaderboard_events.__doc__)
+    prune.add_argument('--keep', type=int, default=10000, help='Number of newest events to keep')
+    prune.set_defaults(func=cmd_prune_leaderboard_events)
+
+    compact = subparsers.add_parser('compact-rollups', help=cmd_compact_rollups.__doc__)
+    compact.set_defaults(func=cmd_compact_rollups)
+
+    rebuild = subparsers.add_parser('rebuild-rollups', help=cmd_rebuild_rollups.__doc__)
+    rebuild.set_defaults(func=cmd_rebuild_rollups)
+
+    backfill = subparsers.add_parser('backfill-badges', help=cmd_backfill_badges.__doc__)
+    backfill.add_argument('--badge-id', type=int, help='Only backfill this badge')
+    backfill.add_argument('--batch-size', type=int, default=5000, help='Users per transaction')
+    backfill.add_argument('--reconcile', action='store_true',
+                          help='Rebuild attempt counters first (needed for attempt-based badges on old data)')
+    backfill.set_defaults(func=cmd_backfill_badges)
+
+    daily = subparsers.add_parser('rebuild-daily-activity', help=cmd_rebuild_daily_activity.__doc__)
+    daily.add_argument('--user-id', type=int, help='Only rebuild this user')
+    daily.set_defaults(func=cmd_rebuild_daily_activity)
+
+    bitmaps = subparsers.add_parser('rebuild-completion-bitmaps', help=cmd_rebuild_completion_bitmaps.__doc__)
+    bitmaps.add_argument('--user-id', type=int, help='Only rebuild this user')
+    bitmaps.set_defaults(func=cmd_rebuild_completion_bitmaps)
+
+    run_queue = subparsers.add_parser('run-jobs', help=cmd_run_jobs.__doc__)
+    run_queue.add_argument('--limit', type=int, help='Stop after this many jobs')
+    run_queue.set_defaults(func=cmd_run_jobs)
+
+    prune_queue = subparsers.add_parser('prune-jobs', help=cmd_prune_jobs.__doc__)
+    prune_queue.add_argument('--older-than-days', type=int, default=7, help='Age of finished jobs to delete')
+    prune_queue.set_defaults(func=cmd_prune_jobs)
+
+    sweep = subparsers.add_parser('sweep-tests', help=cmd_sweep_tests.__doc__)
+    sweep.add_argument('--batch-size', type=int, default=200, help='Attempts per transaction')
+    sweep.set_defaults(func=cmd_sweep_tests)
+
+    analytics = subparsers.add_parser('rebuild-analytics', help=cmd_rebuild_analytics.__doc__)
+    analytics.set_defaults(func=cmd_rebuild_analytics)
+
+    check = subparsers.add_parser('check-analytics', help=cmd_check_analytics.__doc__)
+    check.add_argument('--fix', action='store_true', help='Rebuild the counters if any differ')
+    check.set_defaults(func=cmd_check_analytics)
+
+    item_stats = subparsers.add_parser('compute-item-stats', help=cmd_compute_item_stats.__doc__)
+    item_stats.set_defaults(func=cmd_compute_item_stats)
+
+    search_index = subparsers.add_parser('rebuild-search-index', help=cmd_rebuild_search_index.__doc__)
+    search_index.add_argument('--table', choices=[name for name, _, _ in SEARCH_INDEXES],
+                              help='Only rebuild this full-text table')
+    search_index.set_defaults(func=cmd_rebuild_search_index)
+
+    args = parser.parse_args()
+    init_db()
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,149 @@
+"""
+Practice progress
+Per-user completion bitmaps over question ids (attempted / solved), kept in
+user_completion_bitmaps next to question_completions for O(1) lookups
+"""
+
+from datetime import datetime
+from database import get_db
+from catalog import get_catalog
+
+SOLVED = 'solved'
+ATTEMPTED = 'attempted'
+UNSOLVED = 'unsolved'
+
+
+class CompletionBitmap:
+    """Growable bitset over question ids (bit n of byte n // 8 is question n)"""
+
+    def __init__(self, data=None):
+        self.bits = bytearray(data or b'')
+
+    def __contains__(self, question_id):
+        index = question_id >> 3
+        return index < len(self.bits) and bool(self.bits[index] & (1 << (question_id & 7)))
+
+    def add(self, question_id):
+        """Set a bit, returning False if it was already set"""
+        if question_id in self:
+            return False
+        index = question_id >> 3
+        if index >= len(self.bits):
+            self.bits.extend(bytes(index + 1 - len(self.bits)))
+        self.bits[index] |= 1 << (question_id & 7)
+        return True
+
+    def count(self, question_ids=None):
+        """Number of set bits, or of set bits among `question_ids`"""
+        if question_ids is None:
+            return sum(bin(byte).count('1') for byte in self.bits)
+        return sum(1 for question_id in question_ids if question_id in self)
+
+    def to_bytes(self):
+        """Bytes for the BLOB column"""
+        return bytes(self.bits)
+
+
+def _load_bitmaps(db, user_id):
+    """Return (attempted, solved) bitmaps for a user"""
+    row = db.execute(
+        'SELECT attempted, solved FROM user_completion_bitmaps WHERE user_id = ?',
+        (user_id,)
+    ).fetchone()
+    if not row:
+        return CompletionBitmap(), CompletionBitmap()
+    return CompletionBitmap(row['attempted']), CompletionBitmap(row['solved'])
+
+
+def mark_question_bits(db, user_id, question_id, is_correct):
+    """Set the user's attempted (and solved) bit for a question (caller commits)
+
+    Only writes when a bit actually changes, so repeat attempts cost one
+    primary-key read.
+    """
+    attempted, solved = _load_bitmaps(db, user_id)
+    changed = attempted.add(question_id)
+    if is_correct:
+        changed = solved.add(question_id) or changed
+    if not changed:
+        return
+
+    db.execute(
+        '''INSERT INTO user_completion_bitmaps (user_id, attempted, solved, updated_at)
+           VALUES (?, ?, ?, ?)
+           ON CONFLICT(user_id) DO UPDATE SET
+               attempted = excluded.attempted,
+               solved = excluded.solved,
+               updated_at = excluded.updated_at''',
+        (user_id, attempted.to_bytes(), solved.to_bytes(), datetime.now())
+    )
+
+
+class UserProgress:
+    """A user's solved/attempted state, with topic totals from the practice catalog"""
+
+    def __init__(self, attempted, solved, catalog, language_track):
+        self.attempted = attempted
+        self.solved = solved
+        self.catalog = catalog
+        self.language_track = language_track
+
+    def state(self, question_id):
+        """'solved', 'attempted' or 'unsolved'"""
+        if question_id in self.solved:
+            return SOLVED
+        if question_id in self.attempted:
+            return ATTEMPTED
+        return UNSOLVED
+
+    def topic_counts(self, topic):
+        """(solved, total) active questions in a topic"""
+        question_ids = [question.id for question in self.catalog.questions(self.language_track, topic)]
+        return self.solved.count(question_ids), len(question_ids)
+
+    def completion_ratio(self, topic):
+        """Fraction (0.0-1.0) of a topic's active questions the user has solved"""
+        solved, total = self.topic_counts(topic)
+        return solved / total if total else 0.0
+
+
+def get_user_progress(user_id, language_track):
+    """Load a user's completion bitmaps (one primary-key read)"""
+    attempted, solved = _load_bitmaps(get_db(), user_id)
+    return UserProgress(attempted, solved, get_catalog(), language_track)
+
+
+def rebuild_completion_bitmaps(user_id=None):
+    """Recompute user_completion_bitmaps from question_completions
+
+    Returns the number of users written.
+    """
+    db = get_db()
+    user_filter = ' WHERE user_id = ?' if user_id else ''
+    params = (user_id,) if user_id else ()
+
+    bitmaps = {}
+    for row in db.execute(
+        'SELECT user_id, question_id, first_correct_at FROM question_completions' + user_filter,
+        params
+    ):
+        attempted, solved = bitmaps.setdefault(row['user_id'], (CompletionBitmap(), CompletionBitmap()))
+        attempted.add(row['question_id'])
+        if row['first_correct_at'] is not None:
+            solved.add(row['question_id'])
+
+    now = datetime.now()
+    try:
+        db.execute('DELETE FROM user_completion_bitmaps' + user_filter, params)
+        db.executemany(
+            '''INSERT INTO user_completion_bitmaps (user_id, attempted, solved, updated_at)
+               VALUES (?, ?, ?, ?)''',
+            [(uid, attempted.to_bytes(), solved.to_bytes(), now)
+             for uid, (attempted, solved) in bitmaps.items()]
+        )
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    return len(bitmaps)
@@ -0,0 +1,99 @@
+"""
+Query plan audit
+
+Finds every SQL string passed to .execute() in app.py and logic.py, runs
+EXPLAIN QUERY PLAN against the current database and flags full table scans.
+
+Usage:
+    python query_audit.py            # audit app.py and logic.py
+    python query_audit.py other.py   # audit specific files
+"""
+
+import ast
+import sys
+from database import init_db, get_db
+
+DEFAULT_FILES = ['app.py', 'logic.py']
+
+# Tables small enough that a full scan is expected and harmless
+SMALL_TABLES = {'badges', 'subjects', 'courses', 'tests', 'sqlite_master'}
+
+
+def extract_queries(path):
+    """Return (line, sql) for each literal SQL string passed to execute()"""
+    with open(path, encoding='utf-8') as f:
+        tree = ast.parse(f.read(), filename=path)
+
+    queries = []
+    for node in ast.walk(tree):
+        if not isinstance(node, ast.Call) or not node.args:
+            continue
+        func = node.func
+        if not isinstance(func, ast.Attribute) or func.attr not in ('execute', 'executemany'):
+            continue
+        arg = node.args[0]
+        if isinstance(arg, ast.Constant) and isinstance(arg.value, str):
+            queries.append((node.lineno, arg.value))
+
+    return sorted(queries)
+
+
+def explain(db, sql):
+    """Run EXPLAIN QUERY PLAN with NULL placeholders bound"""
+    params = [None] * sql.count('?')
+    rows = db.execute('EXPLAIN QUERY PLAN ' + sql, params).fetchall()
+    return [row['detail'] for row in rows]
+
+
+def find_full_scans(plan):
+    """Return plan steps that scan a whole table without an index"""
+    scans = []
+    for detail in plan:
+        if not detail.startswith('SCAN '):
+            continue
+        if 'USING' in detail:
+            continue
+        table = detail.split()[1]
+        if table in SMALL_TABLES:
+            continue
+        scans.append(detail)
+    return scans
+
+
+def audit(files=None):
+    """Audit queries in the given files and print a report"""
+    files = files or DEFAULT_FILES
+    db = get_db()
+    flagged = 0
+    checked = 0
+
+    for path in files:
+        for line, sql in extract_queries(path):
+            # Only plan statements that read data; DDL and PRAGMAs are skipped
+            first_word = sql.strip().split(None, 1)[0].upper()
+            if first_word not in ('SELECT', 'UPDATE', 'DELETE', 'INSERT', 'WITH'):
+                continue
+
+            try:
+                plan = explain(db, sql)
+            except Exception as e:
+                print(f"{path}:{line}: could not explain ({str(e)})")
+                continue
+
+            checked += 1
+            scans = find_full_scans(plan)
+            if scans:
+                flagged += 1
+                query_preview = ' '.join(sql.split())[:100]
+                print(f"{path}:{line}: FULL SCAN {', '.join(scans)}")
+                print(f"    {query_preview}")
+
+    db.close()
+    print(f"\nChecked {checked} queries, {flagged} with full table scans.")
+    return flagged
+
+
+if __name__ == '__main__':
+    init_db()
+    flagged = audit(sys.argv[1:])
+    sys.exit(1 if flagged else 0)
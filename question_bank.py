@@ -0,0 +1,142 @@
+"""
+Question bank browsing
+Keyset-paginated list projections of the question bank for the admin
+question browser and the test builder's search. Pages read only the
+columns a list shows; full question bodies are loaded one at a time.
+"""
+
+from item_analysis import ITEM_FLAGS, ITEM_SORTS
+from search import build_match_query
+
+QUESTION_PAGE_SIZE = 50
+SEARCH_PAGE_SIZE = 20
+
+# Columns shown in question lists (no question text, options or explanation)
+LIST_COLUMNS = '''q.id, q.title, q.subject, q.topic, q.difficulty, q.points, q.is_active, q.correct_answer,
+                  s.test_responses, s.p_value, s.point_biserial, s.practice_responses,
+                  s.rate_a, s.rate_b, s.rate_c, s.rate_d'''
+
+
+def parse_cursor(value, sort=''):
+    """Decode a page cursor: an id, or 'sort_value:id' for statistic sorts; None if absent or malformed"""
+    if not value:
+        return None
+    try:
+        if sort:
+            sort_value, question_id = value.split(':')
+            return float(sort_value), int(question_id)
+        return int(value)
+    except ValueError:
+        return None
+
+
+def _encode_cursor(row, sort):
+    """Cursor pointing just past `row`"""
+    if sort:
+        return f"{row['sort_value']!r}:{row['id']}"
+    return str(row['id'])
+
+
+def list_questions(db, topic='', difficulty='', subject='', show_inactive=False, flag='', sort='',
+                   search='', after=None, limit=QUESTION_PAGE_SIZE):
+    """One page of questions and the cursor for the next page (None on the last page)
+
+    Without a sort the newest questions come first; `sort` is a key of
+    ITEM_SORTS (ascending, questions without statistics last). `after` is
+    a cursor from parse_cursor. `search` is full-text with every word a
+    prefix (see search.py), or an exact id.
+    """
+    conditions = []
+    params = []
+    if topic:
+        conditions.append('q.topic = ?')
+        params.append(topic)
+    if difficulty:
+        conditions.append('q.difficulty = ?')
+        params.append(difficulty)
+    if subject:
+        conditions.append('q.subject = ?')
+        params.append(subject)
+    if not show_inactive:
+        conditions.append('q.is_active = 1')
+    if flag in ITEM_FLAGS:
+        conditions.append(f'({ITEM_FLAGS[flag][1]})')
+    match = build_match_query(search)
+    if match:
+        # Full-text match on title, text and explanation (or the id itself)
+        condition = 'q.id IN (SELECT rowid FROM questions_fts WHERE questions_fts MATCH ?)'
+        params.append(match)
+        if search.isdigit():
+            condition = f'({condition} OR q.id = ?)'
+            params.append(int(search))
+        conditions.append(condition)
+
+    if sort in ITEM_SORTS:
+        sort_key = ITEM_SORTS[sort]
+        if after is not None:
+            conditions.append(f'({sort_key}, q.id) > (?, ?)')
+            params += list(after)
+        order = f'{sort_key}, q.id'
+        columns = f'{LIST_COLUMNS}, {sort_key} AS sort_value'
+    else:
+        sort = ''
+        if after is not None:
+            conditions.append('q.id < ?')
+            params.append(after)
+        order = 'q.id DESC'
+        columns = LIST_COLUMNS
+
+    where = ('WHERE ' + ' AND '.join(conditions)) if conditions else ''
+    rows = db.execute(
+        f'''SELECT {columns}
+            FROM questions q
+            LEFT JOIN question_item_stats s ON s.question_id = q.id
+            {where}
+            ORDER BY {order}
+            LIMIT ?''',
+        params + [limit + 1]
+    ).fetchall()
+
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, _encode_cursor(rows[-1], sort)
+    return rows, None
+
+
+def get_questions_by_ids(db, question_ids):
+    """List projections of the given questions, in the order given (missing ids are skipped)"""
+    if not question_ids:
+        return []
+    placeholders = ','.join(['?'] * len(question_ids))
+    rows = {
+        row['id']: row for row in db.execute(
+            f'''SELECT {LIST_COLUMNS}
+                FROM questions q
+                LEFT JOIN question_item_stats s ON s.question_id = q.id
+                WHERE q.id IN ({placeholders})''',
+            list(question_ids)
+        )
+    }
+    return [rows[question_id] for question_id in question_ids if question_id in rows]
+
+
+def get_question_detail(db, question_id):
+    """Full question body (text, options, answer, explanation) as a dict, or None"""
+    row = db.execute(
+        '''SELECT id, title, question_text, option_a, option_b, option_c, option_d,
+                  correct_answer, explanation
+           FROM questions WHERE id = ?''',
+        (question_id,)
+    ).fetchone()
+    return dict(row) if row else None
+
+
+def question_summary(row):
+    """JSON-ready list projection of a question"""
+    return {
+        'id': row['id'],
+        'title': row['title'],
+        'topic': row['topic'],
+        'difficulty': row['difficulty'],
+        'is_active': bool(row['is_active'])
+    }
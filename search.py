@@ -0,0 +1,144 @@
+"""
+Full-text search
+Ranked, highlighted search over questions, notes and learning materials
+using the FTS5 tables that init_db keeps in sync with triggers (see
+SEARCH_INDEXES in database.py).
+"""
+
+import re
+from markupsafe import Markup, escape
+
+SEARCH_RESULTS_LIMIT = 20
+# Admin lists (Manage Notes) show more matches per search
+ADMIN_SEARCH_LIMIT = 100
+SEARCH_SCOPES = ('notes', 'materials', 'questions')
+
+# Words of context around the best match in a snippet
+SNIPPET_TOKENS = 24
+
+# FTS5 wraps matches in these; they are swapped for <mark> after escaping
+_MARK_OPEN = '\x02'
+_MARK_CLOSE = '\x03'
+
+# bm25 column weights: a match in the title counts ten times a body match
+_TITLE_WEIGHT = 10.0
+_BODY_WEIGHT = 1.0
+
+_WORD = re.compile(r'\w+')
+
+
+def build_match_query(text):
+    """FTS5 query matching every word of `text` as a prefix, or None if it has no words
+
+    Words are quoted, so operators and punctuation in user input are
+    never parsed as query syntax.
+    """
+    words = _WORD.findall(text or '')
+    if not words:
+        return None
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def highlighted(text):
+    """Escaped HTML for FTS5 output, with matches wrapped in <mark>"""
+    return Markup(
+        str(escape(text or '')).replace(_MARK_OPEN, '<mark>').replace(_MARK_CLOSE, '</mark>')
+    )
+
+
+def _highlight(table, column):
+    """SQL for a column with every match marked"""
+    return f"highlight({table}, {column}, '{_MARK_OPEN}', '{_MARK_CLOSE}')"
+
+
+def _snippet(table, column):
+    """SQL for the best-matching fragment of a column"""
+    return f"snippet({table}, {column}, '{_MARK_OPEN}', '{_MARK_CLOSE}', '…', {SNIPPET_TOKENS})"
+
+
+def _results(rows):
+    """Result dicts with the highlighted fields converted to safe HTML"""
+    return [
+        dict(row, title=highlighted(row['title']), snippet=highlighted(row['snippet']))
+        for row in rows
+    ]
+
+
+def search_notes(db, query, include_drafts=False, topic_id=None, limit=SEARCH_RESULTS_LIMIT):
+    """Notes matching a match query, best first (published only unless `include_drafts`)"""
+    conditions = '' if include_drafts else "AND n.visibility = 'published'"
+    params = [query]
+    if topic_id:
+        conditions += ' AND n.topic_id = ?'
+        params.append(topic_id)
+    rows = db.execute(
+        f'''SELECT n.id, n.visibility, t.name as topic_name, s.name as subject_name,
+                   {_highlight('notes_fts', 0)} as title,
+                   {_snippet('notes_fts', 1)} as snippet
+            FROM notes_fts
+            JOIN notes n ON n.id = notes_fts.rowid
+            JOIN topics t ON t.id = n.topic_id
+            LEFT JOIN subjects s ON s.id = t.subject_id
+            WHERE notes_fts MATCH ? {conditions}
+            ORDER BY bm25(notes_fts, {_TITLE_WEIGHT}, {_BODY_WEIGHT})
+            LIMIT ?''',
+        params + [limit]
+    ).fetchall()
+    return _results(rows)
+
+
+def search_materials(db, query, limit=SEARCH_RESULTS_LIMIT):
+    """Learning materials matching a match query, best first"""
+    rows = db.execute(
+        f'''SELECT m.id, m.topic, m.level, m.language_track,
+                   {_highlight('learning_materials_fts', 0)} as title,
+                   {_snippet('learning_materials_fts', 1)} as snippet
+            FROM learning_materials_fts
+            JOIN learning_materials m ON m.id = learning_materials_fts.rowid
+            WHERE learning_materials_fts MATCH ?
+            ORDER BY bm25(learning_materials_fts, {_TITLE_WEIGHT}, {_BODY_WEIGHT})
+            LIMIT ?''',
+        (query, limit)
+    ).fetchall()
+    return _results(rows)
+
+
+def search_questions(db, query, include_hidden=False, limit=SEARCH_RESULTS_LIMIT):
+    """Questions matching a match query, best first
+
+    Students only search active questions' titles and text; with
+    `include_hidden` (admins) inactive questions and explanations, which
+    give the answer away, are searched as well.
+    """
+    if include_hidden:
+        match, active, snippet_column = query, '', -1
+    else:
+        match, active, snippet_column = f'{{title question_text}} : ({query})', 'AND q.is_active = 1', 1
+    rows = db.execute(
+        f'''SELECT q.id, q.topic, q.difficulty, q.is_active,
+                   {_highlight('questions_fts', 0)} as title,
+                   {_snippet('questions_fts', snippet_column)} as snippet
+            FROM questions_fts
+            JOIN questions q ON q.id = questions_fts.rowid
+            WHERE questions_fts MATCH ? {active}
+            ORDER BY bm25(questions_fts, {_TITLE_WEIGHT}, {_BODY_WEIGHT}, {_BODY_WEIGHT})
+            LIMIT ?''',
+        (match, limit)
+    ).fetchall()
+    return _results(rows)
+
+
+def search_all(db, text, scopes=SEARCH_SCOPES, is_admin=False, limit=SEARCH_RESULTS_LIMIT):
+    """{scope: results} for the given search text (empty lists if it has no words)"""
+    query = build_match_query(text)
+    results = {scope: [] for scope in scopes}
+    if query is None:
+        return results
+    if 'notes' in scopes:
+        results['notes'] = search_notes(db, query, include_drafts=is_admin, limit=limit)
+    if 'materials' in scopes:
+        results['materials'] = search_materials(db, query, limit=limit)
+    if 'questions' in scopes:
+        results['questions'] = search_questions(db, query, include_hidden=is_admin, limit=limit)
+    return results
+
@@ -3,7 +3,7 @@ Seed Data Script
 Combines all data seeding functions into one file
 """
 
-from database import init_db, get_db
+from database import init_db, get_db, rebuild_search_index
 from datetime import datetime
 from werkzeug.security import generate_password_hash
 
@@ -4606,9 +4606,14 @@ def seed_all():
     print("\n[8/9] Seeding projects...")
     seed_projects()
     
+    # Seeded notes and materials are not indexed by triggers (see database.SEARCH_INDEXES)
+    db = get_db()
+    for fts_table in ('notes_fts', 'learning_materials_fts'):
+        rebuild_search_index(db, fts_table)
+    db.commit()
+    
     # Create admin user if it doesn't exist
     print("\n[9/9] Creating admin user...")
-    db = get_db()
     try:
         # Check if admin user already exists
         admin_check = db.execute(
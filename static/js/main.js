@@ -111,3 +111,172 @@ document.addEventListener('DOMContentLoaded', function() {
         });
     });
 });
+
+// Admin question lists: on-demand previews and the test builder picker
+
+// Full question body, built from the preview endpoint's JSON
+function renderQuestionPreview(question) {
+    const preview = document.createElement('div');
+    preview.className = 'question-preview';
+    
+    const text = document.createElement('p');
+    text.textContent = question.question_text;
+    preview.appendChild(text);
+    
+    const options = document.createElement('ul');
+    const correct = (question.correct_answer || '').trim().toUpperCase();
+    ['A', 'B', 'C', 'D'].forEach(function(letter) {
+        const item = document.createElement('li');
+        item.textContent = `${letter}. ${question['option_' + letter.toLowerCase()]}`;
+        if (letter === correct) {
+            item.className = 'correct-option';
+        }
+        options.appendChild(item);
+    });
+    preview.appendChild(options);
+    
+    if (question.explanation) {
+        const explanation = document.createElement('p');
+        explanation.className = 'question-preview-explanation';
+        explanation.textContent = question.explanation;
+        preview.appendChild(explanation);
+    }
+    return preview;
+}
+
+// Show or hide a question's full body under its table row (loaded on demand)
+function toggleQuestionPreview(questionId, button) {
+    const row = button.closest('tr');
+    const next = row.nextElementSibling;
+    if (next && next.classList.contains('question-preview-row')) {
+        next.remove();
+        return;
+    }
+    
+    fetch(`/admin/question/${questionId}/preview`)
+        .then(response => response.json())
+        .then(data => {
+            if (!data.success) {
+                showToast(data.message || 'Could not load question', 'danger');
+                return;
+            }
+            const previewRow = document.createElement('tr');
+            previewRow.className = 'question-preview-row';
+            const cell = document.createElement('td');
+            cell.colSpan = row.children.length;
+            cell.appendChild(renderQuestionPreview(data.question));
+            previewRow.appendChild(cell);
+            row.after(previewRow);
+        })
+        .catch(error => {
+            console.error('Error loading question preview:', error);
+            showToast('Could not load question', 'danger');
+        });
+}
+
+// Test builder: search the bank a page at a time and add results to the selection
+function initQuestionPicker(searchUrl) {
+    const selected = document.getElementById('selectedQuestions');
+    const results = document.getElementById('questionResults');
+    const moreButton = document.getElementById('questionResultsMore');
+    const searchInput = document.getElementById('questionSearch');
+    const topicSelect = document.getElementById('questionSearchTopic');
+    const difficultySelect = document.getElementById('questionSearchDifficulty');
+    let nextCursor = null;
+    let searchTimer = null;
+    
+    function isSelected(questionId) {
+        return selected.querySelector(`input[name="question_ids"][value="${questionId}"]`) !== null;
+    }
+    
+    function questionLabel(question) {
+        const label = document.createElement('span');
+        const title = document.createElement('strong');
+        title.textContent = question.title;
+        label.appendChild(title);
+        label.appendChild(document.createTextNode(
+            ` - ${question.topic} (${question.difficulty})${question.is_active ? '' : ' [inactive]'}`
+        ));
+        return label;
+    }
+    
+    function addToSelection(question) {
+        if (isSelected(question.id)) {
+            return;
+        }
+        const item = document.createElement('label');
+        item.className = 'picker-item';
+        const checkbox = document.createElement('input');
+        checkbox.type = 'checkbox';
+        checkbox.name = 'question_ids';
+        checkbox.value = question.id;
+        checkbox.checked = true;
+        item.appendChild(checkbox);
+        item.appendChild(document.createTextNode(' '));
+        item.appendChild(questionLabel(question));
+        selected.appendChild(item);
+    }
+    
+    function renderResult(question) {
+        const item = document.createElement('div');
+        item.className = 'picker-item';
+        const addButton = document.createElement('button');
+        addButton.type = 'button';
+        addButton.className = 'btn btn-sm btn-primary';
+        addButton.textContent = isSelected(question.id) ? 'Added' : 'Add';
+        addButton.disabled = isSelected(question.id);
+        addButton.addEventListener('click', function() {
+            addToSelection(question);
+            addButton.textContent = 'Added';
+            addButton.disabled = true;
+        });
+        item.appendChild(addButton);
+        item.appendChild(document.createTextNode(' '));
+        item.appendChild(questionLabel(question));
+        results.appendChild(item);
+    }
+    
+    function loadResults(append) {
+        const params = new URLSearchParams({
+            q: searchInput.value.trim(),
+            topic: topicSelect.value,
+            difficulty: difficultySelect.value
+        });
+        if (append && nextCursor) {
+            params.set('after', nextCursor);
+        }
+        fetch(`${searchUrl}?${params}`)
+            .then(response => response.json())
+            .then(data => {
+                if (!append) {
+                    results.innerHTML = '';
+                }
+                data.questions.forEach(renderResult);
+                if (!append && data.questions.length === 0) {
+                    results.textContent = 'No matching questions.';
+                }
+                nextCursor = data.next_cursor;
+                moreButton.style.display = nextCursor ? '' : 'none';
+            })
+            .catch(error => {
+                console.error('Error searching questions:', error);
+                showToast('Could not search questions', 'danger');
+            });
+    }
+    
+    searchInput.addEventListener('input', function() {
+        clearTimeout(searchTimer);
+        searchTimer = setTimeout(() => loadResults(false), 300);
+    });
+    // Enter searches instead of submitting the test form
+    searchInput.addEventListener('keydown', function(event) {
+        if (event.key === 'Enter') {
+            event.preventDefault();
+            loadResults(false);
+        }
+    });
+    topicSelect.addEventListener('change', () => loadResults(false));
+    difficultySelect.addEventListener('change', () => loadResults(false));
+    moreButton.addEventListener('click', () => loadResults(true));
+    loadResults(false);
+}
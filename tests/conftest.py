@@ -0,0 +1,32 @@
+"""
+Shared test setup: application modules on sys.path and a fresh database per test
+"""
+
+import os
+import sys
+from datetime import datetime
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database  # noqa: E402
+import logic  # noqa: E402
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    """Connection to a fresh database with one student (id 1)"""
+    monkeypatch.setattr(database, 'DATABASE', str(tmp_path / 'test.db'))
+    database.init_db()
+    # Answer keys are cached per (test_id, version), which repeat across databases
+    logic._answer_key_cache.clear()
+    conn = database.get_db()
+    conn.execute(
+        '''INSERT INTO users (id, username, email, password, created_at)
+           VALUES (1, 'student', 'student@example.com', 'x', ?)''',
+        (datetime.now(),)
+    )
+    conn.commit()
+    yield conn
+    conn.close()
@@ -0,0 +1,256 @@
+"""
+Regression tests for finishing a test attempt (logic.finish_test_attempt)
+Scores and per-answer grades must match the per-question loop that
+finish_test used before scoring was batched, and the number of queries
+must not grow with the number of questions. Two cases are graded
+differently on purpose: stored points that disagree with the answer key
+are rewritten, and answers to questions outside the attempt's key do not
+count.
+"""
+
+import random
+from datetime import datetime
+
+import pytest
+
+import logic
+
+# Stored answer shapes; None means no answer row at all
+ANSWER_SHAPES = ['A', 'a', '  b ', 'B', ' c', 'D', '', '   ', 'None', None]
+
+
+def make_attempt(db, num_questions, seed):
+    """A test of `num_questions` questions with mixed points and a seeded in-progress attempt
+
+    Stored grades are sometimes wrong (as after an answer key edit) so the
+    re-grade has something to fix. Points agree with the stored grade here;
+    rows where they disagree are covered by test_stored_points_follow_the_answer_key.
+    """
+    rng = random.Random(seed)
+    test_id = db.execute(
+        "INSERT INTO tests (title, status, created_at) VALUES ('T', 'published', ?)", (datetime.now(),)
+    ).lastrowid
+    for index in range(num_questions):
+        correct = rng.choice(['A', 'b', ' C ', 'd'])
+        question_id = db.execute(
+            '''INSERT INTO questions (title, question_text, option_a, option_b, option_c, option_d,
+                                      correct_answer, difficulty, topic, created_at)
+               VALUES (?, 'text', 'a', 'b', 'c', 'd', ?, 'easy', 'Basics', ?)''',
+            (f'Q{index}', correct, datetime.now())
+        ).lastrowid
+        points = rng.choice([1, 2, 3, 5, 10])
+        db.execute(
+            'INSERT INTO test_questions (test_id, question_id, order_index, points) VALUES (?, ?, ?, ?)',
+            (test_id, question_id, index, points)
+        )
+    version = logic.pin_answer_key(db, test_id)
+    attempt_id = db.execute(
+        '''INSERT INTO test_attempts (test_id, user_id, started_at, status, answer_key_version)
+           VALUES (?, 1, ?, 'in_progress', ?)''',
+        (test_id, datetime.now(), version)
+    ).lastrowid
+
+    for row in db.execute(
+            '''SELECT tq.question_id, tq.points FROM test_questions tq
+               WHERE tq.test_id = ?''', (test_id,)).fetchall():
+        selected = rng.choice(ANSWER_SHAPES)
+        if selected is None:
+            continue
+        stored_correct = rng.random() < 0.5
+        db.execute(
+            '''INSERT INTO test_attempt_answers (test_attempt_id, question_id, selected_answer,
+                                                is_correct, points_earned, answered_at)
+               VALUES (?, ?, ?, ?, ?, ?)''',
+            (attempt_id, row['question_id'], selected, 1 if stored_correct else 0,
+             row['points'] if stored_correct else 0, datetime.now())
+        )
+    db.commit()
+    return db.execute('SELECT * FROM test_attempts WHERE id = ?', (attempt_id,)).fetchone()
+
+
+def reference_score(db, test_id, attempt_id):
+    """Score the attempt with the previous per-question loop from finish_test"""
+    answers = db.execute('SELECT * FROM test_attempt_answers WHERE test_attempt_id = ?', (attempt_id,)).fetchall()
+    for answer in answers:
+        question = db.execute('SELECT correct_answer FROM questions WHERE id = ?', (answer['question_id'],)).fetchone()
+        if question:
+            selected_ans = answer['selected_answer']
+            if not selected_ans or selected_ans == 'None' or selected_ans == '':
+                should_be_correct = False
+            else:
+                should_be_correct = logic.compare_answers(selected_ans, question['correct_answer'])
+            current_is_correct = bool(answer['is_correct'] == 1 or answer['is_correct'] is True)
+            if current_is_correct != should_be_correct:
+                if should_be_correct:
+                    test_q = db.execute('SELECT points FROM test_questions WHERE test_id = ? AND question_id = ?',
+                                        (test_id, answer['question_id'])).fetchone()
+                    points = test_q['points'] if test_q else 1
+                else:
+                    points = 0
+                db.execute(
+                    'UPDATE test_attempt_answers SET is_correct = ?, points_earned = ? WHERE id = ?',
+                    (1 if should_be_correct else 0, points, answer['id'])
+                )
+
+    answers = db.execute('SELECT * FROM test_attempt_answers WHERE test_attempt_id = ?', (attempt_id,)).fetchall()
+    total_questions = db.execute(
+        'SELECT COUNT(*) as count FROM test_questions WHERE test_id = ?', (test_id,)
+    ).fetchone()['count']
+    max_score = db.execute(
+        'SELECT SUM(points) as total FROM test_questions WHERE test_id = ?', (test_id,)
+    ).fetchone()['total'] or total_questions
+    correct_answers = sum(1 for a in answers if int(a['is_correct']) == 1)
+    total_score = sum(int(a['points_earned'] or 0) for a in answers)
+    percentage = (total_score / max_score * 100) if max_score > 0 else 0
+    return {
+        'score': int(percentage),
+        'total_questions': total_questions,
+        'correct_answers': correct_answers,
+        'rows': {a['id']: (a['is_correct'], a['points_earned']) for a in answers},
+    }
+
+
+def answer_rows(db, attempt_id):
+    """{answer id: (is_correct, points_earned)} for an attempt"""
+    return {
+        row['id']: (row['is_correct'], row['points_earned'])
+        for row in db.execute(
+            'SELECT id, is_correct, points_earned FROM test_attempt_answers WHERE test_attempt_id = ?',
+            (attempt_id,)
+        )
+    }
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_finish_matches_previous_scoring(db, seed):
+    attempt = make_attempt(db, num_questions=12, seed=seed)
+
+    expected = reference_score(db, attempt['test_id'], attempt['id'])
+    db.rollback()
+
+    result = logic.finish_test_attempt(db, attempt)
+
+    assert result['score'] == expected['score']
+    assert result['total_questions'] == expected['total_questions']
+    assert result['correct_answers'] == expected['correct_answers']
+    assert answer_rows(db, attempt['id']) == expected['rows']
+
+    stored = db.execute(
+        'SELECT status, score, total_questions, correct_answers FROM test_attempts WHERE id = ?',
+        (attempt['id'],)
+    ).fetchone()
+    assert tuple(stored) == ('completed', expected['score'], expected['total_questions'],
+                             expected['correct_answers'])
+
+
+def test_final_answers_are_graded(db):
+    attempt = make_attempt(db, num_questions=5, seed=99)
+    questions = db.execute(
+        '''SELECT q.id, q.correct_answer, tq.points FROM test_questions tq
+           JOIN questions q ON q.id = tq.question_id WHERE tq.test_id = ? ORDER BY tq.order_index''',
+        (attempt['test_id'],)
+    ).fetchall()
+    final_answers = [{'question_id': q['id'], 'answer': f"  {q['correct_answer'].strip().lower()} "}
+                     for q in questions]
+
+    result = logic.finish_test_attempt(db, attempt, final_answers)
+
+    assert result['correct_answers'] == len(questions)
+    assert result['score'] == 100
+
+
+def test_finished_attempt_is_not_finished_twice(db):
+    attempt = make_attempt(db, num_questions=3, seed=7)
+    assert logic.finish_test_attempt(db, attempt) is not None
+    assert logic.finish_test_attempt(db, attempt) is None
+
+
+def test_stored_points_follow_the_answer_key(db):
+    attempt = make_attempt(db, num_questions=4, seed=3)
+    rows = db.execute(
+        '''SELECT a.id, a.question_id, q.correct_answer, tq.points
+           FROM test_questions tq
+           JOIN questions q ON q.id = tq.question_id
+           LEFT JOIN test_attempt_answers a ON a.question_id = tq.question_id AND a.test_attempt_id = ?
+           WHERE tq.test_id = ? ORDER BY tq.order_index''',
+        (attempt['id'], attempt['test_id'])
+    ).fetchall()
+    db.execute('DELETE FROM test_attempt_answers WHERE test_attempt_id = ?', (attempt['id'],))
+    right, wrong = rows[0], rows[1]
+    # Graded right but credited 99 points; graded wrong but credited points
+    db.execute(
+        '''INSERT INTO test_attempt_answers (test_attempt_id, question_id, selected_answer, is_correct, points_earned)
+           VALUES (?, ?, ?, 1, 99), (?, ?, 'Z', 0, 7)''',
+        (attempt['id'], right['question_id'], right['correct_answer'], attempt['id'], wrong['question_id'])
+    )
+    db.commit()
+
+    result = logic.finish_test_attempt(db, attempt)
+
+    stored = {
+        row['question_id']: (row['is_correct'], row['points_earned'])
+        for row in db.execute('SELECT * FROM test_attempt_answers WHERE test_attempt_id = ?', (attempt['id'],))
+    }
+    assert stored == {right['question_id']: (1, right['points']), wrong['question_id']: (0, 0)}
+    max_score = sum(row['points'] for row in rows)
+    assert result['score'] == int(right['points'] / max_score * 100)
+    assert result['correct_answers'] == 1
+
+
+def test_answers_outside_the_answer_key_do_not_count(db):
+    attempt = make_attempt(db, num_questions=3, seed=5)
+    # A question that was never part of the attempt's (pinned) key
+    other = make_attempt(db, num_questions=1, seed=6)
+    other_question = db.execute(
+        'SELECT question_id FROM test_questions WHERE test_id = ?', (other['test_id'],)
+    ).fetchone()['question_id']
+    db.execute('DELETE FROM test_attempt_answers WHERE test_attempt_id = ?', (attempt['id'],))
+    answer_id = db.execute(
+        '''INSERT INTO test_attempt_answers (test_attempt_id, question_id, selected_answer, is_correct, points_earned)
+           VALUES (?, ?, 'A', 1, 50)''',
+        (attempt['id'], other_question)
+    ).lastrowid
+    db.commit()
+
+    result = logic.finish_test_attempt(db, attempt)
+
+    assert result['score'] == 0
+    assert result['correct_answers'] == 0
+    assert result['total_questions'] == 3
+    # The row itself is left as stored
+    assert answer_rows(db, attempt['id']) == {answer_id: (1, 50)}
+
+
+def test_sweep_grades_like_finish(db):
+    finished = make_attempt(db, num_questions=15, seed=42)
+    expired = make_attempt(db, num_questions=15, seed=42)
+    db.execute('UPDATE test_attempts SET deadline = ? WHERE id = ?', (datetime(2000, 1, 1), expired['id']))
+    db.commit()
+
+    result = logic.finish_test_attempt(db, finished)
+    assert logic.finalize_expired_attempts(db) == 1
+    db.commit()
+
+    swept = db.execute(
+        'SELECT status, score, total_questions, correct_answers FROM test_attempts WHERE id = ?',
+        (expired['id'],)
+    ).fetchone()
+    assert tuple(swept) == ('completed', result['score'], result['total_questions'], result['correct_answers'])
+    # Same seed, same answers in the same order
+    assert list(answer_rows(db, expired['id']).values()) == list(answer_rows(db, finished['id']).values())
+
+
+def count_finish_queries(db, num_questions):
+    """Statements executed while finishing an attempt on a test of `num_questions` questions"""
+    attempt = make_attempt(db, num_questions=num_questions, seed=num_questions)
+    statements = []
+    db.set_trace_callback(statements.append)
+    try:
+        logic.finish_test_attempt(db, attempt)
+    finally:
+        db.set_trace_callback(None)
+    return len(statements)
+
+
+def test_query_count_does_not_grow_with_questions(db):
+    assert count_finish_queries(db, 10) == count_finish_queries(db, 100)
@@ -0,0 +1,147 @@
+"""
+Tests for rendered fragments and conditional GETs (fragments.py)
+A fragment is rendered once per revision and dropped when purged or when
+the byte budget is full; pages answer a matching If-None-Match with 304,
+except while a flash message is waiting to be shown.
+"""
+
+import pytest
+from flask import Flask, flash, session
+from jinja2 import DictLoader
+
+import fragments
+from cache import LRUCache
+
+
+@pytest.fixture(autouse=True)
+def fresh_cache(monkeypatch):
+    """An empty fragment cache and template digest for every test"""
+    monkeypatch.setattr(fragments, '_fragment_cache', LRUCache('fragments', max_entries=100, max_bytes=1000))
+    monkeypatch.setattr(fragments, '_templates_digest', None)
+
+
+@pytest.fixture
+def app():
+    """Minimal app with one page served through conditional_page (the template only feeds page_etag)"""
+    app = Flask(__name__)
+    app.secret_key = 'test'
+    app.jinja_loader = DictLoader({'page.html': '<p>{{ body }}</p>'})
+    app.renders = 0
+
+    @app.route('/page/<body>')
+    def page(body):
+        def render():
+            app.renders += 1
+            return f'<p>{body}</p>'
+        return fragments.conditional_page(fragments.page_etag(body), render)
+
+    @app.route('/login/<int:user_id>')
+    def login(user_id):
+        session['user_id'] = user_id
+        return ''
+
+    @app.route('/flash')
+    def flash_message():
+        flash('Saved')
+        return ''
+
+    return app
+
+
+def renderer(html, calls):
+    """render() callable that records each call"""
+    def render():
+        calls.append(html)
+        return html
+    return render
+
+
+def test_fragment_is_rendered_once_per_version():
+    calls = []
+    first = fragments.get_fragment('note', 1, ('v1', None), renderer('<p>one</p>', calls))
+    again = fragments.get_fragment('note', 1, ('v1', None), renderer('<p>unused</p>', calls))
+    assert again == first
+    assert calls == ['<p>one</p>']
+
+    edited = fragments.get_fragment('note', 1, ('v2', None), renderer('<p>two</p>', calls))
+    assert str(edited.html) == '<p>two</p>'
+    assert edited.etag != first.etag
+
+
+def test_purge_forces_a_render():
+    calls = []
+    fragments.get_fragment('note', 1, 'v1', renderer('<p>old</p>', calls))
+    fragments.get_fragment('note', 2, 'v1', renderer('<p>other</p>', calls))
+    fragments.purge_fragment('note', 1)
+
+    fragments.get_fragment('note', 1, 'v1', renderer('<p>new</p>', calls))
+    fragments.get_fragment('note', 2, 'v1', renderer('<p>unused</p>', calls))
+    assert calls == ['<p>old</p>', '<p>other</p>', '<p>new</p>']
+
+
+def test_kinds_are_cached_separately():
+    note = fragments.get_fragment('note', 1, 'v1', lambda: 'note')
+    material = fragments.get_fragment('material', 1, 'v1', lambda: 'material')
+    assert (str(note.html), str(material.html)) == ('note', 'material')
+
+
+def test_byte_budget_evicts_least_recently_used():
+    calls = []
+    for item_id in (1, 2, 3):
+        fragments.get_fragment('note', item_id, 'v1', renderer('x' * 400, calls))
+    # 1200 bytes against a 1000 byte budget: the oldest fragment is gone
+    assert fragments._fragment_cache.stats()['bytes'] == 800
+    fragments.get_fragment('note', 1, 'v1', renderer('x' * 400, calls))
+    assert len(calls) == 4
+
+
+def test_revision_uses_both_timestamps():
+    assert fragments.revision({'updated_at': None, 'created_at': 'c'}) == (None, 'c')
+    assert fragments.revision({'updated_at': 'u', 'created_at': 'c'}) == ('u', 'c')
+
+
+def test_matching_etag_gets_304(app):
+    client = app.test_client()
+    response = client.get('/page/hello')
+    assert response.status_code == 200
+    assert response.headers['Cache-Control'] == 'private, no-cache'
+    etag = response.headers['ETag']
+
+    response = client.get('/page/hello', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.data == b''
+    assert response.headers['ETag'] == etag
+    assert app.renders == 1
+
+
+def test_changed_page_is_rendered_again(app):
+    client = app.test_client()
+    etag = client.get('/page/hello').headers['ETag']
+
+    response = client.get('/page/changed', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+
+
+def test_etag_depends_on_the_signed_in_user(app):
+    client = app.test_client()
+    client.get('/login/1')
+    etag = client.get('/page/hello').headers['ETag']
+
+    client.get('/login/2')
+    response = client.get('/page/hello', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+
+
+def test_pending_flash_is_never_answered_from_cache(app):
+    client = app.test_client()
+    etag = client.get('/page/hello').headers['ETag']
+
+    client.get('/flash')
+    response = client.get('/page/hello', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert 'ETag' not in response.headers
+
+    # The message was shown; the next request can be a 304 again
+    response = client.get('/page/hello', headers={'If-None-Match': etag})
+    assert response.status_code == 304
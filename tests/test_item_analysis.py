@@ -0,0 +1,108 @@
+"""
+Regression tests for item statistics (item_analysis.compute_item_stats)
+Each completed attempt must count as a response to exactly the questions of
+the answer key it was graded against, even after the test is edited.
+"""
+
+import math
+from datetime import datetime
+
+import logic
+from item_analysis import compute_item_stats
+
+
+def add_question(db, test_id, title):
+    """Add a question worth one point to a test and move the test to a new answer key version"""
+    question_id = db.execute(
+        '''INSERT INTO questions (title, question_text, option_a, option_b, option_c, option_d,
+                                  correct_answer, difficulty, topic, created_at)
+           VALUES (?, 'text', 'a', 'b', 'c', 'd', 'A', 'easy', 'Basics', ?)''',
+        (title, datetime.now())
+    ).lastrowid
+    db.execute('INSERT INTO test_questions (test_id, question_id, points) VALUES (?, ?, 1)', (test_id, question_id))
+    logic.bump_answer_key_version(db, test_id=test_id)
+    return question_id
+
+
+def add_completed_attempt(db, test_id, score, correct_ids, started_minute):
+    """A completed attempt on the test's current answer key with the given questions answered correctly"""
+    version = logic.pin_answer_key(db, test_id)
+    attempt_id = db.execute(
+        '''INSERT INTO test_attempts (test_id, user_id, started_at, status, score, answer_key_version)
+           VALUES (?, 1, ?, 'completed', ?, ?)''',
+        (test_id, datetime(2024, 1, 1, 0, started_minute), score, version)
+    ).lastrowid
+    for question_id in correct_ids:
+        db.execute(
+            '''INSERT INTO test_attempt_answers (test_attempt_id, question_id, selected_answer, is_correct, points_earned)
+               VALUES (?, ?, 'A', 1, 1)''',
+            (attempt_id, question_id)
+        )
+
+
+def item_stats(db):
+    """{question_id: stats row} after a recompute"""
+    compute_item_stats(db)
+    db.commit()
+    return {row['question_id']: row for row in db.execute('SELECT * FROM question_item_stats')}
+
+
+def pearson(xs, ys):
+    """Plain Pearson correlation"""
+    n = len(xs)
+    mean_x, mean_y = sum(xs) / n, sum(ys) / n
+    cov = sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys))
+    return cov / math.sqrt(sum((x - mean_x) ** 2 for x in xs) * sum((y - mean_y) ** 2 for y in ys))
+
+
+def test_responses_follow_each_attempts_answer_key(db):
+    test_id = db.execute("INSERT INTO tests (title, status) VALUES ('T', 'published')").lastrowid
+    q1 = add_question(db, test_id, 'Q1')
+    q2 = add_question(db, test_id, 'Q2')
+    add_completed_attempt(db, test_id, 100, [q1, q2], 0)
+    add_completed_attempt(db, test_id, 50, [q1], 1)
+    add_completed_attempt(db, test_id, 0, [], 2)
+
+    # Added after three attempts: only the later attempt saw it
+    q3 = add_question(db, test_id, 'Q3')
+    add_completed_attempt(db, test_id, 100, [q1, q2, q3], 3)
+
+    # Removed from the test: its history still counts
+    db.execute('DELETE FROM test_questions WHERE test_id = ? AND question_id = ?', (test_id, q2))
+    logic.bump_answer_key_version(db, test_id=test_id)
+    db.commit()
+
+    stats = item_stats(db)
+
+    assert stats[q3]['test_responses'] == 1
+    assert stats[q3]['p_value'] == 1.0
+    assert stats[q2]['test_responses'] == 4
+    assert stats[q2]['p_value'] == 0.5
+    assert stats[q1]['test_responses'] == 4
+    assert stats[q1]['p_value'] == 0.75
+    assert math.isclose(stats[q1]['point_biserial'], pearson([1, 1, 0, 1], [100, 50, 0, 100]))
+    assert math.isclose(stats[q2]['point_biserial'], pearson([1, 0, 0, 1], [100, 50, 0, 100]))
+
+
+def test_attempts_from_before_pinning_use_current_questions(db):
+    test_id = db.execute("INSERT INTO tests (title, status) VALUES ('T', 'published')").lastrowid
+    q1 = add_question(db, test_id, 'Q1')
+    q2 = add_question(db, test_id, 'Q2')
+    for minute, (score, correct_ids) in enumerate([(100, [q1, q2]), (50, [q2])]):
+        attempt_id = db.execute(
+            '''INSERT INTO test_attempts (test_id, user_id, started_at, status, score)
+               VALUES (?, 1, ?, 'completed', ?)''',
+            (test_id, datetime(2024, 1, 1, 0, minute), score)
+        ).lastrowid
+        for question_id in correct_ids:
+            db.execute(
+                '''INSERT INTO test_attempt_answers (test_attempt_id, question_id, selected_answer, is_correct)
+                   VALUES (?, ?, 'A', 1)''',
+                (attempt_id, question_id)
+            )
+    db.commit()
+
+    stats = item_stats(db)
+
+    assert stats[q1]['test_responses'] == 2 and stats[q1]['p_value'] == 0.5
+    assert stats[q2]['test_responses'] == 2 and stats[q2]['p_value'] == 1.0
@@ -0,0 +1,108 @@
+"""
+Tests for keyset paging in the question browser (question_bank.list_questions)
+Following cursors page by page must visit every matching question exactly
+once, in order, including statistic sorts where questions without
+statistics sort last and several questions share a value.
+"""
+
+from datetime import datetime
+
+import pytest
+
+from question_bank import list_questions, parse_cursor
+
+
+def add_question(db, title, is_active=1):
+    """Insert a question and return its id"""
+    return db.execute(
+        '''INSERT INTO questions (title, question_text, option_a, option_b, option_c, option_d,
+                                  correct_answer, difficulty, topic, is_active, created_at)
+           VALUES (?, 'text', 'a', 'b', 'c', 'd', 'A', 'easy', 'Basics', ?, ?)''',
+        (title, is_active, datetime.now())
+    ).lastrowid
+
+
+def add_stats(db, question_id, p_value, point_biserial):
+    """Item statistics for a question"""
+    db.execute(
+        '''INSERT INTO question_item_stats (question_id, test_responses, p_value, point_biserial, computed_at)
+           VALUES (?, 10, ?, ?, ?)''',
+        (question_id, p_value, point_biserial, datetime.now())
+    )
+
+
+def all_pages(db, limit, sort='', **filters):
+    """Ids on each page, following cursors from the first page to the last"""
+    pages = []
+    after = None
+    while True:
+        rows, cursor = list_questions(db, sort=sort, after=after, limit=limit, **filters)
+        pages.append([row['id'] for row in rows])
+        if cursor is None:
+            return pages
+        after = parse_cursor(cursor, sort)
+        assert after is not None
+
+
+@pytest.fixture
+def bank(db):
+    """23 questions: p-values with ties (and 0.1, which has no exact float), a third without statistics"""
+    p_values = [0.5, 0.1, 0.5, None, 0.9, 0.1, None, 0.5, 0.3, None, 0.5, 0.7]
+    stats = {}
+    for i in range(23):
+        question_id = add_question(db, f'Question {i}')
+        p_value = p_values[i % len(p_values)]
+        if p_value is not None:
+            add_stats(db, question_id, p_value, round(1 - p_value, 2))
+        stats[question_id] = p_value
+    db.commit()
+    return stats
+
+
+def test_default_order_is_newest_first(db, bank):
+    pages = all_pages(db, limit=5)
+    assert [len(page) for page in pages] == [5, 5, 5, 5, 3]
+    assert sum(pages, []) == sorted(bank, reverse=True)
+
+
+@pytest.mark.parametrize('limit', [1, 2, 4, 5, 7, 23, 50])
+def test_stat_sort_pages_without_gaps_or_repeats(db, bank, limit):
+    ids = sum(all_pages(db, limit=limit, sort='p_value'), [])
+    # Ascending p-value, ties by id, questions without statistics last
+    expected = sorted(bank, key=lambda question_id: (bank[question_id] is None, bank[question_id] or 0, question_id))
+    assert ids == expected
+
+
+def test_questions_without_stats_sort_last_by_id(db, bank):
+    ids = sum(all_pages(db, limit=4, sort='discrimination'), [])
+    no_stats = [question_id for question_id in bank if bank[question_id] is None]
+    assert ids[-len(no_stats):] == sorted(no_stats)
+
+
+def test_last_page_has_no_cursor(db, bank):
+    rows, cursor = list_questions(db, limit=len(bank))
+    assert len(rows) == len(bank)
+    assert cursor is None
+
+
+def test_paging_keeps_filters(db, bank):
+    hidden = add_question(db, 'Hidden', is_active=0)
+    db.commit()
+
+    assert hidden not in sum(all_pages(db, limit=5), [])
+    assert hidden in sum(all_pages(db, limit=5, show_inactive=True), [])
+
+
+@pytest.mark.parametrize('value, sort, expected', [
+    ('', '', None),
+    (None, 'p_value', None),
+    ('42', '', 42),
+    ('0.1:7', 'p_value', (0.1, 7)),
+    ('2:9', 'discrimination', (2.0, 9)),
+    ('abc', '', None),
+    ('0.5', 'p_value', None),
+    ('0.5:x', 'p_value', None),
+    ('1:2:3', 'p_value', None),
+])
+def test_parse_cursor(value, sort, expected):
+    assert parse_cursor(value, sort) == expected
@@ -0,0 +1,79 @@
+"""
+Tests for full-text search (search.build_match_query and the FTS5 lookups)
+User input must never be parsed as FTS5 query syntax: every word is quoted,
+and text with no words searches for nothing instead of raising.
+"""
+
+from datetime import datetime
+
+import pytest
+
+from search import build_match_query, search_all, search_questions
+
+
+def add_question(db, title, question_text, is_active=1):
+    """Insert a question; the FTS triggers index it"""
+    return db.execute(
+        '''INSERT INTO questions (title, question_text, option_a, option_b, option_c, option_d,
+                                  correct_answer, explanation, difficulty, topic, is_active, created_at)
+           VALUES (?, ?, 'a', 'b', 'c', 'd', 'A', 'Because', 'easy', 'Basics', ?, ?)''',
+        (title, question_text, is_active, datetime.now())
+    ).lastrowid
+
+
+def test_words_become_quoted_prefixes():
+    assert build_match_query('list comprehension') == '"list"* "comprehension"*'
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('a OR b', '"a"* "OR"* "b"*'),
+    ('NOT loops', '"NOT"* "loops"*'),
+    ('NEAR(x y)', '"NEAR"* "x"* "y"*'),
+    ('title: dict', '"title"* "dict"*'),
+    ('"unbalanced', '"unbalanced"*'),
+    ('pre* -minus ^caret', '"pre"* "minus"* "caret"*'),
+])
+def test_operators_and_punctuation_are_quoted(text, expected):
+    assert build_match_query(text) == expected
+
+
+@pytest.mark.parametrize('text', [None, '', '   ', '"*()-:^'])
+def test_text_without_words_has_no_query(text):
+    assert build_match_query(text) is None
+
+
+def test_operator_input_searches_literally(db):
+    both = add_question(db, 'Loops OR recursion', 'Pick one')
+    add_question(db, 'Loops only', 'Iterate')
+    db.commit()
+
+    # Unquoted, OR would match both questions; quoted, every word must appear
+    results = search_questions(db, build_match_query('loops OR recursion'))
+    assert [row['id'] for row in results] == [both]
+
+
+@pytest.mark.parametrize('text', ['NEAR(', '"', 'a AND', '(dict', '*'])
+def test_malformed_syntax_does_not_raise(db, text):
+    add_question(db, 'Dictionaries', 'Keys and values')
+    db.commit()
+
+    results = search_all(db, text)
+    assert set(results) == {'notes', 'materials', 'questions'}
+
+
+def test_matches_are_highlighted_and_escaped(db):
+    add_question(db, '<b>Dict</b> keys', 'Which keys are hashable?')
+    db.commit()
+
+    [result] = search_questions(db, build_match_query('dict'))
+    assert str(result['title']) == '&lt;b&gt;<mark>Dict</mark>&lt;/b&gt; keys'
+
+
+def test_students_do_not_search_hidden_questions(db):
+    add_question(db, 'Retired question', 'Old', is_active=0)
+    active = add_question(db, 'Current question', 'New')
+    db.commit()
+
+    query = build_match_query('question')
+    assert [row['id'] for row in search_questions(db, query)] == [active]
+    assert len(search_questions(db, query, include_hidden=True)) == 2
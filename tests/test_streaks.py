@@ -0,0 +1,83 @@
+"""
+Tests for daily streaks (logic.apply_practice_answer)
+The first answer of a day counts back through user_daily_activity; later
+answers that day keep the stored streak.
+"""
+
+from datetime import date, datetime, timedelta
+
+import pytest
+
+import logic
+
+TODAY = date(2024, 3, 10)
+
+
+@pytest.fixture
+def question_id(db):
+    """An easy question answered correctly with 'A'"""
+    question_id = db.execute(
+        '''INSERT INTO questions (title, question_text, option_a, option_b, option_c, option_d,
+                                  correct_answer, difficulty, topic, created_at)
+           VALUES ('Q', 'text', 'a', 'b', 'c', 'd', 'A', 'easy', 'Basics', ?)''',
+        (datetime.now(),)
+    ).lastrowid
+    db.commit()
+    return question_id
+
+
+@pytest.fixture
+def today(monkeypatch):
+    """Pin logic's idea of today to TODAY"""
+    class FixedDate(date):
+        @classmethod
+        def today(cls):
+            return TODAY
+    monkeypatch.setattr(logic, 'date', FixedDate)
+    return TODAY
+
+
+def set_history(db, active_days_ago, last_activity=None, streak=0):
+    """Daily activity rows for the given days before TODAY, plus the user's stats row"""
+    for days_ago in active_days_ago:
+        db.execute(
+            'INSERT INTO user_daily_activity (user_id, day, xp, attempts, correct) VALUES (1, ?, 10, 1, 1)',
+            ((TODAY - timedelta(days=days_ago)).isoformat(),)
+        )
+    db.execute(
+        'INSERT INTO user_stats (user_id, xp, level, streak, last_activity_date) VALUES (1, 0, 1, ?, ?)',
+        (streak, last_activity)
+    )
+    db.commit()
+
+
+def answer(db, question_id):
+    """Streak after one practice answer"""
+    result = logic.apply_practice_answer(db, 1, question_id, 'A')
+    db.commit()
+    return result['streak']
+
+
+def test_first_answer_of_day_counts_consecutive_rollup_days(db, question_id, today):
+    set_history(db, [1, 2, 3, 5], last_activity=TODAY - timedelta(days=1), streak=3)
+    assert answer(db, question_id) == 4
+
+
+def test_gap_resets_streak(db, question_id, today):
+    set_history(db, [2, 3], last_activity=TODAY - timedelta(days=2), streak=2)
+    assert answer(db, question_id) == 1
+
+
+def test_stats_day_counts_before_its_rollup_is_written(db, question_id, today):
+    # Yesterday's rollup job has not run yet, but user_stats saw the answer
+    set_history(db, [2, 3], last_activity=(TODAY - timedelta(days=1)).isoformat(), streak=3)
+    assert answer(db, question_id) == 4
+
+
+def test_later_answers_keep_todays_streak(db, question_id, today):
+    set_history(db, [1], last_activity=TODAY.isoformat(), streak=2)
+    assert answer(db, question_id) == 2
+
+
+def test_new_user_starts_at_one(db, question_id, today):
+    assert answer(db, question_id) == 1